@@ -0,0 +1,100 @@
+"""
+Metric ranking dạng vector (cùng định nghĩa với notebook job_cv_matching_all_in_one_sbert_faiss.ipynb):
+P@k, R@k, nDCG@k, MAP, MRR trên ma trận gain (q query, depth) thay vì vòng lặp Python theo từng query.
+- relevance_matrix(): list kết quả đã xếp hạng + nhãn (qrels) -> ma trận gain, số item liên quan, gain lý tưởng
+- overlap_at_k(): tỉ lệ top-k trùng với top-k tham chiếu (exact brute-force) -> đo recall mất do ANN / pruning
+- query_folds(): chia query thành n fold (GroupKFold theo query như notebook, tất định theo key)
+"""
+from __future__ import annotations
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Mapping, Sequence
+
+import numpy as np
+
+
+@dataclass
+class Relevance:
+    gains: np.ndarray       # (q, depth) gain của item ở mỗi hạng (0 = không liên quan / không có nhãn / hết list)
+    ideal: np.ndarray       # (q, depth) gain của qrels sắp giảm dần (mẫu số nDCG)
+    n_rel: np.ndarray       # (q,) số item có gain > 0 trong qrels
+    lengths: np.ndarray     # (q,) số item hệ thống trả về
+
+
+def relevance_matrix(ranked: Sequence[Sequence[Hashable]], qrels: Sequence[Mapping[Hashable, float]],
+                     depth: int) -> Relevance:
+    q = len(ranked)
+    gains = np.zeros((q, depth), dtype=np.float64)
+    ideal = np.zeros((q, depth), dtype=np.float64)
+    n_rel = np.zeros(q, dtype=np.int64)
+    lengths = np.zeros(q, dtype=np.int64)
+    for i, (items, labels) in enumerate(zip(ranked, qrels)):
+        items = list(items)[:depth]
+        lengths[i] = len(items)
+        gains[i, :len(items)] = [float(labels.get(x, 0.0)) for x in items]
+        pos = sorted((float(g) for g in labels.values() if g > 0), reverse=True)[:depth]
+        ideal[i, :len(pos)] = pos
+        n_rel[i] = sum(1 for g in labels.values() if g > 0)
+    return Relevance(gains, ideal, n_rel, lengths)
+
+
+def _safe_div(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.divide(a, b, out=np.zeros_like(a, dtype=np.float64), where=b > 0)
+
+def precision_at_k(rel: Relevance, k: int) -> np.ndarray:
+    """Số item liên quan trong top-k / min(k, số item trả về) (list rỗng -> 0)."""
+    hits = (rel.gains[:, :k] > 0).sum(axis=1).astype(np.float64)
+    return _safe_div(hits, np.minimum(k, rel.lengths).astype(np.float64))
+
+def recall_at_k(rel: Relevance, k: int) -> np.ndarray:
+    hits = (rel.gains[:, :k] > 0).sum(axis=1).astype(np.float64)
+    return _safe_div(hits, rel.n_rel.astype(np.float64))
+
+def dcg_at_k(gains: np.ndarray, k: int) -> np.ndarray:
+    g = gains[:, :k]
+    return ((2.0 ** g - 1.0) / np.log2(np.arange(2, g.shape[1] + 2))).sum(axis=1)
+
+def ndcg_at_k(rel: Relevance, k: int) -> np.ndarray:
+    return _safe_div(dcg_at_k(rel.gains, k), dcg_at_k(rel.ideal, k))
+
+def average_precision(rel: Relevance) -> np.ndarray:
+    """AP trên list trả về, chia cho tổng số item liên quan trong qrels (item không được trả về tính 0)."""
+    hit = rel.gains > 0
+    prec = np.cumsum(hit, axis=1) / np.arange(1, hit.shape[1] + 1)
+    return _safe_div((prec * hit).sum(axis=1), rel.n_rel.astype(np.float64))
+
+def reciprocal_rank(rel: Relevance) -> np.ndarray:
+    hit = rel.gains > 0
+    first = np.argmax(hit, axis=1)
+    return np.where(hit.any(axis=1), 1.0 / (first + 1), 0.0)
+
+def overlap_at_k(ranked: Sequence[Sequence[Hashable]], reference: Sequence[Sequence[Hashable]], k: int) -> np.ndarray:
+    """|top-k ∩ top-k tham chiếu| / min(k, |tham chiếu|) cho từng query (tham chiếu rỗng -> 1)."""
+    out = np.ones(len(ranked), dtype=np.float64)
+    for i, (a, b) in enumerate(zip(ranked, reference)):
+        ref = set(list(b)[:k])
+        if ref:
+            out[i] = len(ref & set(list(a)[:k])) / len(ref)
+    return out
+
+
+def per_query(rel: Relevance, ks: Sequence[int] = (5, 10)) -> Dict[str, np.ndarray]:
+    """Metric từng query (dạng notebook: P@k, R@k, nDCG@k, MAP, MRR)."""
+    out: Dict[str, np.ndarray] = {}
+    for k in ks:
+        out[f"P@{k}"] = precision_at_k(rel, k)
+        out[f"R@{k}"] = recall_at_k(rel, k)
+        out[f"nDCG@{k}"] = ndcg_at_k(rel, k)
+    out["MAP"] = average_precision(rel)
+    out["MRR"] = reciprocal_rank(rel)
+    return out
+
+def mean_metrics(values: Mapping[str, np.ndarray], rows: Any = None) -> Dict[str, float]:
+    return {name: round(float(v[rows].mean() if rows is not None else v.mean()), 4) if len(v) else 0.0
+            for name, v in values.items()}
+
+
+def query_folds(keys: Sequence[Hashable], n_splits: int) -> List[np.ndarray]:
+    """Chỉ số query của từng fold: mỗi query (nhóm pair của nó) nằm trọn trong 1 fold, thứ tự theo crc32(key)."""
+    order = np.argsort([zlib.crc32(str(k).encode("utf-8")) for k in keys], kind="stable")
+    return [np.sort(f) for f in np.array_split(order, max(1, min(int(n_splits), len(keys)))) if len(f)]
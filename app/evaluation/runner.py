@@ -0,0 +1,168 @@
+"""
+Đánh giá offline: chạy RankerService production (hoặc 1 cấu hình retrieval / rerank bất kỳ) trên tập pair có nhãn,
+báo cáo chất lượng cùng latency / throughput -> mỗi tối ưu tốc độ (ANN, quantization, pruning) được kiểm tra
+recall mất bao nhiêu so với chấm exact.
+- load_qrels(): CSV hoặc JSONL cột job_id, cand_id, label (gain; > 0 = liên quan, có thể nhiều mức)
+- Ranker: key query -> list key item đã xếp hạng (candidate_ranker / job_ranker bọc RankerService)
+- evaluate(): metric (app.evaluation.metrics) theo query + theo fold, latency p50/p95/p99, qps, overlap@k với lượt
+  tham chiếu (thường là exact)
+"""
+from __future__ import annotations
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.evaluation.metrics import mean_metrics, overlap_at_k, per_query, query_folds, relevance_matrix
+from app.inference import RankerService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.retrieval import HybridRetriever, RetrievalConfig
+from app.services.snapshot import CANDIDATE_SPEC, JOB_SPEC, SnapshotManager
+
+# task -> (field key của query, field key của item)
+TASKS = {"candidates": ("job_id", "cand_id"), "jobs": ("cand_id", "job_id")}
+
+Ranker = Callable[[Any], List[Any]]
+
+
+def _key(field_name: str, value: Any) -> Any:
+    # job_id lưu dạng int trong Mongo, cand_id dạng str
+    if field_name == "job_id":
+        return int(float(value))
+    return str(value)
+
+def load_qrels(path: str, task: str = "candidates") -> Dict[Any, Dict[Any, float]]:
+    """Nhãn theo query: {job_id: {cand_id: gain}} (task candidates) hoặc {cand_id: {job_id: gain}} (task jobs)."""
+    query_field, item_field = TASKS[task]
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    out: Dict[Any, Dict[Any, float]] = {}
+    for r in rows:
+        label = r.get("label", r.get("gain", 1))
+        out.setdefault(_key(query_field, r[query_field]), {})[_key(item_field, r[item_field])] = float(label or 0)
+    return out
+
+
+# ---------- ranker ----------
+def candidate_ranker(svc: RankerService, top_k: int, filters=None) -> Ranker:
+    return lambda job_id: [r["cand_id"] for r in svc.rank_candidates_for_job(int(job_id), top_k, filters)]
+
+def job_ranker(svc: RankerService, top_k: int, filters=None) -> Ranker:
+    return lambda cand_id: [r["job_id"] for r in svc.search_jobs_for_candidate(str(cand_id), None, top_k, filters=filters)]
+
+RANKERS = {"candidates": candidate_ranker, "jobs": job_ranker}
+
+
+def build_service(db, model=None, model_id: str = "", snapshots: bool = True) -> RankerService:
+    """RankerService như lúc API chạy (snapshot load 1 lần, không có thread refresh) cho đánh giá offline."""
+    svc = RankerService()
+    svc.db = db
+    svc.sbert_model = model
+    svc.embedding_cache = EmbeddingCache(model_id=model_id)
+    if snapshots:
+        svc.cand_snapshot = SnapshotManager(db, CANDIDATE_SPEC, encode_texts=svc.encode_many)
+        svc.job_snapshot = SnapshotManager(db, JOB_SPEC, encode_texts=svc.encode_many)
+        svc.cand_snapshot.load()
+        svc.job_snapshot.load()
+    svc.ready = True
+    return svc
+
+def configure_retrieval(svc: RankerService, config: Optional[RetrievalConfig]) -> None:
+    """Gắn cấu hình retrieval (None = chấm exact); index dựng ngay để thời gian dựng không tính vào latency."""
+    for r in (svc.cand_retriever, svc.job_retriever):
+        if r is not None:
+            r.close()
+    svc.cand_retriever = svc.job_retriever = None
+    if config is None:
+        return
+    svc.retrieval_config = config
+    svc.cand_retriever = HybridRetriever(svc.db, CANDIDATE_SPEC, config)
+    svc.job_retriever = HybridRetriever(svc.db, JOB_SPEC, config)
+    for r, mgr in ((svc.cand_retriever, svc.cand_snapshot), (svc.job_retriever, svc.job_snapshot)):
+        if mgr is not None and mgr.current is not None:
+            r.publish(mgr.current)
+
+
+# ---------- chạy + đo ----------
+@dataclass
+class RunResult:
+    ranked: List[List[Any]]
+    latency_ms: np.ndarray
+    wall_seconds: float
+    concurrency: int
+
+    @property
+    def qps(self) -> float:
+        return len(self.ranked) / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+def run_queries(ranker: Ranker, queries: Sequence[Any], warmup: int = 3, concurrency: int = 1) -> RunResult:
+    """Chạy mọi query (warmup không tính); concurrency > 1: thread pool, qps theo wall time của cả lượt."""
+    for q in list(queries)[:max(0, warmup)]:
+        ranker(q)
+
+    def timed(q):
+        t = time.perf_counter()
+        out = ranker(q)
+        return out, (time.perf_counter() - t) * 1000.0
+
+    t0 = time.perf_counter()
+    if concurrency <= 1:
+        results = [timed(q) for q in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, queries))
+    wall = time.perf_counter() - t0
+    return RunResult([list(r) for r, _ in results], np.asarray([ms for _, ms in results], dtype=np.float64),
+                     wall, max(1, concurrency))
+
+def latency_summary(ms: np.ndarray) -> Dict[str, float]:
+    if not len(ms):
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+            "mean_ms": round(float(ms.mean()), 2), "max_ms": round(float(ms.max()), 2)}
+
+
+@dataclass
+class EvalReport:
+    name: str
+    queries: int
+    metrics: Dict[str, float]
+    latency: Dict[str, float]
+    throughput: Dict[str, float]
+    folds: List[Dict[str, float]] = field(default_factory=list)
+    fold_std: Dict[str, float] = field(default_factory=dict)
+    overlap: Dict[str, float] = field(default_factory=dict)    # overlap@k với lượt tham chiếu
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def evaluate(ranker: Ranker, qrels: Dict[Any, Dict[Any, float]], ks: Sequence[int] = (5, 10), name: str = "",
+             warmup: int = 3, concurrency: int = 1, folds: int = 0,
+             reference: Optional[RunResult] = None) -> Tuple[EvalReport, RunResult]:
+    queries = list(qrels)
+    run = run_queries(ranker, queries, warmup, concurrency)
+    depth = max([*ks, *(len(r) for r in run.ranked)] or [1])
+    values = per_query(relevance_matrix(run.ranked, [qrels[q] for q in queries], depth), ks)
+    report = EvalReport(
+        name=name,
+        queries=len(queries),
+        metrics=mean_metrics(values),
+        latency=latency_summary(run.latency_ms),
+        throughput={"qps": round(run.qps, 2), "concurrency": run.concurrency, "wall_seconds": round(run.wall_seconds, 3)},
+    )
+    if folds and folds > 1 and queries:
+        report.folds = [mean_metrics(values, idx) for idx in query_folds(queries, folds)]
+        report.fold_std = {m: round(float(np.std([f[m] for f in report.folds])), 4) for m in report.metrics}
+    if reference is not None:
+        report.overlap = {f"overlap@{k}": round(float(overlap_at_k(run.ranked, reference.ranked, k).mean()), 4)
+                          for k in ks}
+    return report, run
@@ -0,0 +1,78 @@
+"""
+Dò tham số retrieval (nlist / nprobe / depth mỗi kênh / shortlist) theo từng deployment: mỗi cấu hình so với chấm
+exact brute-force của RankerService trên cùng tập query -> recall@k (overlap top-k với exact) + latency p95.
+- sweep(): index IVF dựng lại 1 lần cho mỗi nlist, các tham số truy vấn đổi tại chỗ trên cùng index
+- pareto_frontier(): cấu hình không bị cấu hình khác vượt ở cả recall lẫn p95
+- recommend(): cấu hình nhanh nhất đạt target recall; exact nhanh hơn mọi cấu hình đạt target -> tắt retrieval
+"""
+from __future__ import annotations
+import itertools
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.evaluation.metrics import overlap_at_k
+from app.evaluation.runner import Ranker, RunResult, configure_retrieval, latency_summary, run_queries
+from app.inference import RankerService
+from app.services.retrieval import RetrievalConfig
+
+
+@dataclass
+class TrialResult:
+    params: Dict[str, Any]
+    recall: float           # overlap@k trung bình với exact
+    p95_ms: float
+    p50_ms: float
+    qps: float
+
+    def to_dict(self, k: int) -> Dict[str, Any]:
+        return {**self.params, f"recall@{k}": self.recall, "p95_ms": self.p95_ms, "p50_ms": self.p50_ms, "qps": self.qps}
+
+
+def grid(**axes: Iterable[Any]) -> List[Dict[str, Any]]:
+    """grid(nprobe=[4, 8], shortlist=[500]) -> [{"nprobe": 4, "shortlist": 500}, {"nprobe": 8, "shortlist": 500}]."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(axes[n]) for n in names))]
+
+def sweep(svc: RankerService, ranker: Ranker, queries: Sequence[Any], exact: RunResult, base: RetrievalConfig,
+          nlists: Sequence[int], params: Sequence[Dict[str, Any]], k: int, warmup: int = 3,
+          progress=None) -> List[TrialResult]:
+    """Chạy mọi cấu hình base + nlist + params; min_rows = 0 để retrieval luôn chạy trong lúc dò."""
+    out: List[TrialResult] = []
+    for nlist in nlists:
+        t0 = time.perf_counter()
+        configure_retrieval(svc, replace(base, enabled=True, min_rows=0, nlist=int(nlist)))
+        build_s = time.perf_counter() - t0
+        for p in params:
+            for r in (svc.cand_retriever, svc.job_retriever):
+                r.config = replace(r.config, **p)
+            run = run_queries(ranker, queries, warmup)
+            lat = latency_summary(run.latency_ms)
+            trial = TrialResult({"nlist": int(nlist), **p, "index_build_s": round(build_s, 2)},
+                                round(float(overlap_at_k(run.ranked, exact.ranked, k).mean()), 4),
+                                lat["p95_ms"], lat["p50_ms"], round(run.qps, 2))
+            out.append(trial)
+            if progress is not None:
+                progress(trial)
+    configure_retrieval(svc, None)
+    return out
+
+def pareto_frontier(trials: Sequence[TrialResult]) -> List[TrialResult]:
+    """Theo p95 tăng dần, chỉ giữ cấu hình có recall cao hơn mọi cấu hình nhanh hơn nó."""
+    front: List[TrialResult] = []
+    for t in sorted(trials, key=lambda t: (t.p95_ms, -t.recall)):
+        if not front or t.recall > front[-1].recall:
+            front.append(t)
+    return front
+
+def recommend(front: Sequence[TrialResult], target_recall: float, exact_p95_ms: float) -> Optional[TrialResult]:
+    """Cấu hình nhanh nhất trên frontier đạt target; None = không cấu hình nào đạt target mà nhanh hơn exact."""
+    ok = [t for t in front if t.recall >= target_recall and t.p95_ms < exact_p95_ms]
+    return min(ok, key=lambda t: t.p95_ms) if ok else None
+
+def recommended_config(base: RetrievalConfig, best: Optional[TrialResult]) -> RetrievalConfig:
+    if best is None:
+        return replace(base, enabled=False)
+    params = {k: v for k, v in best.params.items() if k != "index_build_s"}
+    # dò trên đúng kích thước deployment này: bật ngay từ 0 hàng
+    return replace(base, enabled=True, min_rows=0, **params)
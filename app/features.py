@@ -4,6 +4,8 @@ import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Tuple
 
+from app.services.explanations import explain_docs
+
 def normalize_text(s: str) -> str:
     return " ".join(str(s).lower().strip().split())
 
@@ -226,74 +228,6 @@ def build_features_for_pairs(job_doc: dict = None, cand_docs: List[dict] = None,
 
 def explain_reasons(job_doc: dict, cand_doc: dict, score: float, reverse: bool = False) -> Dict[str, Any]:
     """
-    Generate explanation for matching score
+    Generate explanation for matching score (dựng bởi app.services.explanations, cùng dữ liệu chuẩn hóa với ranking)
     """
-    if reverse:
-        # Explaining why job matches candidate
-        job_skills = set(job_doc.get('skills_norm', []))
-        cand_skills = set(cand_doc.get('skills_norm', []))
-        
-        matching_skills = list(job_skills.intersection(cand_skills))
-        missing_skills = list(job_skills - cand_skills)
-        
-        return {
-            "score": float(score),
-            "matching_skills": matching_skills,
-            "missing_skills": missing_skills,
-            "experience_match": _check_experience_match(job_doc, cand_doc),
-            "location_match": _check_location_match(job_doc, cand_doc)
-        }
-    else:
-        # Explaining why candidate matches job
-        job_skills = set(job_doc.get('skills_norm', []))
-        cand_skills = set(cand_doc.get('skills_norm', []))
-        
-        matching_skills = list(job_skills.intersection(cand_skills))
-        missing_skills = list(job_skills - cand_skills)
-        extra_skills = list(cand_skills - job_skills)
-        
-        return {
-            "score": float(score),
-            "matching_skills": matching_skills,
-            "missing_skills": missing_skills,
-            "extra_skills": extra_skills,
-            "experience_match": _check_experience_match(job_doc, cand_doc),
-            "location_match": _check_location_match(job_doc, cand_doc)
-        }
-
-def _check_experience_match(job_doc: dict, cand_doc: dict) -> Dict[str, Any]:
-    """Check if candidate experience matches job requirements"""
-    cand_exp = cand_doc.get('exp_years', 0)
-    job_exp_level = job_doc.get('experience_level', '').lower()
-    
-    if 'junior' in job_exp_level:
-        required_exp = "0-2 years"
-        match = cand_exp <= 2
-    elif 'senior' in job_exp_level:
-        required_exp = "5+ years"
-        match = cand_exp >= 5
-    elif 'mid' in job_exp_level:
-        required_exp = "2-5 years"
-        match = 2 <= cand_exp <= 5
-    else:
-        required_exp = "Not specified"
-        match = True
-    
-    return {
-        "candidate_experience": f"{cand_exp} years",
-        "required_experience": required_exp,
-        "match": match
-    }
-
-def _check_location_match(job_doc: dict, cand_doc: dict) -> Dict[str, Any]:
-    """Check if candidate location matches job location"""
-    cand_locations = [loc.lower() for loc in cand_doc.get('locations', [])]
-    job_location = job_doc.get('location_norm', '').lower()
-    
-    match = any(loc in job_location for loc in cand_locations) if cand_locations else False
-    
-    return {
-        "candidate_locations": cand_doc.get('locations', []),
-        "job_location": job_doc.get('location_norm', ''),
-        "match": match
-    }
+    return explain_docs(job_doc, cand_doc, score, reverse=reverse)
@@ -0,0 +1,132 @@
+"""
+Filter có cấu trúc cho ranking (schemas.RankFilters), áp dụng TRƯỚC khi chấm điểm.
+- Mongo: query trên field chuẩn hóa lúc ghi có index (location_id(s), req_years / exp_years,
+  salary_min_vnd / salary_max_vnd, job_type_code, industry_code, posted_day)
+- Snapshot: mask bool giao nhau trên các cột của SnapshotGeneration (location CSR, years, attrs)
+Filter hẹp -> ít hàng phải chấm hơn -> request nhanh hơn.
+"""
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.normalize import attr_code, posted_day
+from app.ontology import ONTOLOGY
+from app.scoring import csr_overlap
+
+
+def _get(f, name: str, default=None):
+    return getattr(f, name, default) if f is not None else default
+
+def _codes(values) -> List[str]:
+    return sorted({attr_code(v) for v in values or []} - {""})
+
+def _loc_ids(f) -> List[int]:
+    return ONTOLOGY.locations.ids(_get(f, "locations") or [])
+
+def _range(lo, hi) -> Dict[str, float]:
+    out = {}
+    if lo is not None: out["$gte"] = float(lo)
+    if hi is not None: out["$lte"] = float(hi)
+    return out
+
+def _cutoff(days: int, now: Optional[datetime]) -> datetime:
+    return (now or datetime.now(timezone.utc)) - timedelta(days=int(days))
+
+def and_query(*queries: Dict[str, Any]) -> Dict[str, Any]:
+    parts = [q for q in queries if q]
+    if not parts:
+        return {}
+    return parts[0] if len(parts) == 1 else {"$and": parts}
+
+
+# ---------- Mongo ----------
+def job_query(f, now: Optional[datetime] = None) -> Dict[str, Any]:
+    q: Dict[str, Any] = {}
+    if f is None:
+        return q
+    locs = _loc_ids(f)
+    if locs:
+        q["location_id"] = {"$in": locs}
+    years = _range(_get(f, "min_exp_years"), _get(f, "max_exp_years"))
+    if years:
+        q["req_years"] = years
+    # khoảng lương của job phải giao với [salary_min, salary_max]
+    if _get(f, "salary_min") is not None:
+        q["salary_max_vnd"] = {"$gte": float(f.salary_min)}
+    if _get(f, "salary_max") is not None:
+        q["salary_min_vnd"] = {"$lte": float(f.salary_max)}
+    if _codes(_get(f, "job_types")):
+        q["job_type_code"] = {"$in": _codes(f.job_types)}
+    if _codes(_get(f, "industries")):
+        q["industry_code"] = {"$in": _codes(f.industries)}
+    if _get(f, "posted_within_days") is not None:
+        q["posted_day"] = {"$gte": posted_day(_cutoff(f.posted_within_days, now))}
+    return q
+
+def candidate_query(f) -> Dict[str, Any]:
+    """Ứng viên chỉ có location + số năm kinh nghiệm; các filter thuộc về job bị bỏ qua."""
+    q: Dict[str, Any] = {}
+    if f is None:
+        return q
+    locs = _loc_ids(f)
+    if locs:
+        q["location_ids"] = {"$in": locs}
+    years = _range(_get(f, "min_exp_years"), _get(f, "max_exp_years"))
+    if years:
+        q["exp_years"] = years
+    return q
+
+
+# ---------- snapshot ----------
+def _common_mask(gen, f) -> Optional[np.ndarray]:
+    mask = None
+
+    def _and(m):
+        nonlocal mask
+        mask = m if mask is None else (mask & m)
+
+    locs = _loc_ids(f)
+    if locs:
+        _and(csr_overlap(gen.loc_indptr, gen.loc_ids, locs) > 0)
+    if _get(f, "min_exp_years") is not None:
+        _and(gen.years >= float(f.min_exp_years))
+    if _get(f, "max_exp_years") is not None:
+        _and(gen.years <= float(f.max_exp_years))
+    return mask
+
+def job_mask(gen, f, now: Optional[datetime] = None) -> Optional[np.ndarray]:
+    """Mask bool (n,) trên job snapshot; None = không có filter nào."""
+    if f is None:
+        return None
+    masks = [m for m in [_common_mask(gen, f)] if m is not None]
+    attrs = gen.attrs
+    # NaN so sánh luôn False: job thiếu lương / ngày đăng bị loại như query Mongo
+    if _get(f, "salary_min") is not None:
+        masks.append(attrs["salary_max"] >= float(f.salary_min))
+    if _get(f, "salary_max") is not None:
+        masks.append(attrs["salary_min"] <= float(f.salary_max))
+    if _codes(_get(f, "job_types")):
+        masks.append(np.isin(attrs["job_type"], _codes(f.job_types)))
+    if _codes(_get(f, "industries")):
+        masks.append(np.isin(attrs["industry"], _codes(f.industries)))
+    if _get(f, "posted_within_days") is not None:
+        masks.append(attrs["posted_day"] >= posted_day(_cutoff(f.posted_within_days, now)))
+    if not masks:
+        return None
+    out = masks[0]
+    for m in masks[1:]:
+        out = out & m
+    return out
+
+def candidate_mask(gen, f) -> Optional[np.ndarray]:
+    return _common_mask(gen, f) if f is not None else None
+
+def intersect_rows(mask: Optional[np.ndarray], rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Giao mask filter với tập hàng (từ query keyword); None = không lọc."""
+    if mask is None:
+        return rows
+    if rows is None:
+        return np.flatnonzero(mask)
+    return rows[mask[rows]]
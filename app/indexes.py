@@ -0,0 +1,175 @@
+"""
+Index Mongo của API khai báo ở 1 chỗ, tạo idempotent lúc startup (không phụ thuộc việc đã chạy setup_database.py).
+- INDEXES: collection -> [IndexModel]; index đã có (cùng tên) được bỏ qua, index lỗi (dữ liệu trùng với unique,
+  khác option) chỉ log, không chặn startup
+- hot_queries(): các query nóng của route / ranking / snapshot; explain_hot_queries() chạy explain() cho từng query
+  và đánh dấu query nào còn COLLSCAN (GET /debug/explain)
+"""
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.filters import and_query, candidate_query, job_query
+from app.schemas import RankFilters
+from app.services.dedup import ACTIVE_QUERY
+from app.services.trends import TRENDS_COLLECTION, window_match
+
+logger = logging.getLogger("indexes")
+
+
+def _idx(*keys: str, **options) -> IndexModel:
+    return IndexModel([(k, ASCENDING) for k in keys], **options)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "jobs": [
+        _idx("job_id", unique=True),
+        _idx("title"),
+        _idx("skills_norm"),
+        _idx("location_norm"),
+        _idx("company_norm"),
+        _idx("date_posted"),
+        _idx("updated_at"),
+        # field chuẩn hóa lúc ghi (app.normalize.prepare_job) dùng cho filter (app.filters.job_query)
+        _idx("skill_ids"),
+        _idx("location_id"),
+        _idx("location_id", "req_years"),
+        _idx("salary_min_vnd"),
+        _idx("salary_max_vnd"),
+        _idx("job_type_code"),
+        _idx("industry_code"),
+        _idx("posted_day"),
+        # filter ranking hay gặp: bản đại diện + ngành / loại job + mới đăng
+        _idx("dup_of", "posted_day"),
+        _idx("industry_code", "posted_day"),
+        _idx("job_type_code", "posted_day"),
+        # khử trùng (app.services.dedup)
+        _idx("job_hash"),
+        _idx("content_hash"),
+        _idx("lsh_bands"),
+        _idx("dup_of"),
+    ],
+    "candidates": [
+        _idx("cand_id", unique=True),
+        _idx("name"),
+        _idx("emails"),
+        _idx("skills_norm"),
+        _idx("locations"),
+        _idx("exp_years"),
+        _idx("updated_at"),
+        _idx("skill_ids"),
+        _idx("location_ids"),
+        _idx("location_ids", "exp_years"),
+        _idx("content_hash", "dup_of"),
+        _idx("lsh_bands"),
+        _idx("dup_of"),
+    ],
+    # rollup trends: 1 document / cửa sổ thời gian, _id = "7d" | "30d" | "90d" | "all"
+    TRENDS_COLLECTION: [
+        _idx("generated_at"),
+    ],
+}
+
+
+def ensure_indexes(db, indexes: Optional[Dict[str, List[IndexModel]]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Tạo index còn thiếu; trả về {collection: {"created": [...], "existing": [...], "failed": [...]}}."""
+    report: Dict[str, Dict[str, List[str]]] = {}
+    for coll_name, models in (indexes or INDEXES).items():
+        coll = db[coll_name]
+        have = set(coll.index_information())
+        rep = report[coll_name] = {"created": [], "existing": [], "failed": []}
+        for model in models:
+            name = model.document["name"]
+            if name in have:
+                rep["existing"].append(name)
+                continue
+            try:
+                coll.create_indexes([model])
+                rep["created"].append(name)
+            except OperationFailure as e:
+                # vd. unique trên dữ liệu đang trùng key, hoặc index cùng key khác option
+                logger.warning("[indexes] %s.%s not created: %s", coll_name, name, e)
+                rep["failed"].append(name)
+        if rep["created"]:
+            logger.info("[indexes] %s: created %s", coll_name, rep["created"])
+    return report
+
+
+# ---------- audit query plan ----------
+@dataclass
+class HotQuery:
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    projection: Optional[Dict[str, Any]] = None
+
+def hot_queries(now: Optional[datetime] = None) -> List[HotQuery]:
+    """Query nóng với giá trị mẫu (plan phụ thuộc hình dạng query, không phụ thuộc giá trị)."""
+    now = now or datetime.now(timezone.utc)
+    sample = RankFilters(locations=["Ho Chi Minh City"], min_exp_years=1, salary_min=10_000_000,
+                         job_types=["full-time"], industries=["it"], posted_within_days=30)
+    return [
+        HotQuery("job_by_id", "jobs", {"job_id": 1}),
+        HotQuery("jobs_by_ids", "jobs", {"job_id": {"$in": [1, 2, 3]}}),
+        HotQuery("jobs_list_active", "jobs", dict(ACTIVE_QUERY)),
+        HotQuery("jobs_filtered", "jobs", and_query(ACTIVE_QUERY, job_query(sample, now))),
+        HotQuery("jobs_posted_within", "jobs", and_query(ACTIVE_QUERY, job_query(RankFilters(posted_within_days=7), now))),
+        HotQuery("jobs_snapshot_poll", "jobs", {"updated_at": {"$gt": now - timedelta(seconds=5)}}),
+        HotQuery("jobs_trends_window", "jobs", window_match(30, now)),
+        HotQuery("jobs_dedup_lsh", "jobs", {"$or": [{"content_hash": "0" * 40}, {"lsh_bands": {"$in": [1, 2]}}]}),
+        HotQuery("cand_by_id", "candidates", {"cand_id": "x"}),
+        HotQuery("cands_by_ids", "candidates", {"cand_id": {"$in": ["x", "y"]}}),
+        HotQuery("cand_by_email", "candidates", {"emails": {"$in": ["a@example.com"]}}),
+        HotQuery("cand_by_content_hash", "candidates", {"content_hash": "0" * 40, **ACTIVE_QUERY}),
+        HotQuery("cands_list_active", "candidates", dict(ACTIVE_QUERY)),
+        HotQuery("cands_filtered", "candidates", and_query(ACTIVE_QUERY, candidate_query(sample))),
+        HotQuery("cands_snapshot_poll", "candidates", {"updated_at": {"$gt": now - timedelta(seconds=5)}}),
+        HotQuery("cands_dedup_lsh", "candidates", {"$or": [{"content_hash": "0" * 40}, {"lsh_bands": {"$in": [1, 2]}}]}),
+    ]
+
+def plan_stages(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Duyệt cây winningPlan (inputStage / inputStages / queryPlan của SBE) -> danh sách stage."""
+    out = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            out.append(node)
+        children = [node[k] for k in ("inputStage", "queryPlan") if k in node] + list(node.get("inputStages") or [])
+        stack.extend(reversed(children))
+    return out
+
+def summarize_explain(q: HotQuery, explain: Dict[str, Any]) -> Dict[str, Any]:
+    planner = explain.get("queryPlanner") or {}
+    stages = plan_stages(planner.get("winningPlan") or {})
+    stats = explain.get("executionStats") or {}
+    return {
+        "name": q.name,
+        "collection": q.collection,
+        "filter": repr(q.filter),
+        "stages": [s["stage"] for s in stages],
+        "indexes": sorted({s["indexName"] for s in stages if s.get("indexName")}),
+        "collscan": any(s["stage"] == "COLLSCAN" for s in stages),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "ms": stats.get("executionTimeMillis"),
+    }
+
+def explain_hot_queries(db, queries: Optional[List[HotQuery]] = None) -> Dict[str, Any]:
+    results = []
+    for q in queries or hot_queries():
+        try:
+            results.append(summarize_explain(q, db[q.collection].find(q.filter, q.projection).explain()))
+        except Exception as e:
+            results.append({"name": q.name, "collection": q.collection, "error": f"{type(e).__name__}: {e}"})
+    return {
+        "collscans": [r["name"] for r in results if r.get("collscan")],
+        "queries": results,
+    }
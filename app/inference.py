@@ -1,10 +1,22 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import math
 
-def _safe_lower_list(xs):
-    if not xs: return []
-    return [str(x).lower() for x in xs if isinstance(x, (str, int, float)) or x]
+import numpy as np
+
+from app.services.embedding_codec import doc_embedding
+from app.scoring import combine, iter_top_k, score_generation, score_matrix, top_k_indices
+from app import recency
+from app.normalize import normalize_loc, job_skills, job_location, job_req_years, job_posted, cand_skills, cand_locations, job_display
+from app.filters import and_query, candidate_mask, candidate_query, intersect_rows, job_mask, job_query
+from app.services.assignment import AssignResult, shortlist_edges, solve
+from app.services.dedup import ACTIVE_QUERY
+from app.services.explanations import ExplanationService, PairScore, reasons_from_docs
+from app.services.retrieval import HybridRetriever, RetrievalConfig, RetrievalQuery, tokens
+from app.services.snapshot import (
+    CANDIDATE_SPEC, JOB_SPEC, SKILL_VOCAB, LOC_VOCAB, RowFeatures, SnapshotGeneration, SnapshotSpec,
+    build_generation, dense_embeddings, features_from_doc,
+)
 
 def _jaccard(a: set, b: set) -> float:
     if not a and not b: return 0.0
@@ -13,135 +25,394 @@ def _jaccard(a: set, b: set) -> float:
 def _dot(a, b) -> float:
     if a is None or b is None: return 0.0
     # assume already normalized if created by encode(normalize_embeddings=True)
-    return float(sum(x*y for x, y in zip(a, b))) if len(a) == len(b) else 0.0
+    a = np.asarray(a, dtype=np.float32); b = np.asarray(b, dtype=np.float32)
+    return float(np.dot(a, b)) if a.shape == b.shape and a.size else 0.0
+
+def _assign_stats(res: AssignResult) -> Dict[str, Any]:
+    return {"edges": res.edges, "components": res.components,
+            "largest_component": res.largest_component, "solvers": dict(res.solvers)}
+
+# ---------- projections theo từng stage ----------
+CAND_SCORE_FIELDS = ["cand_id", "skills_norm", "locations", "exp_years", "skills_key", "location_codes", "norm_version",
+                     "ontology_version", "resume_embedding", "embedding"]
+CAND_TEXT_FIELDS = ["cand_id", "resume_summary", "resume_text"]
+JOB_SCORE_FIELDS = ["job_id", "skills_norm", "location_norm", "experience_level", "skills_key", "location_code", "req_years",
+                    "posted_day", "date_posted", "posting_age_days", "imported_at", "updated_at",
+                    "norm_version", "ontology_version", "embedding"]
+JOB_TEXT_FIELDS = ["job_id", "title", "description", "skills_norm"]
+JOB_DISPLAY_FIELDS = [
+    "job_id", "title", "description", "company_norm", "location_norm", "experience_level", "job_type",
+    "industry", "skills_norm", "salary_min_vnd", "salary_max_vnd", "salary_currency", "date_posted", "external_link",
+    "display",
+]
+
+def _projection(*field_lists) -> Dict[str, int]:
+    proj = {"_id": 0}
+    for fields in field_lists:
+        proj.update({f: 1 for f in fields})
+    return proj
+
+CAND_SCORE_PROJECTION = _projection(CAND_SCORE_FIELDS)
+CAND_TEXT_PROJECTION = _projection(CAND_TEXT_FIELDS)
+CAND_SCORE_TEXT_PROJECTION = _projection(CAND_SCORE_FIELDS, CAND_TEXT_FIELDS)
+JOB_SCORE_PROJECTION = _projection(JOB_SCORE_FIELDS)
+JOB_TEXT_PROJECTION = _projection(JOB_TEXT_FIELDS)
+JOB_SCORE_TEXT_PROJECTION = _projection(JOB_SCORE_FIELDS, JOB_TEXT_FIELDS)
+JOB_DISPLAY_PROJECTION = _projection(JOB_DISPLAY_FIELDS)
+
+# batch ranking: số query nhân cùng 1 lần (ma trận điểm (n, q) float32 giữ trong RAM)
+BATCH_QUERY_CHUNK = 64
+
+def _and_mask(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if a is None:
+        return b
+    return a if b is None else (a & b)
 
 class RankerService:
     """
     Service nhẹ nhàng: dùng Mongo + SBERT (nếu có) để tính điểm ngữ nghĩa + Jaccard skill + khớp location/industry.
-    Tài nguyên được inject ở app.main: self.db, self.sbert_model, self.summarizer, self.ready
+    Tài nguyên được inject ở app.main: self.db, self.sbert_model, self.summarizer, self.embedding_cache, self.ready
     """
     def __init__(self):
         self.ready = False
         self.db = None
         self.sbert_model = None
         self.summarizer = None
+        self.embedding_cache = None
+        self.cand_snapshot = None   # SnapshotManager (in-memory scoring columns)
+        self.job_snapshot = None
+        self.cand_shards = None     # ShardedScorer (chấm song song theo shard khi snapshot ứng viên lớn)
+        # hybrid retrieval (lexical + semantic + skill, RRF): shortlist trước khi chấm đầy đủ
+        self.retrieval_config = RetrievalConfig()
+        self.cand_retriever: Optional[HybridRetriever] = None
+        self.job_retriever: Optional[HybridRetriever] = None
+        # reasons chỉ dựng cho hàng được trả về + GET /explain (cache)
+        self.explanations = ExplanationService(self._job_features, self._cand_features, self._vocabs)
 
     # ---------- encode helper ----------
-    def _encode(self, text: str) -> Optional[List[float]]:
+    def _encode(self, text: str) -> Optional[np.ndarray]:
         try:
             if self.sbert_model is None:
                 return None
-            return self.sbert_model.encode([text], normalize_embeddings=True)[0].tolist()
+            if self.embedding_cache is not None:
+                return self.embedding_cache.encode(self.sbert_model, text)
+            return np.asarray(self.sbert_model.encode([text], normalize_embeddings=True)[0], dtype=np.float32)
         except Exception:
             return None
 
-    # ---------- scoring ----------
-    def _score_job_cand(self, job: Dict[str, Any], cand: Dict[str, Any]) -> Dict[str, Any]:
-        job_text = " ".join([
+    def encode_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Batch encode (dùng khi dựng snapshot cho document chưa có embedding)."""
+        if self.sbert_model is None or not texts:
+            return [None] * len(texts)
+        try:
+            if self.embedding_cache is not None:
+                return self.embedding_cache.encode(self.sbert_model, texts)
+            return [np.asarray(v, dtype=np.float32) for v in self.sbert_model.encode(texts, normalize_embeddings=True)]
+        except Exception:
+            return [None] * len(texts)
+
+    # ---------- vectors ----------
+    def _job_text(self, job: Dict[str, Any]) -> str:
+        return " ".join([
             str(job.get("title", "")),
             str(job.get("description", "")),
             " ".join(job.get("skills_norm", []) or [])
         ]).strip()
 
-        cand_text = (cand.get("resume_summary") or cand.get("resume_text") or "").strip()
+    def _job_vec(self, job: Dict[str, Any]) -> Optional[np.ndarray]:
+        # setup_database lưu sẵn embedding của đúng job_text này
+        vec = doc_embedding(job, ("embedding",))
+        return vec if vec is not None else self._encode(self._job_text(job))
 
-        job_vec = self._encode(job_text)
-        cand_vec = cand.get("resume_embedding")
-        if not cand_vec:
-            cand_vec = self._encode(cand_text)
+    def _cand_vec(self, cand: Dict[str, Any]) -> Optional[np.ndarray]:
+        vec = doc_embedding(cand)
+        if vec is not None:
+            return vec
+        return self._encode((cand.get("resume_summary") or cand.get("resume_text") or "").strip())
+
+    # ---------- scoring ----------
+    def _pair_score(self, job: Dict[str, Any], cand: Dict[str, Any],
+                    job_vec: Optional[np.ndarray] = None, cand_vec: Optional[np.ndarray] = None) -> PairScore:
+        """Kernel số cho 1 cặp document (đường Mongo khi tắt snapshot); reasons dựng riêng cho hàng được trả về."""
+        if job_vec is None:
+            job_vec = self._job_vec(job)
+        if cand_vec is None:
+            cand_vec = self._cand_vec(cand)
 
         semantic = _dot(job_vec, cand_vec)
 
-        s_job = set(_safe_lower_list(job.get("skills_norm")))
-        s_cand = set(_safe_lower_list(cand.get("skills_norm")))
-        jacc = _jaccard(s_job, s_cand)
-        overlap_skills = sorted(list(s_job & s_cand))
-        missing_skills = sorted(list(s_job - s_cand))
-
-        # Chuẩn hóa location: loại bỏ dấu, viết thường, rút gọn tên
-        def _normalize_loc(loc):
-            import re
-            loc = str(loc).lower().strip()
-            loc = re.sub(r"[^a-z0-9 ]", "", loc)
-            # rút gọn các tên phổ biến
-            if "ho chi minh" in loc or "hcm" in loc:
-                return "ho chi minh city"
-            if "ha noi" in loc or "hanoi" in loc:
-                return "hanoi"
-            if "da nang" in loc or "danang" in loc:
-                return "da nang"
-            return loc
-
-        loc_job = _normalize_loc(job.get("location_norm", ""))
-        locs_cand = set(_normalize_loc(l) for l in (cand.get("locations") or []))
-        loc_match = 1.0 if loc_job and loc_job in locs_cand else 0.0
-
-        def _to_years(x) -> float:
-            if x is None: return 0.0
-            if isinstance(x, (int, float)): return float(x)
-            import re
-            m = re.findall(r"(\d+(?:\.\d+)?)", str(x).lower())
-            return float(m[-1]) if m else 0.0
-
-        req_years = _to_years(job.get("experience_level"))
-        cand_years = float(cand.get("exp_years") or 0.0)
-        exp_ok = 1.0 if cand_years >= req_years else 0.0
-        exp_gap = max(0.0, req_years - cand_years)
-
-        score = (0.6 * semantic) + (0.3 * jacc) + (0.1 * (0.7*loc_match + 0.3*exp_ok))
-
-        reasons = {
-            "semantic": round(semantic, 4),
-            "skill_jaccard": round(jacc, 4),
-            "overlap_skills": overlap_skills[:12],
-            "missing_skills": missing_skills[:12],
-            "loc_job": loc_job,
-            "loc_cand": list(locs_cand),
-            "location_match": bool(loc_match),
-            "exp_required_years": req_years,
-            "exp_candidate_years": cand_years,
-            "exp_gap": exp_gap,
-            "score_hint": round(score, 4),
+        # field đã chuẩn hóa lúc ghi (app.normalize); document cũ mới phải chuẩn hóa lại
+        jacc = _jaccard(set(job_skills(job)), set(cand_skills(cand)))
+        loc_job = job_location(job)
+        loc_match = 1.0 if loc_job and loc_job in set(cand_locations(cand)) else 0.0
+        exp_ok = 1.0 if float(cand.get("exp_years") or 0.0) >= job_req_years(job) else 0.0
+
+        return PairScore(float(combine(semantic, jacc, loc_match, exp_ok)), semantic, jacc, loc_match, exp_ok)
+
+    # ---------- in-memory snapshot ----------
+    @staticmethod
+    def _gen(mgr) -> Optional[SnapshotGeneration]:
+        return mgr.current if mgr is not None else None
+
+    @classmethod
+    def _global_gen(cls, mgr) -> Optional[SnapshotGeneration]:
+        """Snapshot chỉ khi chứa toàn bộ collection (chế độ cluster giữ 1 phân vùng -> None, đọc Mongo)."""
+        return cls._gen(mgr) if mgr is None or mgr.partition is None else None
+
+    def _vocabs(self):
+        mgr = self.cand_snapshot or self.job_snapshot
+        return (mgr.skill_vocab, mgr.loc_vocab) if mgr is not None else (SKILL_VOCAB, LOC_VOCAB)
+
+    def _job_features(self, job_id) -> Optional[RowFeatures]:
+        gen = self._gen(self.job_snapshot)
+        if gen is not None and job_id in gen.row_of_key:
+            f = gen.features(gen.row_of_key[job_id])
+            if f.vec is not None or self.sbert_model is None:
+                return f
+        job = self.db["jobs"].find_one({"job_id": job_id}, JOB_SCORE_TEXT_PROJECTION)
+        return features_from_doc(JOB_SPEC, job, self._job_vec(job)) if job else None
+
+    def _cand_features(self, cand_id) -> Optional[RowFeatures]:
+        gen = self._gen(self.cand_snapshot)
+        if gen is not None and cand_id in gen.row_of_key:
+            f = gen.features(gen.row_of_key[cand_id])
+            if f.vec is not None or self.sbert_model is None:
+                return f
+        # ứng viên vừa upload có thể chưa vào snapshot
+        cand = self.db["candidates"].find_one({"cand_id": cand_id}, CAND_SCORE_TEXT_PROJECTION)
+        return features_from_doc(CANDIDATE_SPEC, cand, self._cand_vec(cand)) if cand else None
+
+    def _rank_candidates_snapshot(self, gen: SnapshotGeneration, job_id: int, top_k: int, filters=None):
+        return list(self._iter_candidates_snapshot(gen, job_id, top_k, filters))
+
+    def _iter_candidates_snapshot(self, gen: SnapshotGeneration, job_id: int, top_k: int,
+                                  filters=None) -> Iterator[Dict[str, Any]]:
+        """Top-k ứng viên theo thứ tự điểm; reasons chỉ dựng khi phần tử được lấy ra (stream dừng sớm không tốn)."""
+        job_f = self._job_features(job_id)
+        if job_f is None:
+            return
+        # filter -> mask trên cột snapshot, chỉ chấm các hàng còn lại
+        rows = intersect_rows(candidate_mask(gen, filters), None)
+        if rows is not None and rows.size == 0:
+            return
+        order = None
+        short = self._shortlist(self.cand_retriever, gen, job_f, lambda: self._job_text(
+            self.db["jobs"].find_one({"job_id": job_id}, JOB_TEXT_PROJECTION) or {}), rows)
+        if short is not None:
+            rows = short
+        elif self.cand_shards is not None:
+            hits = self.cand_shards.top_k(gen, job_f, top_k, filters)
+            if hits is not None:
+                # shard trả (hàng, điểm) đã trộn; thành phần cho reasons chỉ tính lại trên top_k hàng
+                if not hits:
+                    return
+                rows = np.fromiter((r for r, _ in hits), dtype=np.int64, count=len(hits))
+                order = range(len(hits))
+        score, sem, jacc, loc, _ = score_generation(gen, job_f.vec, job_f.skills, job_f.locs, job_f.years,
+                                                    query_is_job=True, rows=rows)
+        for i in (order if order is not None else iter_top_k(score, top_k)):
+            r = int(rows[i]) if rows is not None else i
+            yield {
+                "cand_id": gen.keys[r],
+                "score": float(score[i]),
+                "reasons": self.explanations.for_features(job_f, gen.features(r), sem[i], jacc[i], loc[i], score[i]),
+            }
+
+    def _search_jobs_snapshot(self, gen: SnapshotGeneration, cand_id: str, query: Dict[str, Any], top_k: int,
+                              filters=None, rec: Optional[recency.Recency] = None):
+        cand_f = self._cand_features(cand_id)
+        if cand_f is None:
+            return []
+        factor, keep, ages = self._recency_columns(gen, rec)
+        rows = intersect_rows(_and_mask(job_mask(gen, filters), keep), self._query_rows(gen, query))
+        if rows is not None and rows.size == 0:
+            return []
+        short = self._shortlist(self.job_retriever, gen, cand_f, lambda: CANDIDATE_SPEC.text(
+            self.db["candidates"].find_one({"cand_id": cand_id}, CAND_TEXT_PROJECTION) or {}), rows)
+        if short is not None:
+            rows = short
+        base, sem, jacc, loc, _ = score_generation(gen, cand_f.vec, cand_f.skills, cand_f.locs, cand_f.years,
+                                                   query_is_job=False, rows=rows)
+        score = base if factor is None else base * (factor[rows] if rows is not None else factor)
+        scored = []
+        for i in top_k_indices(score, top_k).tolist():
+            r = int(rows[i]) if rows is not None else i
+            reasons = self.explanations.for_features(gen.features(r), cand_f, sem[i], jacc[i], loc[i], base[i])
+            if factor is not None:
+                reasons.update(recency.reasons(ages[r], factor[r]))
+            scored.append({"job_id": gen.keys[r], "score": float(score[i]), "reasons": reasons})
+        return self._hydrated_job_rows(scored)
+
+    @staticmethod
+    def _shortlist(retriever: Optional[HybridRetriever], gen: SnapshotGeneration, feats: RowFeatures, text_fn,
+                   rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Hàng sau hybrid retrieval (chỉ các hàng này được chấm đầy đủ); None = chấm mọi hàng `rows` như cũ."""
+        if retriever is None or not retriever.active(gen):
+            return None
+        # text query chỉ đọc khi retrieval thực sự chạy
+        return retriever.shortlist(gen, RetrievalQuery(feats.vec, feats.skills, tokens(text_fn())), rows)
+
+    @staticmethod
+    def _recency_columns(gen: SnapshotGeneration, rec: Optional[recency.Recency]):
+        """(hệ số nhân (n,), mask còn hạn (n,), age_days (n,)) của job snapshot; None khi tắt recency."""
+        if rec is None or not rec.active:
+            return None, None, None
+        factor, keep = recency.snapshot_factors(gen, rec)
+        return factor, keep, recency.age_days(gen)
+
+    def _job_reasons(self, gen: SnapshotGeneration, r: int, cand_f: RowFeatures, sem, jacc, loc, base,
+                     factor: Optional[np.ndarray], ages: Optional[np.ndarray]) -> Dict[str, Any]:
+        reasons = self.explanations.for_features(gen.features(r), cand_f, sem, jacc, loc, base)
+        if factor is not None:
+            reasons.update(recency.reasons(ages[r], factor[r]))
+        return reasons
+
+    def _query_rows(self, gen: SnapshotGeneration, query: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Hàng của job snapshot khớp query Mongo (None = không lọc)."""
+        if not query:
+            return None
+        # keyword/location vẫn lọc bằng Mongo, chỉ lấy job_id
+        ids = [d.get("job_id") for d in self.db["jobs"].find(query, {"_id": 0, "job_id": 1})]
+        return np.asarray([gen.row_of_key[i] for i in ids if i in gen.row_of_key], dtype=np.int64)
+
+    # ---------- batch: nhiều job / nhiều ứng viên trong 1 lượt chấm ----------
+    def _features_many(self, mgr, spec: SnapshotSpec, keys: List[Any], projection: Dict[str, int],
+                       vec_fn) -> Dict[Any, RowFeatures]:
+        """RowFeatures cho nhiều key: lấy từ snapshot, phần còn thiếu đọc Mongo bằng 1 query $in."""
+        out: Dict[Any, RowFeatures] = {}
+        gen = self._gen(mgr)
+        todo = []
+        for k in keys:
+            if gen is not None and k in gen.row_of_key:
+                f = gen.features(gen.row_of_key[k])
+                if f.vec is not None or self.sbert_model is None:
+                    out[k] = f
+                    continue
+            todo.append(k)
+        if todo:
+            for d in self.db[spec.collection].find({spec.key: {"$in": todo}}, projection):
+                out[d.get(spec.key)] = features_from_doc(spec, d, vec_fn(d))
+        return out
+
+    def _mongo_generation(self, spec: SnapshotSpec, query: Dict[str, Any], projection: Dict[str, int],
+                          text_projection: Dict[str, int]) -> SnapshotGeneration:
+        """Khi tắt snapshot: đọc Mongo 1 lần, dựng generation tạm dùng chung cho cả batch."""
+        docs = list(self.db[spec.collection].find(and_query(spec.query, query), projection))
+        vecs = [doc_embedding(d, spec.embedding_fields) for d in docs]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        self._hydrate(spec.collection, spec.key, [docs[i] for i in missing], text_projection)
+        for i, v in zip(missing, self.encode_many([spec.text(docs[i]) for i in missing])):
+            vecs[i] = v
+        emb, has_emb = dense_embeddings(vecs)
+        return build_generation(spec, docs, emb, has_emb)
+
+    @staticmethod
+    def _batch_top_k(gen: SnapshotGeneration, queries: List[tuple], top_k: int, query_is_job: bool, rows=None,
+                     row_weight: Optional[np.ndarray] = None):
+        """
+        queries: [(key, RowFeatures)] -> (key, [(row, score, semantic, jaccard, loc_match, score_gốc)]) theo từng query.
+        row_weight: hệ số nhân theo hàng của gen (vd. recency), áp trước khi lấy top-k.
+        """
+        weight = None
+        if row_weight is not None:
+            weight = (row_weight[rows] if rows is not None else row_weight)[:, None]
+        for start in range(0, len(queries), BATCH_QUERY_CHUNK):
+            chunk = queries[start:start + BATCH_QUERY_CHUNK]
+            base, sem, jacc, loc, _ = score_matrix(gen, [f for _, f in chunk], query_is_job=query_is_job, rows=rows)
+            score = base if weight is None else base * weight
+            for j, (key, _) in enumerate(chunk):
+                col = score[:, j]
+                hits = []
+                for i in top_k_indices(col, top_k).tolist():
+                    r = int(rows[i]) if rows is not None else i
+                    hits.append((r, float(col[i]), sem[i, j], jacc[i, j], loc[i, j], base[i, j]))
+                yield key, hits
+
+    # ---------- fetch helpers ----------
+    def _hydrate(self, coll_name: str, key: str, docs: List[Dict[str, Any]], projection: Dict[str, int]) -> None:
+        """Bổ sung field còn thiếu cho docs bằng đúng 1 query $in (in-place)."""
+        ids = [d.get(key) for d in docs if d.get(key) is not None]
+        if not ids:
+            return
+        extra = {x.get(key): x for x in self.db[coll_name].find({key: {"$in": ids}}, projection)}
+        for d in docs:
+            d.update(extra.get(d.get(key)) or {})
+
+    def _fetch_display_jobs(self, job_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        if not job_ids:
+            return {}
+        return {j.get("job_id"): j for j in self.db["jobs"].find({"job_id": {"$in": list(job_ids)}}, JOB_DISPLAY_PROJECTION)}
+
+    def _job_row(self, job: Dict[str, Any], score: float, reasons: Dict[str, Any]) -> Dict[str, Any]:
+        job_norm = self._normalize_job_for_fe(job)
+        return {
+            "job_id": job_norm.get("job_id", 0),
+            "score": score,
+            "reasons": reasons,
+            "title": job_norm.get("title", ""),
+            "description": job_norm.get("description", ""),
+            "company_norm": job_norm.get("company_norm", ""),
+            "location_norm": job_norm.get("location_norm", ""),
+            "experience_level": job_norm.get("experience_level", ""),
+            "job_type": job_norm.get("job_type", ""),
+            "industry": job_norm.get("industry", ""),
+            "skills_norm": job_norm.get("skills_norm", []),
+            "salary_min_vnd": job_norm.get("salary_min_vnd"),
+            "salary_max_vnd": job_norm.get("salary_max_vnd"),
+            "salary_currency": job_norm.get("salary_currency", "VND"),
+            "date_posted": job_norm.get("date_posted"),
+            "external_link": job_norm.get("external_link", ""),
         }
-        return {"score": float(score), "reasons": reasons}
+
+    def _hydrated_job_rows(self, scored: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """scored: [{"job_id", "score", "reasons"}] đã cắt top_k -> row đầy đủ field hiển thị (1 query $in)."""
+        display = self._fetch_display_jobs([r["job_id"] for r in scored])
+        return [self._job_row(display.get(r["job_id"]) or {"job_id": r["job_id"]}, r["score"], r["reasons"]) for r in scored]
 
     # ---------- public APIs ----------
 
-    def score_jobs_by_keyword(self, keyword: str, top_k: int = 20) -> list:
+    def score_jobs_by_keyword(self, keyword: str, top_k: int = 20, location: Optional[str] = None, filters=None) -> list:
         """
-        Score all jobs in the database by relevance to the given keyword.
-        Uses semantic similarity and keyword matching in title/description/skills.
-        Returns top_k jobs sorted by score.
+        Top_k job theo keyword bằng hybrid retrieval: BM25 trên title/description/skills, semantic (vector keyword)
+        và skill index (skill nhận ra trong keyword) lấy top-N song song, trộn bằng RRF. Điểm = điểm fusion,
+        reasons = hạng / điểm của job trong từng kênh. location/filters giới hạn tập job trong mọi kênh.
         """
         if not self.ready or self.db is None or not keyword:
             return []
-        jobs_coll = self.db["jobs"]
-        job_docs = list(jobs_coll.find({}, {"_id": 0}))
+        query = self._job_query(None, location)
+        gen = self._gen(self.job_snapshot)
+        retriever = self.job_retriever
+        # không có snapshot (hoặc snapshot chỉ giữ 1 phân vùng cluster): chấm thẳng trên Mongo, không dựng index mỗi lượt
+        if gen is None or retriever is None or self.job_snapshot.partition is not None:
+            return self._score_jobs_by_keyword_mongo(keyword, top_k, query, filters)
+        rows = intersect_rows(job_mask(gen, filters), self._query_rows(gen, query))
+        if not len(gen) or (rows is not None and rows.size == 0):
+            return []
+        q = RetrievalQuery(self._encode(keyword), SKILL_VOCAB.scan(keyword), tokens(keyword))
+        k = max(1, int(top_k))
+        res = retriever.retrieve(gen, q, allowed_rows=rows, depth=max(k, retriever.config.depth), wait=True)
+        scored = [{
+            "job_id": gen.keys[r],
+            "score": round(float(sc), 6),
+            "reasons": {"fusion": retriever.config.fusion, "channels": res.explain(r)},
+        } for r, sc in zip(res.rows[:k].tolist(), res.scores[:k].tolist())]
+        return self._hydrated_job_rows(scored)
 
+    def _score_jobs_by_keyword_mongo(self, keyword: str, top_k: int, query: Dict[str, Any], filters=None) -> list:
+        """Không snapshot: semantic(keyword, job) + boost khi keyword xuất hiện trong title/description/skills."""
+        job_docs = list(self.db["jobs"].find(and_query(ACTIVE_QUERY, query, job_query(filters)), JOB_SCORE_TEXT_PROJECTION))
         keyword_lower = keyword.lower()
         keyword_vec = self._encode(keyword)
         scored = []
         for job in job_docs:
-            job_text = " ".join([
-                str(job.get("title", "")),
-                str(job.get("description", "")),
-                " ".join(job.get("skills_norm", []) or [])
-            ]).strip()
-            job_vec = self._encode(job_text)
-            semantic = _dot(keyword_vec, job_vec) if keyword_vec and job_vec else 0.0
-
-            # Keyword match boost
+            semantic = _dot(keyword_vec, self._job_vec(job))
             title_match = keyword_lower in str(job.get("title", "")).lower()
             desc_match = keyword_lower in str(job.get("description", "")).lower()
             skills_match = any(keyword_lower in str(s).lower() for s in job.get("skills_norm", []) or [])
             match_boost = 0.2 * (title_match + desc_match + skills_match)
-
-            score = semantic + match_boost
-
-            job_norm = self._normalize_job_for_fe(job)
             scored.append({
-                "job_id": job_norm.get("job_id", 0),
-                "score": round(score, 4),
+                "job_id": job.get("job_id", 0),
+                "score": round(semantic + match_boost, 4),
                 "reasons": {
                     "semantic": round(semantic, 4),
                     "title_match": bool(title_match),
@@ -149,60 +420,165 @@ class RankerService:
                     "skills_match": bool(skills_match),
                     "match_boost": match_boost,
                 },
-                "title": job_norm.get("title", ""),
-                "description": job_norm.get("description", ""),
-                "company_norm": job_norm.get("company_norm", ""),
-                "location_norm": job_norm.get("location_norm", ""),
-                "experience_level": job_norm.get("experience_level", ""),
-                "job_type": job_norm.get("job_type", ""),
-                "industry": job_norm.get("industry", ""),
-                "skills_norm": job_norm.get("skills_norm", []),
-                "salary_min_vnd": job_norm.get("salary_min_vnd"),
-                "salary_max_vnd": job_norm.get("salary_max_vnd"),
-                "salary_currency": job_norm.get("salary_currency", "VND"),
-                "date_posted": job_norm.get("date_posted"),
-                "external_link": job_norm.get("external_link", ""),
             })
         scored.sort(key=lambda x: x["score"], reverse=True)
-        return scored[:max(1, int(top_k))]
-    def rank_candidates_for_job(self, job_id:int, top_k:int=20):
+        return self._hydrated_job_rows(scored[:max(1, int(top_k))])
+
+    def rank_candidates_for_job(self, job_id:int, top_k:int=20, filters=None):
         if not self.ready or self.db is None:
             return []
-        job = self.db["jobs"].find_one({"job_id": int(job_id)}, {"_id": 0})
+        gen = self._gen(self.cand_snapshot)
+        if gen is not None:
+            return self._rank_candidates_snapshot(gen, int(job_id), top_k, filters)
+
+        job = self.db["jobs"].find_one({"job_id": int(job_id)}, JOB_SCORE_TEXT_PROJECTION)
         if not job:
             return []
+        job_vec = self._job_vec(job)
 
-        cand_docs = list(self.db["candidates"].find({}, {"_id": 0}))
-        rows = []
-        for c in cand_docs:
-            sc = self._score_job_cand(job, c)
-            rows.append({
-                "cand_id": c.get("cand_id"),
-                "score": sc["score"],
-                "reasons": sc["reasons"]
-            })
+        # Chỉ lấy field cần cho scoring; text resume chỉ tải cho ứng viên chưa có embedding
+        # filter đẩy xuống Mongo (index location_ids / exp_years) trước khi tải và chấm
+        cand_docs = list(self.db["candidates"].find(and_query(ACTIVE_QUERY, candidate_query(filters)), CAND_SCORE_PROJECTION))
+        self._hydrate("candidates", "cand_id", [c for c in cand_docs if doc_embedding(c) is None], CAND_TEXT_PROJECTION)
+        pairs = [self._pair_score(job, c, job_vec=job_vec) for c in cand_docs]
+        if not pairs:
+            return []
+        # chỉ số điểm cho mọi ứng viên; reasons chỉ dựng cho top_k
+        top = top_k_indices(np.asarray([p.score for p in pairs], dtype=np.float64), top_k).tolist()
+        return [{
+            "cand_id": cand_docs[i].get("cand_id"),
+            "score": pairs[i].score,
+            "reasons": reasons_from_docs(job, cand_docs[i], pairs[i]),
+        } for i in top]
 
-        rows.sort(key=lambda x: x["score"], reverse=True)
-        return rows[: max(1, int(top_k))]
+    def iter_candidates_for_job(self, job_id: int, top_k: int = 20, filters=None) -> Iterator[Dict[str, Any]]:
+        """Như rank_candidates_for_job nhưng trả generator (stream top_k lớn): chấm bằng kernel cột, heap chọn dần."""
+        if not self.ready or self.db is None:
+            return iter(())
+        gen = self._gen(self.cand_snapshot)
+        if gen is None:
+            # không có snapshot: đọc Mongo 1 lần thành generation tạm (filter đã đẩy xuống query)
+            gen = self._mongo_generation(CANDIDATE_SPEC, candidate_query(filters), CAND_SCORE_PROJECTION,
+                                         CAND_TEXT_PROJECTION)
+            filters = None
+        return self._iter_candidates_snapshot(gen, int(job_id), top_k, filters)
 
-    def _capitalize_first(self, s):
-        if isinstance(s, str) and s:
-            return s[0].upper() + s[1:] if len(s) > 1 else s.upper()
-        return s
+    def rank_candidates_for_jobs(self, job_ids: List[int], top_k: int = 20, filters=None) -> Dict[str, Any]:
+        """Top-k ứng viên cho nhiều job: 1 phép nhân ma trận (ứng viên x job) thay vì quét lại theo từng job."""
+        if not self.ready or self.db is None:
+            return {"results": [], "missing_job_ids": []}
+        job_ids = list(dict.fromkeys(int(j) for j in job_ids))
+        feats = self._features_many(self.job_snapshot, JOB_SPEC, job_ids, JOB_SCORE_TEXT_PROJECTION, self._job_vec)
+        queries = [(j, feats[j]) for j in job_ids if j in feats]
+        results = []
+        if queries:
+            gen = self._gen(self.cand_snapshot)
+            rows = None
+            if gen is not None:
+                rows = intersect_rows(candidate_mask(gen, filters), None)
+            else:
+                gen = self._mongo_generation(CANDIDATE_SPEC, candidate_query(filters), CAND_SCORE_PROJECTION,
+                                             CAND_TEXT_PROJECTION)
+            for job_id, hits in self._batch_top_k(gen, queries, top_k, query_is_job=True, rows=rows):
+                job_f = feats[job_id]
+                results.append({"job_id": job_id, "candidates": [
+                    {"cand_id": gen.keys[r], "score": score,
+                     "reasons": self.explanations.for_features(job_f, gen.features(r), sem, jacc, loc, score)}
+                    for r, score, sem, jacc, loc, _ in hits
+                ]})
+        return {"results": results, "missing_job_ids": [j for j in job_ids if j not in feats]}
 
-    def _normalize_job_for_fe(self, job: dict) -> dict:
-        # Viết hoa đầu dòng cho các trường hiển thị
-        job = job.copy()
-        for k in ["title", "company_norm", "location_norm", "experience_level", "job_type", "industry"]:
-            if k in job and isinstance(job[k], str):
-                job[k] = self._capitalize_first(job[k])
-        return job
-
-    def search_jobs_for_candidate(self, cand_id: Optional[str], keyword: Optional[str], top_k:int=10, location: Optional[str]=None):
+    def search_jobs_for_candidates(self, cand_ids: List[str], keyword: Optional[str] = None, top_k: int = 10,
+                                   location: Optional[str] = None, filters=None,
+                                   rec: Optional[recency.Recency] = None) -> Dict[str, Any]:
+        """Top-k job cho nhiều ứng viên trong 1 lượt chấm; field hiển thị tải bằng 1 query $in cho mọi kết quả."""
         if not self.ready or self.db is None:
-            return []
-        jobs_coll = self.db["jobs"]
+            return {"results": [], "missing_cand_ids": []}
+        cand_ids = list(dict.fromkeys(str(c) for c in cand_ids))
+        feats = self._features_many(self.cand_snapshot, CANDIDATE_SPEC, cand_ids, CAND_SCORE_TEXT_PROJECTION, self._cand_vec)
+        queries = [(c, feats[c]) for c in cand_ids if c in feats]
+        query = self._job_query(keyword, location)
+        rec = rec or recency.Recency()
+        scored = []
+        if queries:
+            gen = self._gen(self.job_snapshot)
+            if gen is not None:
+                factor, keep, ages = self._recency_columns(gen, rec)
+                rows = intersect_rows(_and_mask(job_mask(gen, filters), keep), self._query_rows(gen, query))
+            else:
+                gen = self._mongo_generation(JOB_SPEC, and_query(query, job_query(filters)), JOB_SCORE_PROJECTION,
+                                             JOB_TEXT_PROJECTION)
+                factor, keep, ages = self._recency_columns(gen, rec)
+                rows = intersect_rows(keep, None)
+            if rows is None or rows.size:
+                for cand_id, hits in self._batch_top_k(gen, queries, top_k, query_is_job=False, rows=rows,
+                                                       row_weight=factor):
+                    cand_f = feats[cand_id]
+                    scored.append((cand_id, [
+                        (gen.keys[r], score, self._job_reasons(gen, r, cand_f, sem, jacc, loc, base, factor, ages))
+                        for r, score, sem, jacc, loc, base in hits
+                    ]))
+            else:
+                scored = [(c, []) for c, _ in queries]
+        display = self._fetch_display_jobs(list({job_id for _, hits in scored for job_id, _, _ in hits}))
+        results = [
+            {"cand_id": cand_id, "jobs": [
+                self._job_row(display.get(job_id) or {"job_id": job_id}, score, reasons) for job_id, score, reasons in hits
+            ]}
+            for cand_id, hits in scored
+        ]
+        return {"results": results, "missing_cand_ids": [c for c in cand_ids if c not in feats]}
 
+    def assign_candidates(self, job_ids: List[int], headcount: Optional[Dict[int, int]] = None, default_headcount: int = 1,
+                          cand_ids: Optional[List[str]] = None, shortlist_k: int = 50, min_score: float = 0.0) -> Dict[str, Any]:
+        """Ghép 1-1 (hoặc theo headcount) nhiều ứng viên vào nhiều job, tối đa tổng điểm trên shortlist top-k."""
+        # cùng shape với kết quả đầy đủ, giá trị rỗng / 0
+        empty = {"assignments": [], "open_slots": {}, "unassigned_candidates": 0, "total_score": 0.0,
+                 "missing_job_ids": [], "missing_cand_ids": [], "stats": _assign_stats(AssignResult())}
+        if not self.ready or self.db is None:
+            return empty
+        headcount = {int(k): int(v) for k, v in (headcount or {}).items()}
+        job_ids = list(dict.fromkeys(int(j) for j in job_ids))
+        feats = self._features_many(self.job_snapshot, JOB_SPEC, job_ids, JOB_SCORE_TEXT_PROJECTION, self._job_vec)
+        found = [j for j in job_ids if j in feats]
+        # ghép cặp cần mọi ứng viên cùng lúc, không rải theo phân vùng được
+        gen = self._global_gen(self.cand_snapshot)
+        if gen is None:
+            query = {"cand_id": {"$in": [str(c) for c in cand_ids]}} if cand_ids is not None else {}
+            gen = self._mongo_generation(CANDIDATE_SPEC, query, CAND_SCORE_PROJECTION, CAND_TEXT_PROJECTION)
+        rows, missing_cands = None, []
+        if cand_ids is not None:
+            cand_ids = list(dict.fromkeys(str(c) for c in cand_ids))
+            rows = np.asarray([gen.row_of_key[c] for c in cand_ids if c in gen.row_of_key], dtype=np.int64)
+            missing_cands = [c for c in cand_ids if c not in gen.row_of_key]
+        n_cands = len(rows) if rows is not None else len(gen)
+        empty.update(missing_job_ids=[j for j in job_ids if j not in feats], missing_cand_ids=missing_cands,
+                     unassigned_candidates=n_cands)
+        if not found or (rows is not None and rows.size == 0):
+            return empty
+
+        capacity = {i: max(0, headcount.get(j, default_headcount)) for i, j in enumerate(found)}
+        edges = shortlist_edges(gen, [feats[j] for j in found], shortlist_k, shortlist_k, rows=rows, min_score=min_score)
+        res = solve(edges, capacity)
+        open_slots = dict(capacity)
+        for j, _, _ in res.pairs:
+            open_slots[j] -= 1
+        return {
+            "assignments": [{"job_id": found[j], "cand_id": gen.keys[r], "score": round(sc, 4)} for j, r, sc in res.pairs],
+            "open_slots": {found[j]: n for j, n in open_slots.items() if n > 0},
+            "unassigned_candidates": n_cands - len(res.pairs),
+            "total_score": round(sum(sc for _, _, sc in res.pairs), 4),
+            "missing_job_ids": empty["missing_job_ids"],
+            "missing_cand_ids": missing_cands,
+            "stats": _assign_stats(res),
+        }
+
+    def _normalize_job_for_fe(self, job: dict) -> dict:
+        # Field hiển thị (viết hoa đầu dòng) đã lưu sẵn trong job["display"]
+        return job_display(job)
+
+    @staticmethod
+    def _job_query(keyword: Optional[str], location: Optional[str]) -> Dict[str, Any]:
         # Build query for jobs
         query = {}
         if keyword:
@@ -212,60 +588,57 @@ class RankerService:
                 {"skills_norm": {"$elemMatch": {"$regex": keyword, "$options": "i"}}}
             ]
         if location and location.lower() != "all":
-            query["location_norm"] = {"$regex": location, "$options": "i"}
+            # như RankFilters.locations: id ontology trên field location_id có index thay cho $regex quét cả collection
+            loc_id = LOC_VOCAB.id(normalize_loc(location))
+            if loc_id is not None:
+                query["location_id"] = loc_id
+        return query
 
-        # Luôn lấy toàn bộ job đã lọc, không giới hạn số lượng
-        job_docs = list(jobs_coll.find(query, {"_id": 0}))
+    def search_jobs_for_candidate(self, cand_id: Optional[str], keyword: Optional[str], top_k:int=10, location: Optional[str]=None,
+                                  filters=None, rec: Optional[recency.Recency] = None):
+        if not self.ready or self.db is None:
+            return []
+        jobs_coll = self.db["jobs"]
+        query = self._job_query(keyword, location)
+        rec = rec or recency.Recency()
 
         if cand_id:
-            cand = self.db["candidates"].find_one({"cand_id": str(cand_id)}, {"_id": 0})
+            gen = self._gen(self.job_snapshot)
+            if gen is not None:
+                return self._search_jobs_snapshot(gen, str(cand_id), query, top_k, filters, rec)
+
+            # không có snapshot: filter gộp vào query Mongo (field chuẩn hóa có index)
+            query = and_query(ACTIVE_QUERY, query, job_query(filters))
+            cand = self.db["candidates"].find_one({"cand_id": str(cand_id)}, CAND_SCORE_TEXT_PROJECTION)
             if not cand:
                 return []
-            scored = []
+            cand_vec = self._cand_vec(cand)
+
+            # Scoring trên toàn bộ job đã lọc, chỉ với field cần thiết
+            job_docs = list(jobs_coll.find(query, JOB_SCORE_PROJECTION))
+            self._hydrate("jobs", "job_id", [j for j in job_docs if doc_embedding(j, ("embedding",)) is None], JOB_TEXT_PROJECTION)
+            kept, pairs, scores, ages = [], [], [], []
+            day = recency.today()
             for j in job_docs:
-                sc = self._score_job_cand(j, cand)
-                job_norm = self._normalize_job_for_fe(j)
-                scored.append({
-                    "job_id": job_norm.get("job_id", 0),
-                    "score": sc["score"],
-                    "reasons": sc["reasons"],
-                    "title": job_norm.get("title", ""),
-                    "description": job_norm.get("description", ""),
-                    "company_norm": job_norm.get("company_norm", ""),
-                    "location_norm": job_norm.get("location_norm", ""),
-                    "experience_level": job_norm.get("experience_level", ""),
-                    "job_type": job_norm.get("job_type", ""),
-                    "industry": job_norm.get("industry", ""),
-                    "skills_norm": job_norm.get("skills_norm", []),
-                    "salary_min_vnd": job_norm.get("salary_min_vnd"),
-                    "salary_max_vnd": job_norm.get("salary_max_vnd"),
-                    "salary_currency": job_norm.get("salary_currency", "VND"),
-                    "date_posted": job_norm.get("date_posted"),
-                    "external_link": job_norm.get("external_link", ""),
-                })
-            # Sort toàn bộ job đã lọc theo score, lấy top_k
-            scored.sort(key=lambda x: x["score"], reverse=True)
-            return scored[:max(1, int(top_k))]
+                age = recency.doc_age(job_posted(j), day) if rec.active else None
+                if recency.expired(age, rec):
+                    continue
+                ps = self._pair_score(j, cand, cand_vec=cand_vec)
+                kept.append(j); pairs.append(ps); ages.append(age)
+                scores.append(ps.score * recency.doc_factor(age, rec) if rec.active else ps.score)
+            if not kept:
+                return []
+            # lấy top_k theo điểm rồi mới dựng reasons và tải field hiển thị
+            scored = []
+            for i in top_k_indices(np.asarray(scores, dtype=np.float64), top_k).tolist():
+                reasons = reasons_from_docs(kept[i], cand, pairs[i])
+                if rec.active:
+                    reasons.update(recency.reasons(ages[i], recency.doc_factor(ages[i], rec)))
+                scored.append({"job_id": kept[i].get("job_id", 0), "score": scores[i], "reasons": reasons})
+            return self._hydrated_job_rows(scored)
+        elif keyword:
+            # không có ứng viên: xếp job theo độ liên quan với keyword (hybrid retrieval trên snapshot)
+            return self.score_jobs_by_keyword(keyword, top_k, location, filters)
         else:
-            jobs_out = []
-            for j in job_docs:
-                job_norm = self._normalize_job_for_fe(j)
-                jobs_out.append({
-                    "job_id": job_norm.get("job_id", 0),
-                    "score": 0.0,
-                    "reasons": {},
-                    "title": job_norm.get("title", ""),
-                    "description": job_norm.get("description", ""),
-                    "company_norm": job_norm.get("company_norm", ""),
-                    "location_norm": job_norm.get("location_norm", ""),
-                    "experience_level": job_norm.get("experience_level", ""),
-                    "job_type": job_norm.get("job_type", ""),
-                    "industry": job_norm.get("industry", ""),
-                    "skills_norm": job_norm.get("skills_norm", []),
-                    "salary_min_vnd": job_norm.get("salary_min_vnd"),
-                    "salary_max_vnd": job_norm.get("salary_max_vnd"),
-                    "salary_currency": job_norm.get("salary_currency", "VND"),
-                    "date_posted": job_norm.get("date_posted"),
-                    "external_link": job_norm.get("external_link", ""),
-                })
-            return jobs_out[:max(1, int(top_k))]
+            job_docs = jobs_coll.find(and_query(ACTIVE_QUERY, query, job_query(filters)), JOB_DISPLAY_PROJECTION).limit(max(1, int(top_k)))
+            return [self._job_row(j, 0.0, {}) for j in job_docs]
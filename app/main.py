@@ -1,50 +1,63 @@
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 from contextlib import asynccontextmanager
-import re
+import logging
 
-from fastapi import FastAPI, Body, HTTPException
+from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import ConnectionFailure
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+from app.database import MongoResources
+from app.indexes import ensure_indexes, explain_hot_queries
 from app.services.summarizer import BartSummarizer
+from app.services.embedding_cache import EmbeddingCache
+from app.services.snapshot import SnapshotManager, CANDIDATE_SPEC, JOB_SPEC
+from app.services.shards import ShardedScorer
+from app.services.retrieval import HybridRetriever, RetrievalConfig
+from app.services.cluster import ClusterClient, ClusterRanker, ClusterSettings
+from app.services.vector_store import MmapEmbeddingStore
+from app.services.trends import TrendsService, WINDOWS
+from app.serialization import FastJSONResponse, parse_fields, select
+from app.services.streaming import MEDIA_TYPES, stream_items
+from app.services.keywords import group_keywords, KeywordAggregate, iter_keyword_lists, analyze_batch, stream_batch_ndjson
 from app.inference import RankerService
+from app.normalize import job_public
+from app.ontology import ONTOLOGY
+from app.recency import Recency
 from app.schemas import (
     RankRequest, RankResponseItem,
     JobSearchRequest, JobSearchResponseItem,
-    JobDetails,
+    JobDetails, KeywordBatchRequest,
+    BatchRankRequest, BatchRankResponse, BatchJobSearchRequest, BatchJobSearchResponse,
+    AssignRequest,
 )
 from app.upload import router as upload_router
 
-# ------------ Skill groups (cho /analyze/keywords) ------------
-TECH_GROUP = {
-    "python","java","javascript","typescript","c#","cpp","php","go",
-    "html","css","react","vue","node.js","django","flask","spring",
-    "sql","nosql","aws","gcp","azure","docker","kubernetes","spark","hadoop"
-}
-SOFT_GROUP = {"communication","teamwork","problem-solving"}
-BUZZWORDS = {"agile","scrum","devops","cloud","ai","ml","data science","big data","microservices","blockchain"}
-
 # ------------ Service instance (inject tài nguyên trong lifespan) ------------
 svc = RankerService()
 svc.ready = False
+logger = logging.getLogger("main")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Config
-    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-    mongo_db  = os.getenv("MONGO_DB",  "matching_db")
+    # Config (Mongo: MONGO_URI, MONGO_DB, pool / timeout / retry -> app.database.MongoSettings)
     sbert_id  = os.getenv("SBERT_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     bart_id   = os.getenv("BART_MODEL",  "facebook/bart-base")
 
-    # Mongo
-    mcli = MongoClient(mongo_uri)
-    db = mcli[mongo_db]
-    existing = set(db.list_collection_names())
-    if "candidates" not in existing: db.create_collection("candidates")
-    if "jobs" not in existing: db.create_collection("jobs")
+    # Mongo: client async cho route CRUD / upload, client sync cho scoring + snapshot (threadpool / thread nền)
+    mongo = MongoResources()
+    await mongo.ensure_collections()
+    db = mongo.db
+    # index khai báo trong app/indexes.py (idempotent; tắt bằng MONGO_ENSURE_INDEXES=0)
+    if os.getenv("MONGO_ENSURE_INDEXES", "1") == "1":
+        try:
+            await run_in_threadpool(ensure_indexes, db)
+        except Exception as e:
+            logger.warning("Index check failed: %s", e)
 
     # SBERT
     try:
@@ -52,6 +65,14 @@ async def lifespan(app: FastAPI):
     except Exception:
         sbert = None  # fallback semantic = 0
 
+    # Embedding cache dùng chung (ranker + upload)
+    embedding_cache = EmbeddingCache(
+        model_id=sbert_id,
+        max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "20000")),
+        max_bytes=int(float(os.getenv("EMBED_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        dtype=os.getenv("EMBED_CACHE_DTYPE", "float32"),
+    )
+
     # BART (fallback nếu lỗi)
     try:
         summarizer = BartSummarizer(model_id=bart_id)
@@ -62,13 +83,105 @@ async def lifespan(app: FastAPI):
         summarizer = _NoopSum()
 
     # Expose vào app.state và inject vào service
+    app.state.mongo = mongo
     app.state.db = db
     app.state.sbert_model = sbert
     app.state.bart_summarizer = summarizer
+    app.state.embedding_cache = embedding_cache
 
     svc.db = db
     svc.sbert_model = sbert
+    svc.embedding_cache = embedding_cache
     svc.summarizer = summarizer
+
+    # Vector store mmap dùng chung giữa các worker (tùy chọn)
+    vector_stores = {}
+    store_dir = os.getenv("VECTOR_STORE_DIR")
+    if store_dir:
+        threshold = int(os.getenv("VECTOR_STORE_COMPACT_THRESHOLD", "5000"))
+        vector_stores = {
+            name: MmapEmbeddingStore(os.path.join(store_dir, name), compact_threshold=threshold)
+            for name in ("candidates", "jobs")
+        }
+    app.state.vector_stores = vector_stores
+
+    # Cluster (CLUSTER_PEERS, CLUSTER_SHARD): snapshot chỉ giữ phân vùng của node này, ranking rải sang peer
+    cluster_settings = ClusterSettings.from_env()
+    partition = cluster_settings.partition if cluster_settings.enabled else None
+
+    # Snapshot cột scoring trong RAM (tắt bằng SNAPSHOT_ENABLED=0)
+    snapshots = []
+    if os.getenv("SNAPSHOT_ENABLED", "1") == "1":
+        try:
+            poll = float(os.getenv("SNAPSHOT_POLL_SECONDS", "5"))
+            full_reload = float(os.getenv("SNAPSHOT_FULL_RELOAD_SECONDS", "600"))
+            svc.cand_snapshot = SnapshotManager(db, CANDIDATE_SPEC, encode_texts=svc.encode_many, poll_seconds=poll,
+                                                full_reload_seconds=full_reload, vector_store=vector_stores.get("candidates"),
+                                                partition=partition)
+            svc.job_snapshot = SnapshotManager(db, JOB_SPEC, encode_texts=svc.encode_many, poll_seconds=poll,
+                                               full_reload_seconds=full_reload, vector_store=vector_stores.get("jobs"),
+                                               partition=partition)
+            snapshots = [svc.cand_snapshot, svc.job_snapshot]
+            for mgr in snapshots:
+                mgr.load()
+                mgr.start()
+        except Exception as e:
+            logger.warning("Snapshot disabled, falling back to Mongo scoring: %s", e)
+            for mgr in snapshots:
+                mgr.stop()
+            svc.cand_snapshot = svc.job_snapshot = None
+            snapshots = []
+    app.state.snapshots = snapshots
+
+    # Chấm song song theo shard cho snapshot ứng viên lớn (SHARD_WORKERS >= 2 bật; cần snapshot)
+    shard_workers = int(os.getenv("SHARD_WORKERS", "0"))
+    svc.cand_shards = None
+    if shard_workers >= 2 and svc.cand_snapshot is not None:
+        svc.cand_shards = ShardedScorer(
+            shard_workers,
+            root=os.getenv("SHARD_DIR") or None,
+            shards=int(os.getenv("SHARD_COUNT", "0")),
+            min_rows=int(os.getenv("SHARD_MIN_ROWS", "200000")),
+            republish_seconds=float(os.getenv("SHARD_REPUBLISH_SECONDS", "60")),
+            max_delta_fraction=float(os.getenv("SHARD_MAX_DELTA_FRACTION", "0.05")),
+        )
+        svc.cand_shards.maybe_publish(svc.cand_snapshot.current)
+    app.state.shards = svc.cand_shards
+
+    # Hybrid retrieval (BM25 + vector IVF + skill index, RRF): RETRIEVAL_ENABLED=1 -> ranking theo cặp chỉ chấm
+    # đầy đủ shortlist sau fusion khi snapshot >= RETRIEVAL_MIN_ROWS; keyword search luôn dùng hybrid
+    svc.retrieval_config = RetrievalConfig.from_env()
+    svc.cand_retriever = svc.job_retriever = None
+    if svc.cand_snapshot is not None:
+        svc.cand_retriever = HybridRetriever(db, CANDIDATE_SPEC, svc.retrieval_config)
+        svc.job_retriever = HybridRetriever(db, JOB_SPEC, svc.retrieval_config)
+        if svc.retrieval_config.enabled:
+            svc.cand_retriever.maybe_build(svc.cand_snapshot.current)
+            svc.job_retriever.maybe_build(svc.job_snapshot.current)
+    app.state.retrievers = [r for r in (svc.cand_retriever, svc.job_retriever) if r is not None]
+
+    # Trends: đọc từ collection job_trends qua cache TTL
+    app.state.trends = TrendsService(
+        db,
+        cache_ttl=float(os.getenv("TRENDS_CACHE_SECONDS", "300")),
+        max_age=float(os.getenv("TRENDS_MAX_AGE_SECONDS", "3600")),
+    )
+
+    # Giải thích theo yêu cầu (GET /explain): cache LRU + TTL
+    svc.explanations.max_size = int(os.getenv("EXPLAIN_CACHE_SIZE", "10000"))
+    svc.explanations.ttl = float(os.getenv("EXPLAIN_CACHE_SECONDS", "300"))
+    # document đổi trong snapshot -> bỏ giải thích đã cache của job/ứng viên đó (None = full reload, xóa hết)
+    if svc.job_snapshot is not None:
+        svc.job_snapshot.listeners.append(
+            lambda keys: svc.explanations.invalidate_many(job_ids=keys) if keys is not None else svc.explanations.invalidate_many())
+    if svc.cand_snapshot is not None:
+        svc.cand_snapshot.listeners.append(
+            lambda keys: svc.explanations.invalidate_many(cand_ids=keys) if keys is not None else svc.explanations.invalidate_many())
+
+    cluster = ClusterClient(cluster_settings) if cluster_settings.enabled else None
+    app.state.cluster = cluster
+    app.state.ranker = ClusterRanker(svc, cluster) if cluster is not None else svc
+
     svc.ready = True
     app.state.svc = svc
 
@@ -76,10 +189,19 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         svc.ready = False
-        # mcli.close()  # tùy bạn
+        for mgr in snapshots:
+            mgr.stop()
+        if svc.cand_shards is not None:
+            svc.cand_shards.close()
+        for r in app.state.retrievers:
+            r.close()
+        if cluster is not None:
+            cluster.close()
+        await mongo.close()
 
 # ------------ FastAPI app ------------
-app = FastAPI(title="JD/CV Matching API", version="1.0", lifespan=lifespan)
+# Response mặc định encode bằng orjson (app.serialization); route ranking trả thẳng FastJSONResponse
+app = FastAPI(title="JD/CV Matching API", version="1.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # ------------ CORS ------------
 origins_env = os.getenv("CORS_ORIGINS", "*")
@@ -92,6 +214,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pool Mongo hết chỗ (waitQueueTimeoutMS) / không chọn được server -> 503 thay vì 500
+@app.exception_handler(ConnectionFailure)
+async def mongo_unavailable(request: Request, exc: ConnectionFailure):
+    logger.warning("Mongo unavailable on %s: %s", request.url.path, exc)
+    return JSONResponse(status_code=503, content={"detail": "Database unavailable"})
+
 # ------------ Routers (/candidates/*: upload + upload-and-match + summary + matches) ------------
 app.include_router(upload_router)
 
@@ -101,41 +229,167 @@ def health():
     return {"status": "ok", "ready": bool(getattr(svc, "ready", False))}
 
 # ------------ Ranking / Search ------------
+# Chế độ cluster: request đến từ client được rải sang mọi phân vùng; peer gọi với ?local=1 chỉ chấm phân vùng của nó
+def _ranker(local: bool):
+    return svc if local else getattr(app.state, "ranker", svc)
+
+def _ranked(ranker, fn: str, *args, view=None) -> FastJSONResponse:
+    """
+    Gọi ranking (local hoặc rải cluster) rồi trả FastJSONResponse: dữ liệu nội bộ đã đúng dạng response_model
+    nên không validate lại từng item; view (fields= / snippet=) áp trước khi encode.
+    """
+    headers = {}
+    if ranker is svc:
+        out = getattr(svc, fn)(*args)
+    else:
+        meta: Dict = {}
+        out = getattr(ranker, fn)(*args, meta=meta)
+        headers = meta.get("headers") or {}
+    return FastJSONResponse(view(out) if view is not None else out, headers=headers)
+
+def _view(key: str, fields: Optional[str], snippet: Optional[int], items_key: Optional[str] = None):
+    """fields=a,b,c (luôn kèm key + score), snippet=N cắt description còn N ký tự; items_key: response batch."""
+    selected = parse_fields(fields)
+    if selected is None and not snippet:
+        return None
+    trim = lambda rows: select(rows, selected, always=(key, "score"), snippet_chars=snippet)
+    if items_key is None:
+        return trim
+    return lambda out: {**out, "results": [{**r, items_key: trim(r[items_key])} for r in out["results"]]}
+
 @app.post("/rank/candidates", response_model=list[RankResponseItem], tags=["ranking"])
-def rank_candidates(req: RankRequest):
+def rank_candidates(req: RankRequest, local: bool = False, fields: Optional[str] = None):
     if not getattr(svc, "ready", False):
         raise HTTPException(status_code=503, detail="Service not ready")
-    return svc.rank_candidates_for_job(req.job_id, req.top_k)
+    view = _view("cand_id", fields, None)
+    if req.stream:
+        return _stream_candidates(req, local, view)
+    return _ranked(_ranker(local), "rank_candidates_for_job", req.job_id, req.top_k, req.filters, view=view)
+
+def _stream_candidates(req: RankRequest, local: bool, view=None) -> StreamingResponse:
+    if req.stream_format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"stream_format must be one of {sorted(MEDIA_TYPES)}")
+    ranker = _ranker(local)
+    headers = {}
+    if ranker is svc:
+        items = svc.iter_candidates_for_job(req.job_id, req.top_k, req.filters)
+    else:
+        # cluster: top-k của các phân vùng được trộn trước, phần stream chỉ là serialize
+        meta: Dict = {}
+        items = iter(ranker.rank_candidates_for_job(req.job_id, req.top_k, req.filters, meta=meta))
+        headers = meta.get("headers") or {}
+    if view is not None:
+        items = (view([row])[0] for row in items)
+    return StreamingResponse(stream_items(items, req.stream_format, summary={"job_id": req.job_id}),
+                             media_type=MEDIA_TYPES[req.stream_format], headers=headers)
+
+def _recency(req) -> Recency:
+    return Recency.from_request(req.half_life_days, req.recency_weight, req.max_age_days)
 
 @app.post("/search/jobs", tags=["ranking"])
-def search_jobs(req: JobSearchRequest):
+def search_jobs(req: JobSearchRequest, local: bool = False, fields: Optional[str] = None,
+                snippet: Optional[int] = None):
     if not getattr(svc, "ready", False):
         raise HTTPException(status_code=503, detail="Service not ready")
-    return svc.search_jobs_for_candidate(req.cand_id, req.keyword, req.top_k)
+    return _ranked(_ranker(local), "search_jobs_for_candidate",
+                   req.cand_id, req.keyword, req.top_k, req.location, req.filters, _recency(req),
+                   view=_view("job_id", fields, snippet))
 
-# ------------ Keyword grouping ------------
-def group_keywords(skills: List[str]) -> Dict[str, List[str]]:
-    tech = [s for s in skills if s.lower() in TECH_GROUP]
-    soft = [s for s in skills if s.lower() in SOFT_GROUP]
-    buzz = [s for s in skills if s.lower() in BUZZWORDS]
-    other = [s for s in skills if s.lower() not in (TECH_GROUP | SOFT_GROUP | BUZZWORDS)]
-    return {"technical": tech, "soft": soft, "buzzwords": buzz, "other": other}
+# Batch: nhiều job / ứng viên dùng chung 1 lượt chấm điểm dạng ma trận
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "500"))
+
+@app.post("/rank/candidates/batch", response_model=BatchRankResponse, tags=["ranking"])
+def rank_candidates_batch(req: BatchRankRequest, local: bool = False, fields: Optional[str] = None):
+    if not getattr(svc, "ready", False):
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if not req.job_ids or len(req.job_ids) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"job_ids must contain 1..{MAX_BATCH_QUERIES} ids")
+    return _ranked(_ranker(local), "rank_candidates_for_jobs", req.job_ids, req.top_k, req.filters,
+                   view=_view("cand_id", fields, None, "candidates"))
+
+@app.post("/search/jobs/batch", response_model=BatchJobSearchResponse, tags=["ranking"])
+def search_jobs_batch(req: BatchJobSearchRequest, local: bool = False, fields: Optional[str] = None,
+                      snippet: Optional[int] = None):
+    if not getattr(svc, "ready", False):
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if not req.cand_ids or len(req.cand_ids) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"cand_ids must contain 1..{MAX_BATCH_QUERIES} ids")
+    return _ranked(_ranker(local), "search_jobs_for_candidates",
+                   req.cand_ids, req.keyword, req.top_k, req.location, req.filters, _recency(req),
+                   view=_view("job_id", fields, snippet, "jobs"))
+
+# ------------ Explanation (1 cặp job / ứng viên, tính khi được hỏi) ------------
+@app.get("/explain/{job_id}/{cand_id}", tags=["ranking"])
+def explain_match(job_id: int, cand_id: str):
+    if not getattr(svc, "ready", False):
+        raise HTTPException(status_code=503, detail="Service not ready")
+    out = svc.explanations.explain(job_id, cand_id)
+    if out is None:
+        raise HTTPException(status_code=404, detail="Job or candidate not found")
+    return out
+
+# ------------ Assignment (campus drive) ------------
+@app.post("/match/assign", tags=["ranking"])
+def match_assign(req: AssignRequest):
+    if not getattr(svc, "ready", False):
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if not req.job_ids:
+        raise HTTPException(status_code=400, detail="job_ids is required")
+    if req.shortlist_k < 1:
+        raise HTTPException(status_code=400, detail="shortlist_k must be >= 1")
+    return svc.assign_candidates(req.job_ids, req.headcount, req.default_headcount, req.cand_ids,
+                                 req.shortlist_k, req.min_score)
 
+# ------------ Keyword grouping ------------
+# group_keywords: app.services.keywords (alias -> nhóm tra sẵn từ ontology)
 @app.post("/analyze/keywords", tags=["utils"])
 def analyze_keywords(keywords: List[str] = Body(..., embed=True)):
     return group_keywords(keywords)
 
+@app.post("/analyze/keywords/batch", tags=["utils"])
+def analyze_keywords_batch(req: KeywordBatchRequest):
+    if not req.keyword_lists and not req.cand_ids:
+        raise HTTPException(status_code=400, detail="keyword_lists or cand_ids is required")
+    db = getattr(app.state, "db", None)
+    if req.cand_ids and db is None:
+        raise HTTPException(status_code=503, detail="Database not initialized")
+    agg = KeywordAggregate(ONTOLOGY, top_n=max(0, req.top_n))
+    items = iter_keyword_lists(db, req.keyword_lists, req.cand_ids, missing=agg.missing)
+    if req.stream:
+        return StreamingResponse(stream_batch_ndjson(items, agg, req.include_items), media_type="application/x-ndjson")
+    return analyze_batch(items, agg, req.include_items)
+
+# ------------ Trends ------------
+def _trends() -> TrendsService:
+    trends = getattr(app.state, "trends", None)
+    if trends is None:
+        raise HTTPException(status_code=503, detail="Trends service not initialized")
+    return trends
+
+@app.get("/trends", tags=["trends"])
+def get_trends(window: str = "30d", top_n: int = 20):
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {list(WINDOWS)}")
+    doc = {k: v for k, v in _trends().get(window).items() if k != "_id"}
+    for key in ("skills", "locations"):
+        doc[key] = doc.get(key, [])[:max(0, top_n)]
+    return doc
+
+@app.post("/trends/refresh", tags=["trends"])
+def refresh_trends():
+    return [{"window": d["window"], "job_count": d["job_count"], "took_ms": d["took_ms"]} for d in _trends().refresh()]
+
 # ------------ Jobs ------------
+JOB_LIST_PROJECTION = {"_id": 0, "embedding": 0, "display": 0, "skills_key": 0, "job_text_orig": 0}
+
 @app.get("/jobs", response_model=list[Dict], tags=["jobs"])
-def get_jobs():
-    db = app.state.db
-    jobs = [map_job_fields(job) for job in db["jobs"].find({}, {"_id": 0})]
-    return jobs
+async def get_jobs():
+    # field hiển thị đã chuẩn hóa lúc ghi (app.normalize.prepare_job); map_job_fields chỉ còn cho document CSV thô
+    return [job_public(job) for job in await app.state.mongo.jobs.list_active(JOB_LIST_PROJECTION)]
 
 @app.get("/jobs/{job_id}", response_model=JobDetails, tags=["jobs"])
-def get_job_details(job_id: int):
-    db = app.state.db
-    job = db["jobs"].find_one({"job_id": int(job_id)}, {"_id": 0})
+async def get_job_details(job_id: int):
+    job = await app.state.mongo.jobs.get(int(job_id), {"_id": 0})
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     return JobDetails(
@@ -157,15 +411,16 @@ def get_job_details(job_id: int):
     )
 
 # ------------ Candidates (read-only) ------------
+# Embedding lưu dạng BSON Binary, không trả về client
+CANDIDATE_PUBLIC_PROJECTION = {"_id": 0, "resume_embedding": 0, "embedding": 0}
+
 @app.get("/candidates", response_model=list[Dict], tags=["candidates"])
-def get_candidates():
-    db = app.state.db
-    return list(db["candidates"].find({}, {"_id": 0}))
+async def get_candidates():
+    return await app.state.mongo.candidates.list_active(CANDIDATE_PUBLIC_PROJECTION)
 
 @app.get("/candidates/{cand_id}", response_model=Dict, tags=["candidates"])
-def get_candidate_details(cand_id: str):  # UUID string
-    db = app.state.db
-    candidate = db["candidates"].find_one({"cand_id": cand_id}, {"_id": 0})
+async def get_candidate_details(cand_id: str):  # UUID string
+    candidate = await app.state.mongo.candidates.get(cand_id, CANDIDATE_PUBLIC_PROJECTION)
     if not candidate:
         raise HTTPException(status_code=404, detail="Candidate not found")
     return candidate
@@ -174,37 +429,50 @@ load_dotenv()  # Tự động đọc file .env trong thư mục dự án
 @app.get("/debug/deps")
 def debug_deps():
     return {
-        "db": bool(getattr(app.state, "db", None)),
+        "db": getattr(app.state, "db", None) is not None,
+        "mongo": app.state.mongo.stats() if getattr(app.state, "mongo", None) else None,
         "sbert": bool(getattr(app.state, "sbert_model", None)),
         "bart": bool(getattr(app.state, "bart_summarizer", None)),
         "svc_ready": bool(getattr(app.state, "svc", None) and getattr(app.state.svc, "ready", False)),
     }
 
-def parse_salary_range(salary_str):
-    # Ví dụ: "35M VND/month - 41M VND/month"
-    matches = re.findall(r"(\d+)[Mm]", salary_str)
-    if len(matches) == 2:
-        min_salary = int(matches[0]) * 1000000
-        max_salary = int(matches[1]) * 1000000
-        return min_salary, max_salary
-    return None, None
-
-def map_job_fields(job):
-    min_salary, max_salary = parse_salary_range(job.get("Salary Range", ""))
-    return {
-        "job_id": job.get("JobID", 0),
-        "title": job.get("Job Title", ""),
-        "description": job.get("Job Description", ""),
-        "company_norm": job.get("Company", ""),
-        "location_norm": job.get("Location", ""),
-        "experience_level": job.get("Experience Level", ""),
-        "job_type": job.get("Job Type", ""),
-        "industry": job.get("Industry", ""),
-        "skills_norm": [s.strip() for s in job.get("Required Skills", "").split(",")],
-        "salary_min_vnd": min_salary,
-        "salary_max_vnd": max_salary,
-        "salary_currency": "VND",
-        "date_posted": job.get("Date Posted", ""),
-        "external_link": job.get("externalApplyLink", "") or job.get("url", ""),
-        "job_url": job.get("url", ""),
-    }
+@app.get("/debug/snapshots")
+def debug_snapshots():
+    return [mgr.stats() for mgr in getattr(app.state, "snapshots", [])]
+
+@app.get("/debug/cluster")
+def debug_cluster():
+    cluster = getattr(app.state, "cluster", None)
+    return cluster.stats() if cluster is not None else {"enabled": False}
+
+@app.get("/debug/retrieval")
+def debug_retrieval():
+    return [r.stats() for r in getattr(app.state, "retrievers", [])]
+
+@app.get("/debug/shards")
+def debug_shards():
+    shards = getattr(app.state, "shards", None)
+    return shards.stats() if shards is not None else {"enabled": False}
+
+@app.get("/debug/explain")
+def debug_explain():
+    # explain() các query nóng; "collscans" liệt kê query còn quét toàn collection
+    db = getattr(app.state, "db", None)
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not initialized")
+    return explain_hot_queries(db)
+
+@app.get("/debug/ontology")
+def debug_ontology():
+    return ONTOLOGY.stats()
+
+@app.get("/debug/explain-cache")
+def debug_explain_cache():
+    return svc.explanations.stats()
+
+@app.get("/debug/embedding-cache")
+def debug_embedding_cache():
+    cache = getattr(app.state, "embedding_cache", None)
+    if cache is None:
+        raise HTTPException(status_code=503, detail="Embedding cache not initialized")
+    return cache.stats()
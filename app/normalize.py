@@ -0,0 +1,215 @@
+"""
+Chuẩn hóa tại thời điểm ghi (upload / import / normalize scripts).
+prepare_job / prepare_candidate trả về các field dẫn xuất được lưu cùng document:
+- skills_key      : tên skill chuẩn theo ontology, unique, đã sort (Jaccard không cần lower lại)
+- skill_ids       : id int của skills_key (app.ontology; id âm = skill ngoài từ điển), có index
+- location_code(s): tên location chuẩn, location_id(s): id int tương ứng
+- req_years       : số năm kinh nghiệm yêu cầu của job (to_years(experience_level))
+- salary_min_vnd / salary_max_vnd : parse từ chuỗi lương nếu chưa có
+- display         : các field hiển thị đã viết hoa chữ đầu
+- posted_day      : ngày đăng (số ngày kể từ 1970-01-01) từ date_posted, hoặc imported_at - posting_age_days
+- job_type_code / industry_code : job_type / industry chỉ giữ a-z0-9 ("Full-time", "fulltime" -> "fulltime"), có index cho filter
+- norm_version / ontology_version : khớp version hiện tại thì read path dùng thẳng, không chuẩn hóa lại
+Read path dùng các accessor job_skills/job_location/... (fallback cho document cũ).
+"""
+from __future__ import annotations
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.scoring import safe_lower_list, normalize_loc, to_years
+from app.ontology import ONTOLOGY
+
+NORM_VERSION = 4
+
+JOB_DISPLAY_KEYS = ("title", "company_norm", "location_norm", "experience_level", "job_type", "industry")
+JOB_PUBLIC_FIELDS = (
+    "job_id", "title", "description", "company_norm", "location_norm", "experience_level", "job_type",
+    "industry", "skills_norm", "salary_min_vnd", "salary_max_vnd", "salary_currency", "date_posted",
+    "external_link", "job_url",
+)
+# field dẫn xuất luôn có trong kết quả prepare_* và field nguồn mà prepare_* đọc
+JOB_NORM_FIELDS = ("skills_key", "skill_ids", "location_code", "location_id", "req_years", "display",
+                   "job_type_code", "industry_code", "posted_day", "norm_version", "ontology_version")
+RAW_JOB_FIELDS = ("JobID", "Job Title", "Job Description", "Company", "Location", "Experience Level", "Job Type",
+                  "Industry", "Required Skills", "Salary Range", "Date Posted", "externalApplyLink", "url")
+JOB_SOURCE_FIELDS = ("skills_norm", "location_norm", "experience_level", "salary_min_vnd", "salary_max_vnd",
+                     "salary_text", "salary", "date_posted", "posting_age_days", "imported_at", "updated_at") + JOB_DISPLAY_KEYS + RAW_JOB_FIELDS
+CANDIDATE_NORM_FIELDS = ("skills_key", "skill_ids", "location_codes", "location_ids", "exp_years",
+                         "norm_version", "ontology_version")
+CANDIDATE_SOURCE_FIELDS = ("skills_norm", "locations", "exp_years")
+
+_SALARY_M = re.compile(r"(\d+)[Mm]")
+_CODE_STRIP = re.compile(r"[^a-z0-9]")
+_EPOCH = date(1970, 1, 1)
+
+
+# ---------- per-value ----------
+def skills_key(skills) -> List[str]:
+    canonical = ONTOLOGY.skills.canonical
+    return sorted({canonical(s) for s in safe_lower_list(skills)} - {""})
+
+def attr_code(s) -> str:
+    """Mã so khớp cho field phân loại (job_type, industry): viết thường, bỏ ký tự ngoài a-z0-9."""
+    return _CODE_STRIP.sub("", str(s or "").lower())
+
+def posted_day(value) -> Optional[float]:
+    """date_posted (datetime hoặc chuỗi "YYYY-MM-DD...") -> số ngày kể từ 1970-01-01, None nếu không parse được."""
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str) and len(value) >= 10:
+        try:
+            value = date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    if not isinstance(value, date):
+        return None
+    return float((value - _EPOCH).days)
+
+def job_posted_day(job: Dict[str, Any]) -> Optional[float]:
+    """Ngày đăng: date_posted nếu parse được, nếu không thì ngày import/cập nhật trừ posting_age_days."""
+    day = posted_day(job.get("date_posted"))
+    age = job.get("posting_age_days")
+    if day is None and isinstance(age, (int, float)) and not isinstance(age, bool):
+        ref = posted_day(job.get("imported_at") or job.get("updated_at"))
+        if ref is not None:
+            day = ref - float(age)
+    return day
+
+def capitalize_first(s):
+    if isinstance(s, str) and s:
+        return s[0].upper() + s[1:] if len(s) > 1 else s.upper()
+    return s
+
+def parse_salary_range(salary_str) -> Tuple[Optional[int], Optional[int]]:
+    # Ví dụ: "35M VND/month - 41M VND/month"
+    matches = _SALARY_M.findall(salary_str or "") if isinstance(salary_str, str) else []
+    if len(matches) == 2:
+        return int(matches[0]) * 1000000, int(matches[1]) * 1000000
+    return None, None
+
+
+# ---------- raw CSV schema ("Job Title", "Salary Range", ...) ----------
+def map_job_fields(job: Dict[str, Any]) -> Dict[str, Any]:
+    min_salary, max_salary = parse_salary_range(job.get("Salary Range", ""))
+    return {
+        "job_id": job.get("JobID", 0),
+        "title": job.get("Job Title", ""),
+        "description": job.get("Job Description", ""),
+        "company_norm": job.get("Company", ""),
+        "location_norm": job.get("Location", ""),
+        "experience_level": job.get("Experience Level", ""),
+        "job_type": job.get("Job Type", ""),
+        "industry": job.get("Industry", ""),
+        "skills_norm": [s.strip() for s in job.get("Required Skills", "").split(",")],
+        "salary_min_vnd": min_salary,
+        "salary_max_vnd": max_salary,
+        "salary_currency": "VND",
+        "date_posted": job.get("Date Posted", ""),
+        "external_link": job.get("externalApplyLink", "") or job.get("url", ""),
+        "job_url": job.get("url", ""),
+    }
+
+def is_raw_job(job: Dict[str, Any]) -> bool:
+    return "Job Title" in job and not job.get("title")
+
+
+# ---------- write time ----------
+def prepare_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Field cần $set thêm cho 1 job (gồm cả field chuẩn nếu document ở schema CSV thô)."""
+    out: Dict[str, Any] = {}
+    if is_raw_job(job):
+        out.update(map_job_fields(job))
+    src = {**job, **out}
+
+    if src.get("salary_min_vnd") is None and src.get("salary_max_vnd") is None:
+        lo, hi = parse_salary_range(src.get("salary_text") or src.get("salary") or src.get("Salary Range"))
+        if lo is not None:
+            out["salary_min_vnd"], out["salary_max_vnd"] = lo, hi
+
+    out["skills_key"] = skills_key(src.get("skills_norm"))
+    out["skill_ids"] = ONTOLOGY.skills.ids(out["skills_key"])
+    out["location_code"] = normalize_loc(src.get("location_norm") or "")
+    out["location_id"] = ONTOLOGY.locations.id(out["location_code"])
+    out["req_years"] = to_years(src.get("experience_level"))
+    out["display"] = {k: capitalize_first(src.get(k, "")) for k in JOB_DISPLAY_KEYS}
+    out["job_type_code"] = attr_code(src.get("job_type"))
+    out["industry_code"] = attr_code(src.get("industry"))
+    out["posted_day"] = job_posted_day(src)
+    out.update(_versions())
+    return out
+
+def prepare_candidate(cand: Dict[str, Any]) -> Dict[str, Any]:
+    codes = sorted({normalize_loc(l) for l in (cand.get("locations") or []) if l} - {""})
+    key = skills_key(cand.get("skills_norm"))
+    return {
+        "skills_key": key,
+        "skill_ids": ONTOLOGY.skills.ids(key),
+        "location_codes": codes,
+        "location_ids": ONTOLOGY.locations.ids(codes),
+        "exp_years": float(cand.get("exp_years") or 0.0),
+        **_versions(),
+    }
+
+def _versions() -> Dict[str, int]:
+    return {"norm_version": NORM_VERSION, "ontology_version": ONTOLOGY.version}
+
+
+# ---------- read time (fallback cho document chưa chuẩn hóa) ----------
+def _normalized(doc: Dict[str, Any]) -> bool:
+    # ontology đổi version -> tên chuẩn có thể khác, coi như chưa chuẩn hóa cho tới khi chạy lại normalize script
+    return doc.get("norm_version") == NORM_VERSION and doc.get("ontology_version") == ONTOLOGY.version
+
+def job_skills(job: Dict[str, Any]) -> List[str]:
+    return job["skills_key"] if _normalized(job) and "skills_key" in job else skills_key(job.get("skills_norm"))
+
+def job_location(job: Dict[str, Any]) -> str:
+    return job["location_code"] if _normalized(job) and "location_code" in job else normalize_loc(job.get("location_norm", ""))
+
+def job_req_years(job: Dict[str, Any]) -> float:
+    return float(job["req_years"]) if _normalized(job) and "req_years" in job else to_years(job.get("experience_level"))
+
+def job_type_code(job: Dict[str, Any]) -> str:
+    return job["job_type_code"] if _normalized(job) and "job_type_code" in job else attr_code(job.get("job_type"))
+
+def job_industry_code(job: Dict[str, Any]) -> str:
+    return job["industry_code"] if _normalized(job) and "industry_code" in job else attr_code(job.get("industry"))
+
+def job_posted(job: Dict[str, Any]) -> Optional[float]:
+    if _normalized(job) and "posted_day" in job:
+        return job["posted_day"]
+    return job_posted_day(job)
+
+def cand_skills(cand: Dict[str, Any]) -> List[str]:
+    return cand["skills_key"] if _normalized(cand) and "skills_key" in cand else skills_key(cand.get("skills_norm"))
+
+def cand_locations(cand: Dict[str, Any]) -> List[str]:
+    if _normalized(cand) and "location_codes" in cand:
+        return cand["location_codes"]
+    return [normalize_loc(l) for l in (cand.get("locations") or [])]
+
+def job_display(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job cho FE: field hiển thị lấy từ `display` đã lưu, chỉ viết hoa lại khi document cũ."""
+    out = {k: v for k, v in job.items() if k != "display"}
+    display = job.get("display")
+    if isinstance(display, dict):
+        out.update(display)
+    else:
+        for k in JOB_DISPLAY_KEYS:
+            if isinstance(out.get(k), str):
+                out[k] = capitalize_first(out[k])
+    return out
+
+def job_public(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape của GET /jobs."""
+    if is_raw_job(job):
+        return map_job_fields(job)
+    out = {k: job.get(k) for k in JOB_PUBLIC_FIELDS}
+    out["job_id"] = out["job_id"] or 0
+    out["salary_currency"] = out["salary_currency"] or "VND"
+    for k in ("title", "description", "company_norm", "location_norm", "experience_level", "job_type",
+              "industry", "date_posted", "external_link", "job_url"):
+        if out[k] is None:
+            out[k] = ""
+    out["skills_norm"] = out["skills_norm"] or []
+    return out
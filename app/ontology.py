@@ -0,0 +1,283 @@
+"""
+Ontology skill/location dùng chung cho parse CV, chuẩn hóa lúc ghi, scoring và /analyze/keywords.
+- Nguồn: data/ontology.json (có "version"); đổi file -> tăng version -> chạy lại normalize script
+- Term chuẩn có id int dày 0..n-1 theo thứ tự trong file; alias -> id tra bằng dict
+- Term ngoài từ điển có id âm chỉ phụ thuộc chuỗi đã chuẩn hóa (hash 63 bit): giống nhau giữa các process/worker,
+  không phụ thuộc thứ tự gặp, trùng giả gần như không xảy ra
+- Tên của id âm: LRU có giới hạn (ONTOLOGY_UNKNOWN_CACHE) + id được pin bởi snapshot generation còn sống;
+  skills_key / location_code dựng từ chuỗi chuẩn (canonical), không đi vòng qua id
+- Quét text tự do (CV, mô tả job) bằng trie theo token, lấy match dài nhất ("spring boot" trước "spring")
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("ontology")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ontology.json")
+
+# nhãn nhóm skill -> key trả về của /analyze/keywords
+GROUP_LABELS = {"technical": "technical", "soft": "soft", "buzzword": "buzzwords"}
+GROUP_KEYS = ("technical", "soft", "buzzwords", "other")
+
+_WS = re.compile(r"\s+")
+_TOKEN = re.compile(r"\.?[\w#+]+(?:[./\-][\w#+]+)*")
+_SUBTOKEN = re.compile(r"[\w#+]+")
+_LOC_STRIP = re.compile(r"[^a-z0-9 ]")
+_END = ""  # key đánh dấu cuối alias trong trie
+
+
+def normalize_term(s: Any) -> str:
+    return _WS.sub(" ", unicodedata.normalize("NFC", str(s)).lower()).strip()
+
+def tokenize(s: Any) -> List[str]:
+    return _TOKEN.findall(normalize_term(s))
+
+def unknown_id(term: str) -> int:
+    h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "big")
+    return -(h & 0x7FFF_FFFF_FFFF_FFFF) - 1
+
+def _clean_location(term: str) -> str:
+    # giống normalize_loc cũ: bỏ ký tự ngoài a-z0-9 và khoảng trắng
+    return _LOC_STRIP.sub("", term).strip()
+
+
+class TermDictionary:
+    """
+    Id cho 1 loại term (skills hoặc locations). API id/ids/get/name dùng thẳng làm vocab của SnapshotManager.
+    """
+    def __init__(self, entries: Dict[str, dict], clean=None, scan_fallback: bool = False, unknown_cache: int = 50_000):
+        self.names: List[str] = [normalize_term(n) for n in entries]
+        self.groups: List[Optional[str]] = [e.get("group") for e in entries.values()]
+        self._alias: Dict[str, int] = {}
+        self._trie: Dict[str, Any] = {}
+        for i, (name, e) in enumerate(entries.items()):
+            for alias in [name, *e.get("aliases", [])]:
+                toks = tokenize(alias)
+                if not toks:
+                    continue
+                self._alias.setdefault(normalize_term(alias), i)
+                self._alias.setdefault(" ".join(toks), i)
+                node = self._trie
+                for t in toks:
+                    node = node.setdefault(t, {})
+                node.setdefault(_END, i)
+        self.implies: List[Tuple[int, ...]] = [
+            tuple(self._alias[normalize_term(x)] for x in e.get("implies", []) if normalize_term(x) in self._alias)
+            for e in entries.values()
+        ]
+        self._clean = clean
+        self._scan_fallback = scan_fallback
+        # tên term ngoài từ điển: id -> term (LRU) và id -> [term, số generation đang pin]
+        self._unknown: "OrderedDict[int, str]" = OrderedDict()
+        self._pinned: Dict[int, List[Any]] = {}
+        self._unknown_cache = max(1, int(unknown_cache))
+        self.unknown_collisions = 0
+        self._lock = threading.Lock()
+
+    # ---------- exact lookup ----------
+    def lookup(self, s: Any) -> Optional[int]:
+        """Id của term trong từ điển (alias chính xác), None nếu không có."""
+        a = normalize_term(s)
+        i = self._alias.get(a)
+        if i is None and a:
+            i = self._alias.get(" ".join(tokenize(a)))
+        return i
+
+    def _resolve(self, s: Any) -> Tuple[Optional[int], str]:
+        """(id, tên chuẩn) của term; rỗng -> (None, "")."""
+        i = self.lookup(s)
+        if i is not None:
+            return i, self.names[i]
+        if self._scan_fallback:
+            # "District 1, Ho Chi Minh" -> ho chi minh city; nhiều match thì lấy term đứng trước trong file
+            found = self.scan(s)
+            if found:
+                i = min(found)
+                return i, self.names[i]
+        term = normalize_term(s)
+        if self._clean is not None:
+            term = self._clean(term)
+        if not term:
+            return None, ""
+        i = unknown_id(term)
+        self._remember(i, term)
+        return i, term
+
+    def _remember(self, i: int, term: str) -> None:
+        with self._lock:
+            known = self._unknown.get(i)
+            if known is None:
+                pin = self._pinned.get(i)
+                known = pin[0] if pin is not None else None
+            if known is not None and known != term:
+                self.unknown_collisions += 1
+                logger.warning("Unknown-term hash collision: %r and %r share id %d", known, term, i)
+            self._unknown[i] = term
+            self._unknown.move_to_end(i)
+            while len(self._unknown) > self._unknown_cache:
+                self._unknown.popitem(last=False)
+
+    def id(self, s: Any) -> Optional[int]:
+        """Id của term: trong từ điển -> id >= 0, ngoài từ điển -> id âm (hash), rỗng -> None."""
+        if isinstance(s, int) and not isinstance(s, bool):
+            return s
+        return self._resolve(s)[0]
+
+    def ids(self, xs: Iterable[Any], unknown_names: Optional[Dict[int, str]] = None) -> List[int]:
+        """Id unique đã sort; unknown_names (nếu truyền) nhận id âm -> tên, để pin theo generation."""
+        out = set()
+        for x in xs:
+            if x is None or x == "":
+                continue
+            i, term = (x, None) if isinstance(x, int) and not isinstance(x, bool) else self._resolve(x)
+            if i is None:
+                continue
+            out.add(i)
+            if unknown_names is not None and i < 0 and term is not None:
+                unknown_names[i] = term
+        return sorted(out)
+
+    def get(self, s: Any) -> Optional[int]:
+        return self.lookup(s)
+
+    def name(self, i: int) -> str:
+        i = int(i)
+        if i >= 0:
+            return self.names[i]
+        with self._lock:
+            term = self._unknown.get(i)
+            if term is None:
+                pin = self._pinned.get(i)
+                term = pin[0] if pin is not None else None
+        return term if term is not None else str(i)
+
+    def canonical(self, s: Any) -> str:
+        """Tên chuẩn của term (term ngoài từ điển: chuỗi đã chuẩn hóa), không qua bảng tên của id."""
+        if isinstance(s, int) and not isinstance(s, bool):
+            return self.name(s)
+        return self._resolve(s)[1]
+
+    # ---------- pin tên id âm theo vòng đời của owner (snapshot generation) ----------
+    def pin(self, owner: Any, unknown_names: Dict[int, str]) -> None:
+        if not unknown_names:
+            return
+        with self._lock:
+            for i, term in unknown_names.items():
+                pin = self._pinned.get(i)
+                if pin is None:
+                    self._pinned[i] = [term, 1]
+                else:
+                    pin[1] += 1
+        weakref.finalize(owner, self._unpin, list(unknown_names))
+
+    def _unpin(self, ids: List[int]) -> None:
+        with self._lock:
+            for i in ids:
+                pin = self._pinned.get(i)
+                if pin is not None:
+                    pin[1] -= 1
+                    if pin[1] <= 0:
+                        del self._pinned[i]
+
+    def group(self, i: Optional[int]) -> Optional[str]:
+        return self.groups[i] if i is not None and 0 <= i < len(self.groups) else None
+
+    def expand(self, ids: Iterable[int]) -> List[int]:
+        """Thêm các term được suy ra (django -> python, express -> node.js -> javascript)."""
+        out, stack = [], list(ids)
+        seen = set()
+        while stack:
+            i = stack.pop(0)
+            if i in seen:
+                continue
+            seen.add(i)
+            out.append(i)
+            if 0 <= i < len(self.implies):
+                stack.extend(self.implies[i])
+        return out
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # ---------- text scan ----------
+    def _scan_tokens(self, toks: Sequence[str], found: List[int], split: bool) -> None:
+        i, n = 0, len(toks)
+        while i < n:
+            node, j, hit, end = self._trie, i, None, i
+            while j < n and toks[j] in node:
+                node = node[toks[j]]
+                j += 1
+                if _END in node:
+                    hit, end = node[_END], j
+            if hit is not None:
+                found.append(hit)
+                i = end
+                continue
+            if split:
+                # token ghép kiểu "tp.hcm", "react.js/vue" -> thử từng phần
+                sub = _SUBTOKEN.findall(toks[i])
+                if len(sub) > 1:
+                    self._scan_tokens(sub, found, split=False)
+            i += 1
+
+    def scan(self, text: Any, expand: bool = False) -> List[int]:
+        """Id các term xuất hiện trong text (theo thứ tự xuất hiện, không lặp)."""
+        found: List[int] = []
+        self._scan_tokens(tokenize(text), found, split=True)
+        found = list(dict.fromkeys(found))
+        return self.expand(found) if expand else found
+
+
+class Ontology:
+    def __init__(self, data: dict, path: Optional[str] = None):
+        self.path = path
+        self.version = int(data.get("version", 0))
+        cache = int(os.getenv("ONTOLOGY_UNKNOWN_CACHE", "50000"))
+        self.skills = TermDictionary(data.get("skills", {}), unknown_cache=cache)
+        self.locations = TermDictionary(data.get("locations", {}), clean=_clean_location, scan_fallback=True,
+                                        unknown_cache=cache)
+        # alias đã chuẩn hóa -> (nhãn nhóm, id skill), tính 1 lần khi load
+        self.skill_groups: Dict[str, Tuple[str, int]] = {
+            alias: (GROUP_LABELS.get(self.skills.group(i), "other"), i) for alias, i in self.skills._alias.items()
+        }
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "Ontology":
+        path = path or DEFAULT_PATH
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f), path)
+        except (OSError, ValueError) as e:
+            # API vẫn chạy được: mọi term thành "ngoài từ điển"
+            logger.warning("Cannot load ontology %s: %s", path, e)
+            return cls({}, path)
+
+    def classify(self, s: Any) -> Tuple[str, Optional[int]]:
+        """(nhóm, id skill) của 1 keyword; keyword ngoài từ điển -> ("other", None)."""
+        a = normalize_term(s)
+        hit = self.skill_groups.get(a)
+        if hit is None and a:
+            hit = self.skill_groups.get(" ".join(tokenize(a)))
+        return hit if hit is not None else ("other", None)
+
+    def skill_group(self, s: Any) -> str:
+        """technical / soft / buzzwords / other (key của /analyze/keywords)."""
+        return self.classify(s)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "version": self.version, "skills": len(self.skills), "locations": len(self.locations),
+                "unknown": {name: {"cached": len(d._unknown), "pinned": len(d._pinned), "max": d._unknown_cache,
+                                  "collisions": d.unknown_collisions}
+                            for name, d in (("skills", self.skills), ("locations", self.locations))}}
+
+
+ONTOLOGY = Ontology.load(os.getenv("ONTOLOGY_PATH") or None)
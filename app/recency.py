@@ -0,0 +1,98 @@
+"""
+Độ mới của job trong ranking (search_jobs_*).
+- score_cuối = score * ((1 - weight) + weight * 0.5 ** (age_days / half_life_days))
+- Mặc định tắt (RECENCY_WEIGHT=0): bật theo request (recency_weight) hoặc cho cả server qua env
+- Job quá max_age_days bị loại trước khi chấm; job không rõ ngày đăng không bị phạt / loại
+- age_days của job snapshot tính từ cột posted_day 1 lần mỗi ngày (cache trên generation),
+  hệ số decay cache theo (ngày, half_life) -> request không parse chuỗi ngày
+"""
+from __future__ import annotations
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.normalize import posted_day
+
+DEFAULT_HALF_LIFE_DAYS = float(os.getenv("RECENCY_HALF_LIFE_DAYS", "30"))
+DEFAULT_WEIGHT = float(os.getenv("RECENCY_WEIGHT", "0"))   # 0 = tắt (opt-in theo request hoặc env)
+DEFAULT_MAX_AGE_DAYS = float(os.getenv("JOB_MAX_AGE_DAYS", "0")) or None
+_MAX_CACHED_DECAYS = 8
+
+
+@dataclass(frozen=True)
+class Recency:
+    half_life_days: float = DEFAULT_HALF_LIFE_DAYS
+    weight: float = DEFAULT_WEIGHT
+    max_age_days: Optional[float] = DEFAULT_MAX_AGE_DAYS
+
+    @classmethod
+    def from_request(cls, half_life_days=None, weight=None, max_age_days=None) -> "Recency":
+        """Tham số None -> mặc định của server (env); max_age_days <= 0 = không loại job cũ."""
+        max_age = DEFAULT_MAX_AGE_DAYS if max_age_days is None else (float(max_age_days) or None)
+        return cls(
+            half_life_days=float(half_life_days) if half_life_days else DEFAULT_HALF_LIFE_DAYS,
+            weight=min(1.0, max(0.0, float(weight))) if weight is not None else DEFAULT_WEIGHT,
+            max_age_days=max_age if max_age and max_age > 0 else None,
+        )
+
+    @property
+    def active(self) -> bool:
+        return self.weight > 0 or self.max_age_days is not None
+
+
+def today() -> float:
+    return posted_day(datetime.now(timezone.utc))
+
+
+# ---------- snapshot: cột tính sẵn theo ngày ----------
+def age_days(gen, day: Optional[float] = None) -> np.ndarray:
+    """(n,) số ngày từ lúc đăng tới hôm nay, NaN nếu không rõ; tính lại khi sang ngày mới."""
+    day = today() if day is None else day
+    hit = gen.cache.get("age_days")
+    if hit is None or hit[0] != day:
+        posted = gen.attrs.get("posted_day")
+        ages = np.maximum(0.0, day - posted) if posted is not None else np.full(len(gen), np.nan)
+        hit = gen.cache["age_days"] = (day, ages.astype(np.float32))
+        gen.cache["decay"] = {}
+    return hit[1]
+
+def decay(ages: np.ndarray, half_life_days: float) -> np.ndarray:
+    out = np.power(0.5, ages / max(1e-6, float(half_life_days)), dtype=np.float32)
+    return np.where(np.isnan(ages), 1.0, out).astype(np.float32)
+
+def snapshot_factors(gen, rec: Recency, day: Optional[float] = None):
+    """(hệ số nhân (n,), mask còn hạn (n,) hoặc None) cho job snapshot."""
+    ages = age_days(gen, day)
+    cache: Dict[Any, np.ndarray] = gen.cache.setdefault("decay", {})
+    d = cache.get(rec.half_life_days)
+    if d is None:
+        if len(cache) >= _MAX_CACHED_DECAYS:
+            cache.clear()
+        d = cache[rec.half_life_days] = decay(ages, rec.half_life_days)
+    factor = (1.0 - rec.weight) + rec.weight * d
+    keep = None
+    if rec.max_age_days is not None:
+        keep = ~(ages > rec.max_age_days)   # NaN (không rõ ngày) vẫn giữ
+    return factor.astype(np.float32), keep
+
+
+# ---------- 1 document (đường Mongo) ----------
+def doc_age(posted: Optional[float], day: Optional[float] = None) -> Optional[float]:
+    if posted is None:
+        return None
+    return max(0.0, (today() if day is None else day) - float(posted))
+
+def doc_factor(age: Optional[float], rec: Recency) -> float:
+    if age is None:
+        return 1.0
+    return (1.0 - rec.weight) + rec.weight * float(0.5 ** (age / max(1e-6, rec.half_life_days)))
+
+def expired(age: Optional[float], rec: Recency) -> bool:
+    return rec.max_age_days is not None and age is not None and age > rec.max_age_days
+
+def reasons(age: Optional[float], factor: float) -> Dict[str, Any]:
+    return {"age_days": None if age is None or age != age else round(float(age), 1),
+            "recency_factor": round(float(factor), 4)}
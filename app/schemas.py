@@ -2,19 +2,41 @@ from __future__ import annotations
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 
+class RankFilters(BaseModel):
+    """Filter áp dụng trước khi chấm điểm (app.filters). Ứng viên chỉ dùng locations + min/max_exp_years."""
+    locations: List[str] = []
+    min_exp_years: Optional[float] = None     # job: req_years, ứng viên: exp_years
+    max_exp_years: Optional[float] = None
+    salary_min: Optional[float] = None        # VND, khoảng lương của job phải giao với [salary_min, salary_max]
+    salary_max: Optional[float] = None
+    job_types: List[str] = []
+    industries: List[str] = []
+    posted_within_days: Optional[int] = None
+
 class RankRequest(BaseModel):
     job_id: int
     top_k: int = 20
+    filters: Optional[RankFilters] = None
+    stream: bool = False                 # True -> NDJSON / SSE theo thứ tự điểm (export top_k lớn)
+    stream_format: str = "ndjson"        # "ndjson" | "sse"
 
 class RankResponseItem(BaseModel):
     cand_id: str
     score: float
     reasons: Dict[str, Any]
 
-class JobSearchRequest(BaseModel):
+class RecencyOptions(BaseModel):
+    """Độ mới của job (app.recency); None = mặc định server (RECENCY_HALF_LIFE_DAYS, RECENCY_WEIGHT, JOB_MAX_AGE_DAYS)."""
+    half_life_days: Optional[float] = None
+    recency_weight: Optional[float] = None    # 0 = tắt decay
+    max_age_days: Optional[float] = None      # job cũ hơn bị loại; 0 = không loại
+
+class JobSearchRequest(RecencyOptions):
     cand_id: Optional[str] = None
     keyword: Optional[str] = None
+    location: Optional[str] = None
     top_k: int = 20
+    filters: Optional[RankFilters] = None
 
 class JobSearchResponseItem(BaseModel):
     job_id: int
@@ -34,6 +56,49 @@ class JobSearchResponseItem(BaseModel):
     date_posted: Optional[str] = None
     external_link: Optional[str] = None
 
+class BatchRankRequest(BaseModel):
+    job_ids: List[int]
+    top_k: int = 20
+    filters: Optional[RankFilters] = None
+
+class BatchRankResponseItem(BaseModel):
+    job_id: int
+    candidates: List[RankResponseItem]
+
+class BatchRankResponse(BaseModel):
+    results: List[BatchRankResponseItem]
+    missing_job_ids: List[int] = []
+
+class BatchJobSearchRequest(RecencyOptions):
+    cand_ids: List[str]
+    keyword: Optional[str] = None
+    location: Optional[str] = None
+    top_k: int = 20
+    filters: Optional[RankFilters] = None
+
+class BatchJobSearchResponseItem(BaseModel):
+    cand_id: str
+    jobs: List[JobSearchResponseItem]
+
+class BatchJobSearchResponse(BaseModel):
+    results: List[BatchJobSearchResponseItem]
+    missing_cand_ids: List[str] = []
+
+class AssignRequest(BaseModel):
+    job_ids: List[int]
+    headcount: Dict[int, int] = {}      # job_id -> số vị trí; job không có trong map dùng default_headcount
+    default_headcount: int = 1
+    cand_ids: Optional[List[str]] = None  # None = toàn bộ ứng viên
+    shortlist_k: int = 50
+    min_score: float = 0.0
+
+class KeywordBatchRequest(BaseModel):
+    keyword_lists: List[List[str]] = []
+    cand_ids: List[str] = []
+    top_n: int = 20
+    include_items: bool = True
+    stream: bool = False
+
 class CandidateInfo(BaseModel):
     cand_id: str
     name: str
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import re
+import heapq
+from typing import Any, Iterator, Optional
+
+import numpy as np
+
+from app.ontology import ONTOLOGY
+
+# Trọng số tổng hợp (giữ nguyên như RankerService._pair_score)
+W_SEMANTIC = 0.6
+W_SKILL = 0.3
+W_CONTEXT = 0.1
+W_LOC = 0.7
+W_EXP = 0.3
+
+_YEARS = re.compile(r"(\d+(?:\.\d+)?)")
+
+# ---------- per-value normalizers ----------
+def safe_lower_list(xs):
+    if not xs: return []
+    return [str(x).lower() for x in xs if isinstance(x, (str, int, float)) or x]
+
+def normalize_loc(loc) -> str:
+    # Tên location chuẩn theo ontology (alias/tên có dấu -> tên chuẩn); ngoài từ điển: viết thường, bỏ ký tự lạ
+    return ONTOLOGY.locations.canonical(loc)
+
+def to_years(x) -> float:
+    if x is None: return 0.0
+    if isinstance(x, (int, float)): return float(x)
+    m = _YEARS.findall(str(x).lower())
+    return float(m[-1]) if m else 0.0
+
+def combine(semantic, jacc, loc_match, exp_ok):
+    """Công thức điểm dùng chung cho scalar và numpy array."""
+    return (W_SEMANTIC * semantic) + (W_SKILL * jacc) + (W_CONTEXT * (W_LOC * loc_match + W_EXP * exp_ok))
+
+# ---------- vectorized kernel (CSR skill/location columns) ----------
+def csr_take(indptr: np.ndarray, ids: np.ndarray, rows: np.ndarray):
+    """Lấy tập hàng `rows` của ma trận CSR (indptr, ids) -> (indptr mới, ids mới)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    lens = np.diff(indptr)[rows]
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lens, out=new_indptr[1:])
+    gather = np.repeat(indptr[rows] - new_indptr[:-1], lens) + np.arange(new_indptr[-1], dtype=np.int64)
+    return new_indptr, ids[gather]
+
+def csr_overlap(indptr: np.ndarray, ids: np.ndarray, query_ids) -> np.ndarray:
+    """Số phần tử của mỗi hàng CSR nằm trong query_ids."""
+    if ids.size == 0 or len(query_ids) == 0:
+        return np.zeros(len(indptr) - 1, dtype=np.float32)
+    hit = np.isin(ids, np.asarray(list(query_ids), dtype=ids.dtype))
+    cum = np.concatenate(([0], np.cumsum(hit, dtype=np.int64)))
+    return (cum[indptr[1:]] - cum[indptr[:-1]]).astype(np.float32)
+
+def skill_jaccard(indptr: np.ndarray, ids: np.ndarray, query_ids) -> np.ndarray:
+    overlap = csr_overlap(indptr, ids, query_ids)
+    union = np.diff(indptr).astype(np.float32) + float(len(query_ids)) - overlap
+    return overlap / np.maximum(1.0, union)
+
+def semantic_scores(emb: np.ndarray, q_vec: Optional[np.ndarray]) -> np.ndarray:
+    n = emb.shape[0]
+    if q_vec is None or emb.ndim != 2 or emb.shape[1] == 0 or q_vec.shape != (emb.shape[1],):
+        return np.zeros(n, dtype=np.float32)
+    return emb @ q_vec.astype(np.float32, copy=False)
+
+def as_vec(x: Any) -> Optional[np.ndarray]:
+    if x is None: return None
+    v = np.asarray(x, dtype=np.float32).reshape(-1)
+    return v if v.size else None
+
+def score_generation(gen, q_vec, q_skills, q_locs, q_years: float, query_is_job: bool = True, rows=None):
+    """
+    Chấm điểm 1 query (job hoặc candidate) với mọi hàng của snapshot `gen` (hoặc tập `rows`).
+    query_is_job=True: các hàng là candidate (exp_ok = exp_years >= req_years của job),
+    ngược lại các hàng là job. Trả về (score, semantic, jaccard, loc_match, exp_ok) dạng array.
+    """
+    emb, years = gen.emb, gen.years
+    s_ptr, s_ids, l_ptr, l_ids = gen.skill_indptr, gen.skill_ids, gen.loc_indptr, gen.loc_ids
+    if rows is not None:
+        rows = np.asarray(rows, dtype=np.int64)
+        emb, years = emb[rows], years[rows]
+        s_ptr, s_ids = csr_take(s_ptr, s_ids, rows)
+        l_ptr, l_ids = csr_take(l_ptr, l_ids, rows)
+    semantic = semantic_scores(emb, as_vec(q_vec))
+    jacc = skill_jaccard(s_ptr, s_ids, q_skills)
+    loc_match = (csr_overlap(l_ptr, l_ids, q_locs) > 0).astype(np.float32)
+    exp_ok = (years >= q_years) if query_is_job else (q_years >= years)
+    exp_ok = exp_ok.astype(np.float32)
+    return combine(semantic, jacc, loc_match, exp_ok), semantic, jacc, loc_match, exp_ok
+
+def score_pair(job_f, cand_f):
+    """1 cặp (job, ứng viên) dạng RowFeatures, cùng công thức với score_generation -> (score, semantic, jaccard, loc, exp_ok)."""
+    jv, cv = as_vec(job_f.vec), as_vec(cand_f.vec)
+    semantic = float(jv @ cv) if jv is not None and cv is not None and jv.shape == cv.shape else 0.0
+    s_job, s_cand = set(np.asarray(job_f.skills).tolist()), set(np.asarray(cand_f.skills).tolist())
+    overlap = len(s_job & s_cand)
+    jacc = overlap / max(1.0, len(s_cand) + len(s_job) - overlap)
+    loc_match = 1.0 if set(np.asarray(job_f.locs).tolist()) & set(np.asarray(cand_f.locs).tolist()) else 0.0
+    exp_ok = 1.0 if cand_f.years >= job_f.years else 0.0
+    return float(combine(semantic, jacc, loc_match, exp_ok)), semantic, jacc, loc_match, exp_ok
+
+# ---------- batch kernel: nhiều query cùng lúc -> ma trận (n hàng, q query) ----------
+def semantic_matrix(emb, q_vecs) -> np.ndarray:
+    """emb (n, d) @ Q.T với Q ghép từ các vector query; query thiếu vector / sai chiều -> cột 0."""
+    n, q = emb.shape[0], len(q_vecs)
+    dim = emb.shape[1] if emb.ndim == 2 else 0
+    vecs = [as_vec(v) for v in q_vecs]
+    valid = [i for i, v in enumerate(vecs) if v is not None and dim and v.shape == (dim,)]
+    out = np.zeros((n, q), dtype=np.float32)
+    if valid and n:
+        Q = np.stack([vecs[i] for i in valid]).astype(np.float32, copy=False)
+        out[:, valid] = emb @ Q.T
+    return out
+
+def incidence(query_ids) -> tuple:
+    """Danh sách id của từng query -> (cột id đã sort (m,), ma trận 0/1 (m, q))."""
+    cols = np.unique(np.concatenate([np.asarray(list(x), dtype=np.int64) for x in query_ids] or [np.zeros(0, np.int64)]))
+    inc = np.zeros((cols.size, len(query_ids)), dtype=np.float32)
+    for j, x in enumerate(query_ids):
+        if len(x):
+            inc[np.searchsorted(cols, np.asarray(list(x), dtype=np.int64)), j] = 1.0
+    return cols, inc
+
+def csr_overlap_matrix(indptr: np.ndarray, ids: np.ndarray, query_ids) -> np.ndarray:
+    """(n, q): số id chung giữa mỗi hàng CSR và mỗi query = A (n, m) @ incidence (m, q), chỉ duyệt phần tử trúng."""
+    n, q = len(indptr) - 1, len(query_ids)
+    out = np.zeros((n, q), dtype=np.float32)
+    cols, inc = incidence(query_ids)
+    if ids.size == 0 or cols.size == 0:
+        return out
+    hit = np.isin(ids, cols)
+    if not hit.any():
+        return out
+    row_of = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))[hit]
+    vals = inc[np.searchsorted(cols, ids[hit].astype(np.int64))]
+    # phần tử CSR đã liền nhau theo hàng -> cộng theo đoạn bằng reduceat
+    rows, starts = np.unique(row_of, return_index=True)
+    out[rows] = np.add.reduceat(vals, starts, axis=0)
+    return out
+
+def score_matrix(gen, queries, query_is_job: bool = True, rows=None):
+    """
+    Bản nhiều query của score_generation: queries là list RowFeatures (vec, skills, locs, years).
+    Trả về (score, semantic, jaccard, loc_match, exp_ok) dạng (n, q); cột j cho cùng kết quả như
+    score_generation với query j.
+    """
+    emb, years = gen.emb, gen.years
+    s_ptr, s_ids, l_ptr, l_ids = gen.skill_indptr, gen.skill_ids, gen.loc_indptr, gen.loc_ids
+    if rows is not None:
+        rows = np.asarray(rows, dtype=np.int64)
+        emb, years = emb[rows], years[rows]
+        s_ptr, s_ids = csr_take(s_ptr, s_ids, rows)
+        l_ptr, l_ids = csr_take(l_ptr, l_ids, rows)
+    semantic = semantic_matrix(emb, [f.vec for f in queries])
+    overlap = csr_overlap_matrix(s_ptr, s_ids, [f.skills for f in queries])
+    q_len = np.asarray([len(f.skills) for f in queries], dtype=np.float32)
+    union = np.diff(s_ptr).astype(np.float32)[:, None] + q_len[None, :] - overlap
+    jacc = overlap / np.maximum(1.0, union)
+    loc_match = (csr_overlap_matrix(l_ptr, l_ids, [f.locs for f in queries]) > 0).astype(np.float32)
+    q_years = np.asarray([f.years for f in queries], dtype=np.float32)
+    exp_ok = (years[:, None] >= q_years[None, :]) if query_is_job else (q_years[None, :] >= years[:, None])
+    exp_ok = exp_ok.astype(np.float32)
+    return combine(semantic, jacc, loc_match, exp_ok), semantic, jacc, loc_match, exp_ok
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Chỉ số top-k theo điểm giảm dần (argpartition + sort k phần tử)."""
+    n = scores.shape[0]
+    k = min(max(1, int(k)), n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+def iter_top_k(scores: np.ndarray, k: int) -> Iterator[int]:
+    """
+    Như top_k_indices nhưng trả dần từng chỉ số (heap trên k phần tử sau argpartition, không sort toàn bộ k):
+    phần tử đầu có ngay, thứ tự (kể cả khi bằng điểm) giống top_k_indices.
+    """
+    n = scores.shape[0]
+    k = min(max(1, int(k)), n)
+    if k <= 0:
+        return
+    part = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    heap = list(zip((-scores[part]).tolist(), range(k), part.tolist()))
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[2]
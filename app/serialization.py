@@ -0,0 +1,73 @@
+"""
+Đường serialize nhanh cho response ranking / search.
+- dumps(): orjson (numpy scalar/array, datetime có sẵn) nếu cài, fallback json stdlib; trả bytes
+- FastJSONResponse: JSONResponse dùng dumps(); route nóng trả thẳng response này với dữ liệu nội bộ đã đúng dạng,
+  bỏ qua validate response_model + jsonable_encoder (response_model vẫn giữ cho OpenAPI)
+- select(): fields= (chỉ giữ các field client cần) + snippet= (cắt description) trước khi encode
+"""
+from __future__ import annotations
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # chỉ chậm hơn, kết quả như nhau (trừ NaN: orjson ghi null)
+    orjson = None
+
+_ORJSON_OPTS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def json_default(x: Any) -> Any:
+    if isinstance(x, np.generic):
+        return x.item()
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    if isinstance(x, (datetime, date)):
+        return x.isoformat()
+    return str(x)   # ObjectId, Decimal128, ...
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTS)
+    return json.dumps(obj, ensure_ascii=False, default=json_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ---------- fields= / snippet= ----------
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """"job_id,score,title" -> ["job_id", "score", "title"]; rỗng / None = mọi field."""
+    out = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    return out or None
+
+def snippet(text: Any, max_chars: int) -> str:
+    """Cắt ở ranh giới từ, thêm "…" khi bị cắt."""
+    text = str(text or "")
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > max_chars // 2 else cut).rstrip() + "…"
+
+def select_row(row: Dict[str, Any], fields: Optional[Sequence[str]], always: Sequence[str] = (),
+               snippet_chars: Optional[int] = None) -> Dict[str, Any]:
+    if fields is not None:
+        keep = list(dict.fromkeys([*always, *fields]))
+        row = {k: row[k] for k in keep if k in row}
+    if snippet_chars and "description" in row:
+        row = {**row, "description": snippet(row["description"], snippet_chars)}
+    return row
+
+def select(rows: Iterable[Dict[str, Any]], fields: Optional[Sequence[str]], always: Sequence[str] = (),
+           snippet_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """rows -> rows chỉ còn fields (+ always: key, score); None và không snippet thì trả nguyên list."""
+    if fields is None and not snippet_chars:
+        return rows if isinstance(rows, list) else list(rows)
+    return [select_row(r, fields, always, snippet_chars) for r in rows]
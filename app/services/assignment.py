@@ -0,0 +1,152 @@
+"""
+Ghép job <-> ứng viên toàn cục cho đợt tuyển (campus drive), có headcount theo job.
+- Sinh cạnh thưa: top-k ứng viên cho mỗi job + top-k job cho mỗi ứng viên (score_matrix theo lô job)
+- Tách đồ thị shortlist thành các thành phần liên thông, giải từng thành phần độc lập
+- Thành phần nhỏ: Hungarian (scipy.optimize.linear_sum_assignment) trên ma trận slot x ứng viên,
+  job có headcount h được nhân thành h slot; không có scipy hoặc thành phần quá lớn -> greedy theo điểm
+Ma trận dày (jobs x ứng viên) không bao giờ được dựng: chỉ giữ các cạnh shortlist.
+"""
+from __future__ import annotations
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.scoring import score_matrix, top_k_indices
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy đi kèm scikit-learn; thiếu thì chỉ còn greedy
+    linear_sum_assignment = None
+
+logger = logging.getLogger("assignment")
+
+# cạnh không có trong shortlist: chi phí đủ lớn để Hungarian chỉ dùng khi không còn cách nào khác
+_NO_EDGE = 1e6
+
+
+@dataclass
+class Edges:
+    job: np.ndarray     # index job (0..q-1)
+    cand: np.ndarray    # hàng của generation ứng viên
+    score: np.ndarray
+
+
+@dataclass
+class AssignResult:
+    pairs: List[Tuple[int, int, float]] = field(default_factory=list)   # (index job, hàng ứng viên, score)
+    edges: int = 0
+    components: int = 0
+    largest_component: int = 0
+    solvers: Dict[str, int] = field(default_factory=lambda: {"hungarian": 0, "greedy": 0})
+
+
+def shortlist_edges(gen, job_feats: Sequence[Any], k_per_job: int, k_per_cand: int, rows: Optional[np.ndarray] = None,
+                    min_score: float = 0.0, chunk: int = 64) -> Edges:
+    """Cạnh (job, ứng viên) nằm trong top-k của ít nhất 1 phía; top-k phía ứng viên gộp dần qua từng lô job."""
+    n = len(rows) if rows is not None else len(gen)
+    kc = max(0, min(int(k_per_cand), len(job_feats)))
+    best_s = np.full((n, kc), -np.inf, dtype=np.float32)
+    best_j = np.full((n, kc), -1, dtype=np.int64)
+    ej, ec, es = [], [], []
+    for start in range(0, len(job_feats), chunk):
+        S = score_matrix(gen, job_feats[start:start + chunk], query_is_job=True, rows=rows)[0]
+        for j in range(S.shape[1]):
+            idx = top_k_indices(S[:, j], k_per_job) if k_per_job > 0 else np.zeros(0, dtype=np.int64)
+            ej.append(np.full(idx.size, start + j, dtype=np.int64)); ec.append(idx); es.append(S[idx, j])
+        if kc and n:
+            cat_s = np.hstack((best_s, S))
+            cat_j = np.hstack((best_j, np.broadcast_to(np.arange(start, start + S.shape[1]), S.shape)))
+            keep = np.argpartition(-cat_s, kc - 1, axis=1)[:, :kc]
+            best_s = np.take_along_axis(cat_s, keep, axis=1)
+            best_j = np.take_along_axis(cat_j, keep, axis=1)
+    if kc and n:
+        mask = best_j >= 0
+        ej.append(best_j[mask]); ec.append(np.nonzero(mask)[0]); es.append(best_s[mask])
+
+    job = np.concatenate(ej) if ej else np.zeros(0, dtype=np.int64)
+    cand = np.concatenate(ec).astype(np.int64) if ec else np.zeros(0, dtype=np.int64)
+    score = np.concatenate(es).astype(np.float32) if es else np.zeros(0, dtype=np.float32)
+    ok = score >= min_score
+    job, cand, score = job[ok], cand[ok], score[ok]
+    # cặp trùng (có trong top-k của cả 2 phía) chỉ giữ 1
+    _, first = np.unique(job * max(1, n) + cand, return_index=True)
+    if rows is not None:
+        cand = np.asarray(rows, dtype=np.int64)[cand]
+    return Edges(job[first], cand[first], score[first])
+
+
+def _components(edges: Edges) -> Dict[Any, List[int]]:
+    """Union-find trên đồ thị 2 phía (node ("j", i) / ("c", r)) -> root -> danh sách index cạnh."""
+    parent: Dict[Any, Any] = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for j, c in zip(edges.job.tolist(), edges.cand.tolist()):
+        a, b = find(("j", j)), find(("c", c))
+        if a != b:
+            parent[a] = b
+    groups: Dict[Any, List[int]] = {}
+    for e, j in enumerate(edges.job.tolist()):
+        groups.setdefault(find(("j", j)), []).append(e)
+    return groups
+
+
+def _greedy(job: np.ndarray, cand: np.ndarray, score: np.ndarray, capacity: Dict[int, int]) -> List[Tuple[int, int, float]]:
+    left = dict(capacity)
+    taken = set()
+    out = []
+    for e in np.argsort(-score, kind="stable").tolist():
+        j, c = int(job[e]), int(cand[e])
+        if left.get(j, 0) > 0 and c not in taken:
+            left[j] -= 1
+            taken.add(c)
+            out.append((j, c, float(score[e])))
+    return out
+
+
+def _hungarian(job: np.ndarray, cand: np.ndarray, score: np.ndarray, capacity: Dict[int, int]) -> List[Tuple[int, int, float]]:
+    """
+    Capacity expansion: job có h slot -> h hàng giống nhau. Cạnh thiếu có chi phí _NO_EDGE nên nghiệm
+    ưu tiên số cặp ghép được trước, sau đó tới tổng điểm; cặp rơi vào cạnh thiếu bị bỏ.
+    """
+    jobs = sorted(set(job.tolist()))
+    cands = sorted(set(cand.tolist()))
+    col = {c: i for i, c in enumerate(cands)}
+    slot_job = [j for j in jobs for _ in range(capacity.get(j, 0))]
+    if not slot_job:
+        return []
+    first_slot: Dict[int, int] = {}
+    for s, j in enumerate(slot_job):
+        first_slot.setdefault(j, s)
+    cost = np.full((len(slot_job), len(cands)), _NO_EDGE, dtype=np.float64)
+    for j, c, sc in zip(job.tolist(), cand.tolist(), score.tolist()):
+        s0 = first_slot.get(j)
+        if s0 is not None:
+            cost[s0:s0 + capacity[j], col[c]] = -sc
+    r, k = linear_sum_assignment(cost)
+    return [(slot_job[s], cands[i], float(-cost[s, i])) for s, i in zip(r.tolist(), k.tolist()) if cost[s, i] < _NO_EDGE]
+
+
+def solve(edges: Edges, capacity: Dict[int, int], max_dense_cells: int = 4_000_000) -> AssignResult:
+    """Giải từng thành phần liên thông của shortlist; capacity: index job -> headcount."""
+    res = AssignResult(edges=int(edges.job.size))
+    for idx in _components(edges).values():
+        idx = np.asarray(idx, dtype=np.int64)
+        job, cand, score = edges.job[idx], edges.cand[idx], edges.score[idx]
+        n_cand = len(set(cand.tolist()))
+        slots = sum(capacity.get(j, 0) for j in set(job.tolist()))
+        res.components += 1
+        res.largest_component = max(res.largest_component, n_cand + len(set(job.tolist())))
+        if linear_sum_assignment is not None and slots * n_cand <= max_dense_cells:
+            res.pairs.extend(_hungarian(job, cand, score, capacity)); res.solvers["hungarian"] += 1
+        else:
+            res.pairs.extend(_greedy(job, cand, score, capacity)); res.solvers["greedy"] += 1
+    res.pairs.sort(key=lambda p: -p[2])
+    return res
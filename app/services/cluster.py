@@ -0,0 +1,272 @@
+"""
+Chế độ cluster: mỗi node giữ 1 phân vùng (theo hash key) của snapshot jobs / candidates, node nhận request
+làm coordinator rải request ranking sang các peer qua HTTP rồi trộn các top-k cục bộ.
+- CLUSTER_PEERS: URL gốc của mọi node theo thứ tự phân vùng (gồm cả node này), CLUSTER_SHARD: vị trí của node này
+- Peer được gọi với ?local=1 (chỉ chấm phân vùng của peer, không rải tiếp)
+- Peer chậm / lỗi quá CLUSTER_TIMEOUT_SECONDS bị bỏ qua: trả kết quả từ các phân vùng còn lại, header
+  X-Cluster-Missing liệt kê phân vùng thiếu; peer lỗi bị tạm bỏ qua CLUSTER_PEER_BACKOFF_SECONDS
+- Mỗi peer có tối đa CLUSTER_MAX_INFLIGHT_PER_PEER lời gọi đang chạy (lời gọi quá hạn vẫn chiếm thread tới khi
+  socket timeout); hết suất -> phân vùng đó thiếu, không chiếm thread của peer khỏe
+"""
+from __future__ import annotations
+import heapq
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("cluster")
+
+
+@dataclass(frozen=True)
+class Partition:
+    """Phân vùng index / count theo crc32(str(key)) (ổn định giữa các process, khác hash() của Python)."""
+    index: int
+    count: int
+
+    def owns(self, key: Any) -> bool:
+        return self.count <= 1 or zlib.crc32(str(key).encode("utf-8")) % self.count == self.index
+
+    def filter(self, docs: Iterable[dict], key: str) -> List[dict]:
+        return [d for d in docs if self.owns(d.get(key))]
+
+
+@dataclass(frozen=True)
+class ClusterSettings:
+    peers: Tuple[str, ...] = ()
+    shard: int = 0
+    timeout_seconds: float = 2.0
+    peer_backoff_seconds: float = 5.0
+    max_inflight_per_peer: int = 8
+
+    @classmethod
+    def from_env(cls) -> "ClusterSettings":
+        peers = tuple(p.strip().rstrip("/") for p in os.getenv("CLUSTER_PEERS", "").split(",") if p.strip())
+        return cls(
+            peers=peers,
+            shard=int(os.getenv("CLUSTER_SHARD", "0")),
+            timeout_seconds=float(os.getenv("CLUSTER_TIMEOUT_SECONDS", str(cls.timeout_seconds))),
+            peer_backoff_seconds=float(os.getenv("CLUSTER_PEER_BACKOFF_SECONDS", str(cls.peer_backoff_seconds))),
+            max_inflight_per_peer=int(os.getenv("CLUSTER_MAX_INFLIGHT_PER_PEER", str(cls.max_inflight_per_peer))),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.peers) > 1
+
+    @property
+    def partition(self) -> Partition:
+        return Partition(self.shard, len(self.peers))
+
+
+@dataclass
+class ScatterResult:
+    parts: List[Any]                       # phản hồi của các phân vùng trả kịp (gồm phân vùng local)
+    missing: List[int] = field(default_factory=list)
+    took_ms: float = 0.0
+
+    def headers(self, total: int) -> Dict[str, str]:
+        out = {"X-Cluster-Shards": f"{total - len(self.missing)}/{total}"}
+        if self.missing:
+            out["X-Cluster-Missing"] = ",".join(str(i) for i in self.missing)
+        return out
+
+
+class ClusterClient:
+    """Coordinator: chấm phân vùng local song song với các peer, gom phản hồi trong hạn timeout."""
+
+    def __init__(self, settings: ClusterSettings):
+        if not 0 <= settings.shard < len(settings.peers):
+            raise ValueError(f"CLUSTER_SHARD={settings.shard} outside CLUSTER_PEERS ({len(settings.peers)} nodes)")
+        self.settings = settings
+        self.max_inflight = max(1, int(settings.max_inflight_per_peer))
+        # đủ thread cho suất của mọi peer: peer chậm chỉ dùng hết suất của chính nó
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(settings.peers) - 1) * self.max_inflight,
+                                        thread_name_prefix="cluster")
+        self._down_until: Dict[int, float] = {}
+        self._inflight: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.partial = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.settings.peers)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _post(self, i: int, path: str, payload: Dict[str, Any]) -> Any:
+        url = f"{self.settings.peers[i]}{path}?local=1"
+        req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.settings.timeout_seconds) as resp:
+            return json.loads(resp.read())
+
+    def _submit(self, i: int, path: str, payload: Dict[str, Any]):
+        """Future gọi peer i, None khi peer đã dùng hết suất gọi đồng thời."""
+        with self._lock:
+            if self._inflight.get(i, 0) >= self.max_inflight:
+                return None
+            self._inflight[i] = self._inflight.get(i, 0) + 1
+        fut = self._pool.submit(self._post, i, path, payload)
+        # trả suất cả khi lời gọi xong lẫn khi bị cancel trước lúc chạy
+        fut.add_done_callback(lambda _: self._done(i))
+        return fut
+
+    def _done(self, i: int) -> None:
+        with self._lock:
+            self._inflight[i] -= 1
+
+    def _mark(self, i: int, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._down_until.pop(i, None)
+            else:
+                self._down_until[i] = time.time() + self.settings.peer_backoff_seconds
+
+    def scatter(self, path: str, payload: Dict[str, Any], local: Callable[[], Any]) -> ScatterResult:
+        t0 = time.perf_counter()
+        now = time.time()
+        me = self.settings.shard
+        skipped = [i for i in range(self.size) if i != me and self._down_until.get(i, 0) > now]
+        futures = {}
+        for i in range(self.size):
+            if i == me or i in skipped:
+                continue
+            fut = self._submit(i, path, payload)
+            if fut is None:
+                logger.warning("[cluster] shard %d (%s) busy: %d calls in flight", i, self.settings.peers[i], self.max_inflight)
+                skipped.append(i)
+            else:
+                futures[fut] = i
+        parts, missing = [local()], list(skipped)
+        done, pending = wait(futures, timeout=max(0.0, self.settings.timeout_seconds - (time.perf_counter() - t0)))
+        for fut in done:
+            i = futures[fut]
+            try:
+                parts.append(fut.result())
+                self._mark(i, True)
+            except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+                # HTTPException: IncompleteRead / BadStatusLine khi peer chết giữa chừng phản hồi
+                logger.warning("[cluster] shard %d (%s) failed: %s", i, self.settings.peers[i], e)
+                self._mark(i, False)
+                missing.append(i)
+        for fut in pending:
+            i = futures[fut]
+            fut.cancel()
+            logger.warning("[cluster] shard %d (%s) timed out", i, self.settings.peers[i])
+            self._mark(i, False)
+            missing.append(i)
+        self.requests += 1
+        self.partial += bool(missing)
+        return ScatterResult(parts, sorted(missing), round((time.perf_counter() - t0) * 1000, 2))
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "shard": self.settings.shard,
+            "peers": list(self.settings.peers),
+            "timeout_seconds": self.settings.timeout_seconds,
+            "down": sorted(i for i, t in self._down_until.items() if t > now),
+            "inflight": {i: n for i, n in self._inflight.items() if n},
+            "requests": self.requests,
+            "partial_responses": self.partial,
+        }
+
+
+# ---------- trộn top-k ----------
+def merge_top_k(lists: Iterable[List[Dict[str, Any]]], key: str, top_k: int) -> List[Dict[str, Any]]:
+    """Trộn các list đã sắp giảm dần theo score; key trùng (vd. fallback Mongo quét toàn bộ) chỉ giữ 1 lần."""
+    out, seen = [], set()
+    for row in heapq.merge(*lists, key=lambda r: -r["score"]):
+        if row[key] in seen:
+            continue
+        seen.add(row[key])
+        out.append(row)
+        if len(out) >= max(1, int(top_k)):
+            break
+    return out
+
+def merge_batch(responses: List[Dict[str, Any]], group_key: str, items_key: str, item_key: str, missing_key: str,
+                top_k: int) -> Dict[str, Any]:
+    """Trộn phản hồi batch: {"results": [{group_key, items_key: [...]}], missing_key: [...]} theo từng query."""
+    groups: Dict[Any, List[List[Dict[str, Any]]]] = {}
+    for resp in responses:
+        for res in resp.get("results", []):
+            groups.setdefault(res[group_key], []).append(res[items_key])
+    # thứ tự query và danh sách thiếu lấy từ phân vùng local (query đọc Mongo khi không có ở phân vùng nào)
+    return {
+        "results": [{group_key: g, items_key: merge_top_k(lists, item_key, top_k)} for g, lists in groups.items()],
+        missing_key: responses[0].get(missing_key, []) if responses else [],
+    }
+
+
+# ---------- coordinator cho RankerService ----------
+def _filters_json(filters) -> Optional[Dict[str, Any]]:
+    return filters.model_dump(mode="json", exclude_none=True) if filters is not None else None
+
+def _recency_json(rec) -> Dict[str, Any]:
+    if rec is None:
+        return {}
+    return {"half_life_days": rec.half_life_days, "recency_weight": rec.weight, "max_age_days": rec.max_age_days or 0}
+
+
+class ClusterRanker:
+    """
+    Cùng API ranking với RankerService nhưng rải sang mọi phân vùng; method khác ủy quyền cho service local.
+    meta (tùy chọn): dict nhận "headers" mô tả phân vùng đã trả lời (route gắn vào response).
+    """
+
+    def __init__(self, svc, client: ClusterClient):
+        self.svc = svc
+        self.client = client
+
+    def __getattr__(self, name: str):
+        return getattr(self.svc, name)
+
+    def _scatter(self, path: str, payload: Dict[str, Any], local: Callable[[], Any], meta: Optional[dict]) -> List[Any]:
+        res = self.client.scatter(path, payload, local)
+        if meta is not None:
+            meta["headers"] = res.headers(self.client.size)
+        return res.parts
+
+    def rank_candidates_for_job(self, job_id: int, top_k: int = 20, filters=None, meta: Optional[dict] = None):
+        payload = {"job_id": int(job_id), "top_k": top_k, "filters": _filters_json(filters)}
+        parts = self._scatter("/rank/candidates", payload,
+                              lambda: self.svc.rank_candidates_for_job(job_id, top_k, filters), meta)
+        return merge_top_k(parts, "cand_id", top_k)
+
+    def search_jobs_for_candidate(self, cand_id: Optional[str], keyword: Optional[str], top_k: int = 10,
+                                  location: Optional[str] = None, filters=None, rec=None, meta: Optional[dict] = None):
+        local = lambda: self.svc.search_jobs_for_candidate(cand_id, keyword, top_k, location, filters, rec)
+        if not cand_id:
+            # không có ứng viên: snapshot chỉ giữ 1 phân vùng nên keyword search đọc thẳng Mongo (mọi node cho cùng kết quả) -> không rải
+            return local()
+        payload = {"cand_id": cand_id, "keyword": keyword, "location": location, "top_k": top_k,
+                   "filters": _filters_json(filters), **_recency_json(rec)}
+        return merge_top_k(self._scatter("/search/jobs", payload, local, meta), "job_id", top_k)
+
+    def rank_candidates_for_jobs(self, job_ids: List[int], top_k: int = 20, filters=None,
+                                 meta: Optional[dict] = None) -> Dict[str, Any]:
+        payload = {"job_ids": [int(j) for j in job_ids], "top_k": top_k, "filters": _filters_json(filters)}
+        parts = self._scatter("/rank/candidates/batch", payload,
+                              lambda: self.svc.rank_candidates_for_jobs(job_ids, top_k, filters), meta)
+        return merge_batch(parts, "job_id", "candidates", "cand_id", "missing_job_ids", top_k)
+
+    def search_jobs_for_candidates(self, cand_ids: List[str], keyword: Optional[str] = None, top_k: int = 10,
+                                   location: Optional[str] = None, filters=None, rec=None,
+                                   meta: Optional[dict] = None) -> Dict[str, Any]:
+        payload = {"cand_ids": [str(c) for c in cand_ids], "keyword": keyword, "location": location, "top_k": top_k,
+                   "filters": _filters_json(filters), **_recency_json(rec)}
+        parts = self._scatter("/search/jobs/batch", payload,
+                              lambda: self.svc.search_jobs_for_candidates(cand_ids, keyword, top_k, location, filters, rec), meta)
+        return merge_batch(parts, "cand_id", "jobs", "job_id", "missing_cand_ids", top_k)
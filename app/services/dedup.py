@@ -0,0 +1,391 @@
+"""
+Khử trùng lặp job / ứng viên (job đăng lại, CV upload lại với email khác).
+- Trùng tuyệt đối: content_hash (sha1 của text đã chuẩn hóa) + job_hash của file CSV, có index
+- Gần trùng: MinHash trên shingle 3 từ, LSH theo band (lsh_bands, multikey index) để tìm ứng viên so khớp,
+  xác nhận bằng Jaccard ước lượng; batch job thêm cặp có cosine embedding >= ngưỡng (chỉ so trong cùng cụm k-means)
+- Batch job stream collection vào cột compact (DedupColumns), không giữ cả document trong RAM
+- Cụm (union-find) giữ 1 đại diện (bản mới nhất); các bản còn lại có dup_of = key của đại diện
+- Ranking / listing chỉ đọc ACTIVE_QUERY ({"dup_of": None})
+"""
+from __future__ import annotations
+import hashlib
+import logging
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+from app.normalize import job_posted
+from app.services.embedding_codec import doc_embedding
+from app.services.retrieval import IVFIndex
+
+logger = logging.getLogger("dedup")
+
+ACTIVE_QUERY: Dict[str, Any] = {"dup_of": None}
+FINGERPRINT_FIELDS = ("content_hash", "minhash", "lsh_bands")
+
+NUM_PERM = 64
+BANDS = 16                  # 16 band x 4 hàng: cặp Jaccard 0.8 trùng ít nhất 1 band với xác suất ~0.999
+SHINGLE_WORDS = 3
+JACCARD_THRESHOLD = 0.8
+COSINE_THRESHOLD = 0.97
+
+_P = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)   # seed cố định: chữ ký phải giống nhau giữa các process / lần chạy
+_A = _rng.randint(1, _P, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _P, NUM_PERM).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+# ---------- fingerprint 1 document ----------
+def normalize_text(text: Any) -> str:
+    return " ".join(_WORD.findall(str(text or "").lower()))
+
+def content_hash(text: Any) -> Optional[str]:
+    norm = normalize_text(text)
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest() if norm else None
+
+def minhash(text: Any) -> Optional[np.ndarray]:
+    words = normalize_text(text).split()
+    if not words:
+        return None
+    n = max(1, len(words) - SHINGLE_WORDS + 1)
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(n)}
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) & _P for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((x[:, None] * _A[None, :] + _B[None, :]) % _P).min(axis=0).astype(np.uint32)
+
+def lsh_bands(sig: np.ndarray, bands: int = BANDS) -> List[int]:
+    rows = len(sig) // bands
+    # band index ở 32 bit cao: 2 band khác nhau không bao giờ đụng key
+    return [(b << 32) | zlib.crc32(sig[b * rows:(b + 1) * rows].tobytes()) for b in range(bands)]
+
+def jaccard_estimate(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+def fingerprint(text: Any) -> Dict[str, Any]:
+    """Field lưu cùng document lúc ghi (upload / import)."""
+    sig = minhash(text)
+    return {
+        "content_hash": content_hash(text),
+        "minhash": Binary(sig.tobytes()) if sig is not None else None,
+        "lsh_bands": lsh_bands(sig) if sig is not None else [],
+    }
+
+def _sig(doc: Dict[str, Any]) -> Optional[np.ndarray]:
+    raw = doc.get("minhash")
+    return np.frombuffer(bytes(raw), dtype=np.uint32) if raw else None
+
+
+# ---------- spec theo collection ----------
+@dataclass(frozen=True)
+class DedupSpec:
+    collection: str
+    key: str
+    text_fields: Tuple[str, ...]
+    text: Callable[[dict], str]
+    exact_fields: Tuple[str, ...]             # field so trùng tuyệt đối (ngoài content_hash)
+    embedding_fields: Tuple[str, ...]
+    freshness: Callable[[dict], Any]          # đại diện cụm = giá trị lớn nhất
+
+def _job_dedup_text(d: dict) -> str:
+    return " ".join(str(d.get(k) or "") for k in ("title", "company_norm", "location_norm", "description"))
+
+def _cand_dedup_text(d: dict) -> str:
+    return str(d.get("resume_text") or d.get("resume_summary") or "")
+
+def _ts(d: dict) -> float:
+    ts = d.get("updated_at")
+    return ts.timestamp() if hasattr(ts, "timestamp") else 0.0
+
+JOB_DEDUP = DedupSpec(
+    collection="jobs",
+    key="job_id",
+    text_fields=("title", "company_norm", "location_norm", "description"),
+    text=_job_dedup_text,
+    exact_fields=("job_hash",),
+    embedding_fields=("embedding",),
+    freshness=lambda d: (job_posted(d) or 0.0, _ts(d)),
+)
+
+CANDIDATE_DEDUP = DedupSpec(
+    collection="candidates",
+    key="cand_id",
+    text_fields=("resume_text", "resume_summary"),
+    text=_cand_dedup_text,
+    exact_fields=(),
+    embedding_fields=("resume_embedding", "embedding"),
+    freshness=lambda d: (_ts(d),),
+)
+
+
+# ---------- ingest: tìm bản trùng đã có (query dùng chung cho client sync / async) ----------
+def duplicate_query(spec: DedupSpec, fp: Dict[str, Any], exclude_key: Any = None) -> Optional[Dict[str, Any]]:
+    """Document cùng content_hash hoặc chung ít nhất 1 band LSH; None = fingerprint rỗng."""
+    ors = []
+    if fp.get("content_hash"):
+        ors.append({"content_hash": fp["content_hash"]})
+    if fp.get("lsh_bands"):
+        ors.append({"lsh_bands": {"$in": fp["lsh_bands"]}})
+    if not ors:
+        return None
+    q: Dict[str, Any] = {"$or": ors}
+    if exclude_key is not None:
+        q[spec.key] = {"$ne": exclude_key}
+    return q
+
+def duplicate_projection(spec: DedupSpec) -> Dict[str, int]:
+    return {"_id": 0, spec.key: 1, "content_hash": 1, "minhash": 1}
+
+def match_duplicates(spec: DedupSpec, fp: Dict[str, Any], docs: Iterable[dict],
+                     threshold: float = JACCARD_THRESHOLD) -> List[Any]:
+    """Key các document (kết quả duplicate_query) trùng tuyệt đối hoặc có Jaccard ước lượng >= threshold."""
+    sig = _sig(fp)
+    out = []
+    for d in docs:
+        other = _sig(d)
+        if d.get("content_hash") == fp.get("content_hash") or (
+                sig is not None and other is not None and jaccard_estimate(sig, other) >= threshold):
+            out.append(d.get(spec.key))
+    return out
+
+def merge_filter(spec: DedupSpec, representative: Any, keys: Sequence[Any]) -> Optional[Dict[str, Any]]:
+    """Các key (và các bản đang trỏ tới chúng) cần gộp vào cụm của representative; None = không có gì."""
+    keys = [k for k in keys if k != representative]
+    if not keys:
+        return None
+    return {"$or": [{spec.key: {"$in": keys}}, {"dup_of": {"$in": keys}}]}
+
+
+# ---------- batch: cụm toàn collection ----------
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+
+    def find(self, x: int) -> int:
+        p = self.parent
+        while p[x] != x:
+            p[x] = p[p[x]]
+            x = p[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+def embedding_pairs(emb: np.ndarray, has_emb: np.ndarray, threshold: float, nprobe: int = 2,
+                    chunk: int = 512) -> Iterable[Tuple[int, int]]:
+    """
+    Cặp (i < j) có cosine >= threshold; emb đã chuẩn hóa. Không quét mọi cặp: chia hàng theo cụm k-means
+    (IVFIndex của retrieval, ~sqrt(n) cụm), mỗi hàng vào nprobe cụm gần nhất, chỉ so các hàng cùng cụm.
+    """
+    rows = np.flatnonzero(has_emb)
+    if len(rows) < 2:
+        return
+    centroids = IVFIndex(emb, has_emb, nlist=max(1, int(np.sqrt(len(rows))))).centroids
+    nprobe = max(1, min(int(nprobe), len(centroids)))
+    cells = np.empty((len(rows), nprobe), dtype=np.int64)
+    for s in range(0, len(rows), chunk):
+        sims = emb[rows[s:s + chunk]] @ centroids.T
+        cells[s:s + chunk] = np.argpartition(-sims, nprobe - 1, axis=1)[:, :nprobe]
+    flat = cells.ravel()
+    order = np.argsort(flat, kind="stable")
+    members = np.repeat(rows, nprobe)[order]
+    bounds = np.searchsorted(flat[order], np.arange(len(centroids) + 1))
+    for c in range(len(centroids)):
+        m = members[bounds[c]:bounds[c + 1]]
+        if len(m) < 2:
+            continue
+        X = emb[m]
+        for start in range(0, len(m), chunk):
+            ii, jj = np.nonzero(X[start:start + chunk] @ X.T >= threshold)
+            ii = ii + start
+            keep = jj > ii
+            a, b = m[ii[keep]], m[jj[keep]]
+            yield from zip(np.minimum(a, b).tolist(), np.maximum(a, b).tolist())
+
+
+class DedupColumns:
+    """
+    Cột compact của 1 collection cho batch dedup: document đọc 1 lần (stream), chỉ giữ key, độ mới,
+    fingerprint và vector; dict document không được giữ lại.
+    """
+    def __init__(self, spec: DedupSpec):
+        self.spec = spec
+        self.oids: List[Any] = []
+        self.keys: List[Any] = []
+        self.dup_of: List[Any] = []
+        self.fresh: List[Any] = []
+        self.hashes: Dict[str, List[Any]] = {f: [] for f in ("content_hash",) + spec.exact_fields}
+        self.sigs: List[Optional[np.ndarray]] = []
+        self.bands: List[np.ndarray] = []
+        self.vecs: List[Optional[np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, doc: dict) -> int:
+        spec = self.spec
+        self.oids.append(doc.get("_id"))
+        self.keys.append(doc.get(spec.key))
+        self.dup_of.append(doc.get("dup_of"))
+        self.fresh.append(spec.freshness(doc))
+        for f, col in self.hashes.items():
+            col.append(doc.get(f) or None)
+        self.sigs.append(None)
+        self.bands.append(None)
+        self.set_fingerprint(len(self.keys) - 1, doc)
+        self.vecs.append(doc_embedding(doc, spec.embedding_fields))
+        return len(self.keys) - 1
+
+    def set_fingerprint(self, i: int, fp: Dict[str, Any]) -> None:
+        self.hashes["content_hash"][i] = fp.get("content_hash") or None
+        sig = _sig(fp)
+        self.sigs[i] = sig if sig is not None and sig.shape == (NUM_PERM,) else None
+        self.bands[i] = np.asarray(fp.get("lsh_bands") or [], dtype=np.uint64)
+
+    def embeddings(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(emb (n, d) float32, has_emb (n,)); list vector được giải phóng sau khi gom."""
+        n = len(self.vecs)
+        dim = next((v.shape[0] for v in self.vecs if v is not None), 0)
+        emb = np.zeros((n, dim), dtype=np.float32)
+        has_emb = np.zeros(n, dtype=bool)
+        for i, v in enumerate(self.vecs):
+            if v is not None and v.shape == (dim,):
+                emb[i] = v; has_emb[i] = True
+        self.vecs = []
+        return emb, has_emb
+
+
+def cluster(cols: DedupColumns, jaccard: float = JACCARD_THRESHOLD,
+            cosine: Optional[float] = COSINE_THRESHOLD) -> Tuple[np.ndarray, Dict[str, int]]:
+    """Nhãn cụm (index đại diện gốc của union-find) cho từng document + số cặp theo nguồn."""
+    n = len(cols)
+    uf = _UnionFind(n)
+    stats = {"exact": 0, "minhash": 0, "embedding": 0}
+
+    # 1) trùng tuyệt đối theo content_hash / job_hash
+    for col in cols.hashes.values():
+        first: Dict[Any, int] = {}
+        for i, h in enumerate(col):
+            if not h:
+                continue
+            if h in first:
+                uf.union(first[h], i); stats["exact"] += 1
+            else:
+                first[h] = i
+
+    # 2) LSH: chỉ so các cặp chung ít nhất 1 band (gom band bằng sort thay vì dict list)
+    has_sig = np.asarray([s is not None for s in cols.sigs], dtype=bool)
+    S = np.zeros((n, NUM_PERM), dtype=np.uint32)
+    if has_sig.any():
+        S[has_sig] = np.stack([s for s in cols.sigs if s is not None])
+    lens = np.asarray([len(b) for b in cols.bands], dtype=np.int64)
+    flat = np.concatenate(cols.bands) if n else np.zeros(0, dtype=np.uint64)
+    owner = np.repeat(np.arange(n), lens)
+    order = np.argsort(flat, kind="stable")
+    flat, owner = flat[order], owner[order]
+    starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]]) if len(flat) else np.zeros(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(flat)]
+    for s0, s1 in zip(starts[ends - starts >= 2].tolist(), ends[ends - starts >= 2].tolist()):
+        m = owner[s0:s1]
+        m = m[has_sig[m]]
+        for a_i in range(len(m) - 1):
+            a = int(m[a_i])
+            rest = m[a_i + 1:]
+            for b in rest[(S[rest] == S[a]).mean(axis=1) >= jaccard].tolist():
+                if uf.find(a) != uf.find(b):
+                    uf.union(a, b); stats["minhash"] += 1
+
+    # 3) cosine embedding (bắt được CV viết lại câu chữ nhưng cùng nội dung), chỉ trong cùng cụm k-means
+    if cosine is not None:
+        emb, has_emb = cols.embeddings()
+        if emb.shape[1]:
+            for a, b in embedding_pairs(emb, has_emb, cosine):
+                if uf.find(a) != uf.find(b):
+                    uf.union(a, b); stats["embedding"] += 1
+
+    return np.asarray([uf.find(i) for i in range(n)]), stats
+
+def representatives(cols: DedupColumns, labels: np.ndarray) -> List[Any]:
+    """dup_of cho từng document: None nếu là đại diện (bản mới nhất của cụm), ngược lại key đại diện."""
+    best: Dict[int, int] = {}
+    for i, lab in enumerate(labels.tolist()):
+        j = best.get(lab)
+        if j is None or cols.fresh[i] > cols.fresh[j]:
+            best[lab] = i
+    return [None if best[lab] == i else cols.keys[best[lab]] for i, lab in enumerate(labels.tolist())]
+
+def dedup_collection(db, spec: DedupSpec, jaccard: float = JACCARD_THRESHOLD, cosine: Optional[float] = COSINE_THRESHOLD,
+                     batch_size: int = 1000, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Stream collection (projection chỉ gồm field dedup), backfill fingerprint còn thiếu theo lô,
+    gom cụm rồi ghi dup_of bằng bulk_write không thứ tự.
+    """
+    t0 = time.perf_counter()
+    coll = db[spec.collection]
+    proj = {"_id": 1, spec.key: 1, "updated_at": 1, "dup_of": 1, **{f: 1 for f in FINGERPRINT_FIELDS},
+            **{f: 1 for f in spec.exact_fields}, **{f: 1 for f in spec.embedding_fields},
+            "date_posted": 1, "posted_day": 1, "posting_age_days": 1, "imported_at": 1, "norm_version": 1}
+    cols = DedupColumns(spec)
+    ops: List[UpdateOne] = []
+    missing: List[int] = []
+    fingerprinted = 0
+
+    def flush(force: bool = False) -> None:
+        if ops and (force or len(ops) >= batch_size):
+            if not dry_run:
+                coll.bulk_write(ops, ordered=False)
+            ops.clear()
+
+    def backfill() -> None:
+        texts = {t["_id"]: t for t in coll.find({"_id": {"$in": [cols.oids[i] for i in missing]}},
+                                                {"_id": 1, **{f: 1 for f in spec.text_fields}})}
+        for i in missing:
+            fp = fingerprint(spec.text(texts.get(cols.oids[i]) or {}))
+            cols.set_fingerprint(i, fp)
+            ops.append(UpdateOne({"_id": cols.oids[i]}, {"$set": fp}))
+        missing.clear()
+        flush()
+
+    # sort theo _id: ghi fingerprint giữa lúc stream không làm cursor trả lại document
+    for d in coll.find({}, proj, batch_size=batch_size).sort("_id", 1):
+        i = cols.add(d)
+        if "minhash" not in d:
+            missing.append(i)
+            fingerprinted += 1
+            if len(missing) >= batch_size:
+                backfill()
+    if missing:
+        backfill()
+
+    labels, pairs = cluster(cols, jaccard, cosine)
+    dup_of = representatives(cols, labels)
+    changed = 0
+    now = datetime.now(timezone.utc)
+    for oid, old, rep in zip(cols.oids, cols.dup_of, dup_of):
+        if old != rep:
+            changed += 1
+            # updated_at: snapshot polling nhận thay đổi và bỏ / thêm hàng tương ứng
+            ops.append(UpdateOne({"_id": oid}, {"$set": {"dup_of": rep, "updated_at": now}}))
+            flush()
+    flush(force=True)
+    stats = {
+        "collection": spec.collection,
+        "docs": len(cols),
+        "fingerprinted": fingerprinted,
+        "clusters": int(len(set(labels.tolist()))),
+        "duplicates": int(sum(r is not None for r in dup_of)),
+        "changed": changed,
+        "pairs": pairs,
+        "dry_run": dry_run,
+        "took_s": round(time.perf_counter() - t0, 2),
+    }
+    logger.info("[dedup] %s", stats)
+    return stats
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """
+    Chuẩn hóa text làm key cache: NFC, lowercase, gộp khoảng trắng.
+    "Python  Developer " và "python developer" dùng chung 1 entry.
+    """
+    s = unicodedata.normalize("NFC", str(text or ""))
+    return " ".join(s.lower().split())
+
+
+class EmbeddingCache:
+    """
+    LRU cache đặt trước SBERT encoder, dùng chung giữa RankerService, upload router và feature builder.
+    Key = (model_id, normalized text), value = vector numpy float32/float16 (read-only).
+    Giới hạn theo số entry và tổng số byte; entry cũ nhất bị evict trước.
+    """
+    def __init__(
+        self,
+        model_id: str = "",
+        max_entries: int = 20000,
+        max_bytes: int = 64 * 1024 * 1024,
+        dtype: str = "float32",
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported cache dtype: {dtype}")
+        self.model_id = model_id
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.dtype = np.dtype(dtype)
+        self._data: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- key / storage helpers ----------
+    def key(self, text: str, model_id: Optional[str] = None) -> Tuple[str, str]:
+        return (model_id if model_id is not None else self.model_id, normalize_text(text))
+
+    def _pack(self, vec: Any) -> np.ndarray:
+        arr = np.asarray(vec, dtype=self.dtype).reshape(-1).copy()
+        arr.setflags(write=False)
+        return arr
+
+    def _evict(self) -> None:
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            _, old = self._data.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.evictions += 1
+
+    # ---------- public API ----------
+    def get(self, text: str, model_id: Optional[str] = None) -> Optional[np.ndarray]:
+        k = self.key(text, model_id)
+        with self._lock:
+            vec = self._data.get(k)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(k)
+            self.hits += 1
+            return vec
+
+    def put(self, text: str, vec: Any, model_id: Optional[str] = None) -> np.ndarray:
+        k = self.key(text, model_id)
+        arr = self._pack(vec)
+        with self._lock:
+            old = self._data.pop(k, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._data[k] = arr
+            self._bytes += arr.nbytes
+            self._evict()
+        return arr
+
+    def encode(self, model, texts, model_id: Optional[str] = None):
+        """
+        Encode 1 text hoặc 1 list text qua cache. Chỉ các text miss mới được gửi vào model.encode
+        (1 batch duy nhất). Trả về vector float32 (hoặc list vector); None nếu model không có / lỗi.
+        """
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        out: list = [None] * len(items)
+        todo: Dict[Hashable, list] = {}
+        for i, t in enumerate(items):
+            vec = self.get(t, model_id)
+            if vec is not None:
+                out[i] = vec.astype(np.float32, copy=False)
+            else:
+                todo.setdefault(normalize_text(t), []).append(i)
+
+        if todo and model is not None:
+            # encode text gốc (của lần xuất hiện đầu tiên) để giữ nguyên đầu vào cho model
+            src = [items[idxs[0]] for idxs in todo.values()]
+            try:
+                vecs = model.encode(src, normalize_embeddings=True)
+            except Exception:
+                vecs = None
+            if vecs is not None:
+                for (_, idxs), v in zip(todo.items(), vecs):
+                    arr = self.put(items[idxs[0]], v, model_id).astype(np.float32, copy=False)
+                    for i in idxs:
+                        out[i] = arr
+        return out[0] if single else out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model_id": self.model_id,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "dtype": self.dtype.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,89 @@
+from __future__ import annotations
+import os
+import struct
+from typing import Any, Optional
+
+import numpy as np
+from bson.binary import Binary, USER_DEFINED_SUBTYPE
+
+# Layout của BSON Binary (subtype 0x80):
+#   byte 0      : kind (1 = float16, 2 = int8 + scale, 3 = float32)
+#   [int8 only] : float32 little-endian scale, vector = int8 * scale
+#   body        : vector little-endian
+KIND_FLOAT16 = 1
+KIND_INT8 = 2
+KIND_FLOAT32 = 3
+
+_KINDS = {"float16": KIND_FLOAT16, "int8": KIND_INT8, "float32": KIND_FLOAT32}
+_SCALE = struct.Struct("<f")
+
+EMBEDDING_FIELDS = ("resume_embedding", "embedding")
+
+
+def default_storage_dtype() -> str:
+    return os.getenv("EMBEDDING_STORAGE_DTYPE", "float16")
+
+
+def pack_embedding(vec: Any, dtype: Optional[str] = None) -> Optional[Binary]:
+    """
+    Đóng gói vector thành BSON Binary nhỏ gọn (float16 mặc định: 384-d = 769 byte thay vì ~3.4KB array double).
+    int8 dùng symmetric scale = max|x| / 127.
+    """
+    if vec is None:
+        return None
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    if arr.size == 0:
+        return None
+    dtype = dtype or default_storage_dtype()
+    kind = _KINDS.get(dtype)
+    if kind is None:
+        raise ValueError(f"Unsupported embedding storage dtype: {dtype}")
+    if kind == KIND_FLOAT16:
+        body = arr.astype("<f2").tobytes()
+    elif kind == KIND_FLOAT32:
+        body = arr.astype("<f4").tobytes()
+    else:
+        amax = float(np.max(np.abs(arr)))
+        scale = amax / 127.0 if amax > 0 else 1.0
+        q = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        body = _SCALE.pack(scale) + q.tobytes()
+    return Binary(bytes([kind]) + body, USER_DEFINED_SUBTYPE)
+
+
+def unpack_embedding(value: Any, as_float32: bool = True) -> Optional[np.ndarray]:
+    """
+    Giải mã embedding lưu trong Mongo về numpy. Chấp nhận cả định dạng cũ (list float) lẫn Binary đã đóng gói.
+    as_float32=False trả về view trực tiếp lên buffer (float16/int8, read-only) để tránh copy.
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float32, copy=False) if as_float32 else value
+    if isinstance(value, (list, tuple)):
+        return np.asarray(value, dtype=np.float32) if value else None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        buf = memoryview(value)
+        if len(buf) < 2:
+            return None
+        kind = buf[0]
+        if kind == KIND_FLOAT16:
+            arr = np.frombuffer(buf, dtype="<f2", offset=1)
+        elif kind == KIND_FLOAT32:
+            arr = np.frombuffer(buf, dtype="<f4", offset=1)
+        elif kind == KIND_INT8:
+            scale = _SCALE.unpack_from(buf, 1)[0]
+            q = np.frombuffer(buf, dtype=np.int8, offset=1 + _SCALE.size)
+            return q.astype(np.float32) * np.float32(scale) if as_float32 else q
+        else:
+            raise ValueError(f"Unknown packed embedding kind: {kind}")
+        return arr.astype(np.float32) if as_float32 else arr
+    raise TypeError(f"Unsupported embedding value: {type(value).__name__}")
+
+
+def doc_embedding(doc: dict, fields=EMBEDDING_FIELDS) -> Optional[np.ndarray]:
+    """Embedding đầu tiên có trong doc (resume_embedding của upload, embedding của setup_database)."""
+    for f in fields:
+        v = doc.get(f)
+        if v is not None and len(v):
+            return unpack_embedding(v)
+    return None
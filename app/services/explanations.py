@@ -0,0 +1,170 @@
+"""
+Giải thích điểm (reasons) tách khỏi kernel scoring.
+- Kernel (app.scoring, RankerService._pair_score) chỉ trả số; reasons dựng tại đây, chỉ cho hàng được trả về
+- ExplanationService.explain(): 1 cặp job / ứng viên theo yêu cầu (GET /explain/{job_id}/{cand_id}),
+  kết quả cache LRU + TTL theo (job_id, cand_id)
+- explain_docs(): dạng cũ của app.features.explain_reasons, dựng từ cùng dữ liệu chuẩn hóa
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from app.normalize import cand_locations, cand_skills, job_location, job_req_years, job_skills
+from app.ontology import TermDictionary
+from app.scoring import score_pair
+from app.services.snapshot import LOC_VOCAB, SKILL_VOCAB, RowFeatures
+
+MAX_LISTED_SKILLS = 12
+
+
+@dataclass
+class PairScore:
+    """Kết quả kernel cho 1 cặp: chỉ số, chưa có reasons."""
+    score: float
+    semantic: float
+    jaccard: float
+    loc_match: float
+    exp_ok: float
+
+
+def build_reasons(semantic, jacc, s_job: Iterable[str], s_cand: Iterable[str], loc_job: str, locs_cand: Iterable[str],
+                  loc_match, req_years: float, cand_years: float, score) -> Dict[str, Any]:
+    s_job, s_cand = set(s_job), set(s_cand)
+    return {
+        "semantic": round(float(semantic), 4),
+        "skill_jaccard": round(float(jacc), 4),
+        "overlap_skills": sorted(s_job & s_cand)[:MAX_LISTED_SKILLS],
+        "missing_skills": sorted(s_job - s_cand)[:MAX_LISTED_SKILLS],
+        "loc_job": loc_job,
+        "loc_cand": list(locs_cand),
+        "location_match": bool(loc_match),
+        "exp_required_years": float(req_years),
+        "exp_candidate_years": float(cand_years),
+        "exp_gap": max(0.0, float(req_years) - float(cand_years)),
+        "score_hint": round(float(score), 4),
+    }
+
+
+def reasons_from_docs(job: Dict[str, Any], cand: Dict[str, Any], ps: PairScore) -> Dict[str, Any]:
+    """Reasons cho 1 cặp document Mongo đã chấm (field chuẩn hóa lúc ghi, document cũ chuẩn hóa lại)."""
+    return build_reasons(ps.semantic, ps.jaccard, job_skills(job), cand_skills(cand), job_location(job),
+                         cand_locations(cand), ps.loc_match, job_req_years(job), float(cand.get("exp_years") or 0.0),
+                         ps.score)
+
+
+def explain_docs(job_doc: dict, cand_doc: dict, score: float, reverse: bool = False) -> Dict[str, Any]:
+    """Dạng của app.features.explain_reasons (matching / missing / extra skills + experience / location)."""
+    s_job, s_cand = set(job_skills(job_doc)), set(cand_skills(cand_doc))
+    req_years, cand_years = job_req_years(job_doc), float(cand_doc.get("exp_years") or 0.0)
+    loc_job, locs_cand = job_location(job_doc), list(cand_locations(cand_doc))
+    out = {
+        "score": float(score),
+        "matching_skills": sorted(s_job & s_cand),
+        "missing_skills": sorted(s_job - s_cand),
+        "experience_match": {
+            "candidate_experience": f"{cand_years:g} years",
+            "required_experience": f"{req_years:g} years",
+            "match": cand_years >= req_years,
+        },
+        "location_match": {
+            "candidate_locations": locs_cand,
+            "job_location": loc_job,
+            "match": bool(loc_job) and loc_job in locs_cand,
+        },
+    }
+    if not reverse:
+        out["extra_skills"] = sorted(s_cand - s_job)
+    return out
+
+
+class ExplanationService:
+    """
+    Reasons cho kết quả ranking + giải thích theo yêu cầu.
+    features: (job_id) -> RowFeatures | None, (cand_id) -> RowFeatures | None (snapshot, fallback Mongo).
+    vocabs: () -> (skill_vocab, loc_vocab) để đổi id về tên.
+    """
+
+    def __init__(self, job_features: Callable[[Any], Optional[RowFeatures]],
+                 cand_features: Callable[[Any], Optional[RowFeatures]],
+                 vocabs: Callable[[], Tuple[TermDictionary, TermDictionary]] = lambda: (SKILL_VOCAB, LOC_VOCAB),
+                 max_size: int = 10_000, ttl: float = 300.0):
+        self.job_features = job_features
+        self.cand_features = cand_features
+        self.vocabs = vocabs
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cache: "OrderedDict[Tuple[Any, Any], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def for_features(self, job_f: RowFeatures, cand_f: RowFeatures, semantic, jacc, loc_match, score) -> Dict[str, Any]:
+        """Reasons từ RowFeatures (id skill/location của snapshot) + thành phần điểm đã tính bởi kernel."""
+        skill_vocab, loc_vocab = self.vocabs()
+        skill_name, loc_name = skill_vocab.name, loc_vocab.name
+        locs_job = [loc_name(i) for i in job_f.locs]
+        return build_reasons(
+            semantic, jacc,
+            (skill_name(i) for i in job_f.skills), (skill_name(i) for i in cand_f.skills),
+            locs_job[0] if locs_job else "", {loc_name(i) for i in cand_f.locs}, loc_match,
+            job_f.years, cand_f.years, score,
+        )
+
+    # ---------- theo yêu cầu (GET /explain) ----------
+    def explain(self, job_id: int, cand_id: str) -> Optional[Dict[str, Any]]:
+        key = (int(job_id), str(cand_id))
+        now = time.time()
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+        job_f, cand_f = self.job_features(key[0]), self.cand_features(key[1])
+        if job_f is None or cand_f is None:
+            return None
+        score, semantic, jacc, loc_match, exp_ok = score_pair(job_f, cand_f)
+        skill_vocab, _ = self.vocabs()
+        reasons = self.for_features(job_f, cand_f, semantic, jacc, loc_match, score)
+        job_sk, cand_sk = {skill_vocab.name(i) for i in job_f.skills}, {skill_vocab.name(i) for i in cand_f.skills}
+        out = {
+            "job_id": key[0],
+            "cand_id": key[1],
+            "score": round(float(score), 6),
+            "components": {"semantic": float(semantic), "skill_jaccard": float(jacc),
+                           "location_match": float(loc_match), "exp_ok": float(exp_ok)},
+            "reasons": reasons,
+            "extra_skills": sorted(cand_sk - job_sk)[:MAX_LISTED_SKILLS],
+        }
+        with self._lock:
+            self._cache[key] = (now + self.ttl, out)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return out
+
+    def invalidate(self, job_id: Optional[int] = None, cand_id: Optional[str] = None) -> None:
+        if job_id is None and cand_id is None:
+            self.invalidate_many()
+        else:
+            self.invalidate_many(job_ids=() if job_id is None else (job_id,),
+                                 cand_ids=() if cand_id is None else (cand_id,))
+
+    def invalidate_many(self, job_ids: Optional[Iterable[int]] = None, cand_ids: Optional[Iterable[str]] = None) -> None:
+        """Bỏ mọi entry chạm tới các job/ứng viên đã đổi (1 lượt quét cache); không truyền gì = xóa hết."""
+        with self._lock:
+            if job_ids is None and cand_ids is None:
+                self._cache.clear()
+                return
+            jobs = {int(j) for j in job_ids or ()}
+            cands = {str(c) for c in cand_ids or ()}
+            for k in [k for k in self._cache if k[0] in jobs or k[1] in cands]:
+                del self._cache[k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._cache), "max_size": self.max_size, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses}
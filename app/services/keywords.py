@@ -0,0 +1,99 @@
+"""
+Nhóm keyword/skill theo ontology cho /analyze/keywords và bản batch (audit skill trên cả tập ứng viên).
+- Tra nhóm: 1 lần normalize + 1 dict lookup cho mỗi keyword (Ontology.skill_groups tính sẵn lúc load)
+- Batch: nhận nhiều list keyword hoặc cand_id (đọc skills_norm theo lô $in), cộng dồn số đếm theo nhóm/term
+- Đầu vào lớn: stream NDJSON từng dòng kết quả, dòng cuối là summary
+"""
+from __future__ import annotations
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.ontology import ONTOLOGY, GROUP_KEYS, Ontology
+
+
+def group_keywords(skills: Iterable[Any], ontology: Ontology = ONTOLOGY) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = {g: [] for g in GROUP_KEYS}
+    for s in skills:
+        out[ontology.classify(s)[0]].append(s)
+    return out
+
+
+class KeywordAggregate:
+    """Cộng dồn kết quả group_keywords của nhiều list: số keyword theo nhóm + term hay gặp nhất mỗi nhóm."""
+    def __init__(self, ontology: Ontology = ONTOLOGY, top_n: int = 20):
+        self.ontology = ontology
+        self.top_n = top_n
+        self.lists = 0
+        self.keywords = 0
+        self.group_counts: Counter = Counter()
+        self.term_counts: Dict[str, Counter] = {g: Counter() for g in GROUP_KEYS}
+        self.missing: List[Any] = []
+
+    def add(self, skills: Iterable[Any]) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {g: [] for g in GROUP_KEYS}
+        names = self.ontology.skills.name
+        for s in skills:
+            group, i = self.ontology.classify(s)
+            out[group].append(s)
+            # term đếm theo tên chuẩn (ReactJS/react.js -> react), keyword lạ đếm theo chữ thường
+            self.term_counts[group][names(i) if i is not None else str(s).strip().lower()] += 1
+        self.lists += 1
+        for g in GROUP_KEYS:
+            self.group_counts[g] += len(out[g])
+            self.keywords += len(out[g])
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "lists": self.lists,
+            "keywords": self.keywords,
+            "counts": {g: self.group_counts[g] for g in GROUP_KEYS},
+            "top_terms": {g: self.term_counts[g].most_common(self.top_n) for g in GROUP_KEYS},
+            "missing_cand_ids": self.missing,
+            "ontology_version": self.ontology.version,
+        }
+
+
+def iter_keyword_lists(
+    db,
+    keyword_lists: Optional[Sequence[Sequence[Any]]] = None,
+    cand_ids: Optional[Sequence[str]] = None,
+    batch_size: int = 1000,
+    missing: Optional[List[Any]] = None,
+) -> Iterator[Tuple[Dict[str, Any], List[Any]]]:
+    """Sinh (định danh, list keyword): list truyền thẳng theo index, sau đó skills_norm của từng cand_id."""
+    for idx, kws in enumerate(keyword_lists or []):
+        yield {"index": idx}, list(kws or [])
+    ids = list(cand_ids or [])
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        found = {
+            d.get("cand_id"): d.get("skills_norm") or []
+            for d in db["candidates"].find({"cand_id": {"$in": chunk}}, {"_id": 0, "cand_id": 1, "skills_norm": 1})
+        }
+        for cid in chunk:
+            if cid in found:
+                yield {"cand_id": cid}, list(found[cid])
+            elif missing is not None:
+                missing.append(cid)
+
+
+def analyze_batch(items: Iterable[Tuple[Dict[str, Any], List[Any]]], agg: KeywordAggregate,
+                  include_items: bool = True) -> Dict[str, Any]:
+    out = []
+    for key, kws in items:
+        grouped = agg.add(kws)
+        if include_items:
+            out.append({**key, "groups": grouped})
+    return {"items": out, "summary": agg.summary()}
+
+
+def stream_batch_ndjson(items: Iterable[Tuple[Dict[str, Any], List[Any]]], agg: KeywordAggregate,
+                        include_items: bool = True) -> Iterator[str]:
+    """NDJSON: 1 dòng {"item": ...} cho mỗi list (nếu include_items), dòng cuối {"summary": ...}."""
+    for key, kws in items:
+        grouped = agg.add(kws)
+        if include_items:
+            yield json.dumps({"item": {**key, "groups": grouped}}, ensure_ascii=False, default=str) + "\n"
+    yield json.dumps({"summary": agg.summary()}, ensure_ascii=False, default=str) + "\n"
@@ -0,0 +1,535 @@
+"""
+Hybrid retrieval: nhiều kênh lấy top-N song song, trộn bằng reciprocal rank fusion (hoặc trọng số), chỉ shortlist
+sau fusion mới được chấm đầy đủ (score_generation) -> recall tốt hơn 1 kênh, việc mỗi request bị chặn trên.
+- lexical: BM25 trên text (title/description/skills của job, resume của ứng viên), postings CSR theo term
+- semantic: IVF (k-means cosine trên embedding, dò nprobe cụm gần nhất); generation nhỏ hơn ann_min_rows quét exact
+- skill: inverted index skill id -> hàng, điểm = Jaccard như kernel
+- Index dựng cho 1 generation (thread nền, như app.services.shards); generation mới hơn: hàng còn nguyên map theo uid,
+  hàng đã đổi / bị xóa bị loại, đuôi hàng mới chấm exact (BM25 của đuôi dùng idf của index); dựng lại khi đuôi vượt
+  max_delta_fraction hoặc index cũ hơn rebuild_seconds
+"""
+from __future__ import annotations
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ontology import tokenize
+from app.scoring import as_vec, csr_overlap, csr_take, semantic_scores, top_k_indices
+
+logger = logging.getLogger("retrieval")
+
+CHANNELS = ("lexical", "semantic", "skill")
+TEXT_BATCH = 5000       # số key mỗi query $in khi đọc text cho BM25
+ASSIGN_CHUNK = 8192     # số hàng mỗi lượt gán cụm IVF (ma trận (chunk, nlist) float32)
+
+
+def _empty() -> Tuple[np.ndarray, np.ndarray]:
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+def tokens(text: Any) -> List[str]:
+    """Token cho BM25: tokenizer của ontology (giữ c++, c#, node.js), bỏ token 1 ký tự."""
+    return [t for t in tokenize(text or "") if len(t) > 1]
+
+def _weights(s: str) -> Dict[str, float]:
+    """"lexical=1,semantic=1.5,skill=0.5" -> dict."""
+    out = {}
+    for part in s.split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = float(v)
+    return out
+
+
+@dataclass
+class RetrievalConfig:
+    enabled: bool = False           # bật shortlist cho ranking theo cặp (keyword search luôn dùng hybrid)
+    depth: int = 200                # top-N mỗi kênh
+    shortlist: int = 1000           # số hàng sau fusion được chấm đầy đủ
+    fusion: str = "rrf"             # "rrf" | "weighted" (điểm kênh chuẩn hóa min-max x trọng số)
+    rrf_k: float = 60.0
+    weights: Dict[str, float] = field(default_factory=lambda: {c: 1.0 for c in CHANNELS})
+    nlist: int = 0                  # số cụm IVF, 0 = sqrt(số hàng)
+    nprobe: int = 8
+    ann_min_rows: int = 20_000      # nhỏ hơn: kênh semantic quét exact
+    min_rows: int = 50_000          # generation nhỏ hơn: ranking theo cặp chấm toàn bộ như cũ
+    max_query_terms: int = 32       # query dài (JD, resume): chỉ giữ các term idf cao nhất
+    rebuild_seconds: float = 300.0
+    max_delta_fraction: float = 0.05
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RetrievalConfig":
+        known = {f.name for f in fields(cls)}
+        out = cls(**{k: v for k, v in d.items() if k in known and k != "weights"})
+        out.weights.update({k: float(v) for k, v in (d.get("weights") or {}).items()})
+        return out
+
+    @classmethod
+    def from_file(cls, path: str) -> "RetrievalConfig":
+        """File JSON; cấu hình có thể nằm trong khóa "retrieval" (file do scripts/tune_retrieval.py sinh)."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls.from_dict(data.get("retrieval", data))
+
+    @classmethod
+    def from_env(cls) -> "RetrievalConfig":
+        """RETRIEVAL_CONFIG (file JSON) làm nền, các biến RETRIEVAL_* đặt riêng ghi đè từng khóa."""
+        path = os.getenv("RETRIEVAL_CONFIG")
+        d = cls.from_file(path) if path else cls()
+        return cls(
+            enabled=os.getenv("RETRIEVAL_ENABLED", "1" if d.enabled else "0") == "1",
+            depth=int(os.getenv("RETRIEVAL_DEPTH", str(d.depth))),
+            shortlist=int(os.getenv("RETRIEVAL_SHORTLIST", str(d.shortlist))),
+            fusion=os.getenv("RETRIEVAL_FUSION", d.fusion),
+            rrf_k=float(os.getenv("RETRIEVAL_RRF_K", str(d.rrf_k))),
+            weights={**d.weights, **_weights(os.getenv("RETRIEVAL_WEIGHTS", ""))},
+            nlist=int(os.getenv("RETRIEVAL_NLIST", str(d.nlist))),
+            nprobe=int(os.getenv("RETRIEVAL_NPROBE", str(d.nprobe))),
+            ann_min_rows=int(os.getenv("RETRIEVAL_ANN_MIN_ROWS", str(d.ann_min_rows))),
+            min_rows=int(os.getenv("RETRIEVAL_MIN_ROWS", str(d.min_rows))),
+            max_query_terms=int(os.getenv("RETRIEVAL_MAX_QUERY_TERMS", str(d.max_query_terms))),
+            rebuild_seconds=float(os.getenv("RETRIEVAL_REBUILD_SECONDS", str(d.rebuild_seconds))),
+            max_delta_fraction=float(os.getenv("RETRIEVAL_MAX_DELTA_FRACTION", str(d.max_delta_fraction))),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class RetrievalQuery:
+    """Phía query của 1 lần retrieve: vector (semantic), skill id (skill), token (lexical)."""
+    vec: Optional[np.ndarray]
+    skills: Sequence[int]
+    tokens: List[str]
+
+
+# ---------- lexical: BM25 ----------
+class BM25Index:
+    """
+    Postings CSR theo term: (hàng, trọng số BM25 tính sẵn idf * tf(k1+1) / (tf + k1(1-b+b*dl/avgdl))).
+    stats: index khác cung cấp idf / avgdl (đuôi generation chấm cùng thang với index chính).
+    """
+    def __init__(self, token_lists: Sequence[Sequence[str]], k1: float = 1.2, b: float = 0.75,
+                 stats: Optional["BM25Index"] = None):
+        n = len(token_lists)
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        rows: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(n, dtype=np.float32)
+        for r, toks in enumerate(token_lists):
+            doc_len[r] = len(toks)
+            for t, f in Counter(toks).items():
+                term_ids.append(vocab.setdefault(t, len(vocab)))
+                rows.append(r)
+                tfs.append(f)
+        terms = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        self.vocab = vocab
+        self.n = n
+        self.indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=self.indptr[1:])
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+        if stats is None:
+            self.n_docs, self.avgdl = n, float(doc_len.mean()) if n else 0.0
+            df = np.diff(self.indptr).astype(np.float64)
+            self.idf_ = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        else:
+            self.n_docs, self.avgdl = stats.n_docs, stats.avgdl
+            self.idf_ = np.asarray([stats.idf(t) for t in vocab], dtype=np.float32)
+        norm = k1 * (1.0 - b + b * doc_len[self.rows] / max(self.avgdl, 1e-9))
+        idf = np.repeat(self.idf_, np.diff(self.indptr))
+        self.weight = (idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def idf(self, term: str) -> float:
+        i = self.vocab.get(term)
+        if i is not None:
+            return float(self.idf_[i])
+        return math.log1p((self.n_docs - 0.5) / 1.5)   # term chưa gặp: như df = 1
+
+    def select(self, toks: Sequence[str], max_terms: int, extra: Optional["BM25Index"] = None) -> List[str]:
+        """Term của query có trong index (hoặc index extra, vd. đuôi generation), giữ max_terms term idf cao nhất."""
+        terms = [t for t in dict.fromkeys(toks) if t in self.vocab or (extra is not None and t in extra.vocab)]
+        if len(terms) > max_terms:
+            terms = sorted(terms, key=self.idf, reverse=True)[:max_terms]
+        return terms
+
+    def search(self, terms: Sequence[str], n: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        ids = [self.vocab[t] for t in terms if t in self.vocab]
+        if not ids:
+            return _empty()
+        rows = np.concatenate([self.rows[self.indptr[i]:self.indptr[i + 1]] for i in ids])
+        w = np.concatenate([self.weight[self.indptr[i]:self.indptr[i + 1]] for i in ids])
+        urows, inv = np.unique(rows, return_inverse=True)
+        score = np.bincount(inv, weights=w).astype(np.float32)
+        if allowed is not None:
+            keep = allowed[urows]
+            urows, score = urows[keep], score[keep]
+        if not len(urows):
+            return _empty()
+        top = top_k_indices(score, n)
+        return urows[top], score[top]
+
+
+# ---------- semantic: IVF ----------
+def _dense(emb, rows: np.ndarray) -> np.ndarray:
+    sub = emb[rows]
+    return sub.dense() if hasattr(sub, "dense") else np.asarray(sub, dtype=np.float32)   # StoreBackedMatrix
+
+def _assign(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    out = np.empty(len(X), dtype=np.int64)
+    for s in range(0, len(X), ASSIGN_CHUNK):
+        out[s:s + ASSIGN_CHUNK] = np.argmax(X[s:s + ASSIGN_CHUNK] @ C.T, axis=1)
+    return out
+
+class IVFIndex:
+    """k-means cosine trên mẫu embedding -> centroid; hàng gom theo cụm (CSR). Điểm tính lại trên emb hiện tại."""
+
+    def __init__(self, emb, has_emb: np.ndarray, nlist: int, iters: int = 10, sample: int = 50_000, seed: int = 0):
+        rows = np.flatnonzero(has_emb)
+        rng = np.random.default_rng(seed)
+        self.nlist = max(1, min(int(nlist), len(rows)))
+        samp = rows if len(rows) <= sample else np.sort(rng.choice(rows, sample, replace=False))
+        X = _dense(emb, samp)
+        C = X[rng.choice(len(X), self.nlist, replace=False)].copy()
+        for _ in range(iters):
+            a = _assign(X, C)
+            sums = np.zeros_like(C)
+            np.add.at(sums, a, X)
+            empty = np.bincount(a, minlength=self.nlist) == 0
+            sums[empty] = C[empty]   # cụm rỗng giữ centroid cũ
+            C = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+        assign = np.concatenate([_assign(_dense(emb, rows[s:s + 65536]), C) for s in range(0, len(rows), 65536)]
+                                or [np.zeros(0, dtype=np.int64)])
+        order = np.argsort(assign, kind="stable")
+        self.centroids = C.astype(np.float32)
+        self.rows = rows[order]
+        self.indptr = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=self.nlist), out=self.indptr[1:])
+
+    def probe(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        """Hàng thuộc nprobe cụm có centroid gần q nhất."""
+        lists = top_k_indices(self.centroids @ q, nprobe)
+        return np.concatenate([self.rows[self.indptr[c]:self.indptr[c + 1]] for c in lists.tolist()])
+
+
+# ---------- skill: inverted index ----------
+class SkillIndex:
+    """skill id -> hàng (CSR) dựng từ cột skill của generation."""
+
+    def __init__(self, skill_indptr: np.ndarray, skill_ids: np.ndarray):
+        row_of = np.repeat(np.arange(len(skill_indptr) - 1, dtype=np.int64), np.diff(skill_indptr))
+        order = np.argsort(skill_ids, kind="stable")
+        self.terms, starts = np.unique(skill_ids[order], return_index=True)
+        self.indptr = np.append(starts, len(order)).astype(np.int64)
+        self.rows = row_of[order]
+
+    def rows_for(self, ids: np.ndarray) -> np.ndarray:
+        """Hàng chứa mỗi skill của query (1 hàng lặp lại theo số skill chung)."""
+        pos = np.searchsorted(self.terms, ids)
+        pos = pos[(pos < len(self.terms))]
+        pos = pos[np.isin(self.terms[pos], ids)]
+        if not len(pos):
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.rows[self.indptr[p]:self.indptr[p + 1]] for p in pos.tolist()])
+
+
+# ---------- fusion ----------
+def fuse_rrf(hits: Dict[str, Tuple[np.ndarray, np.ndarray]], weights: Dict[str, float],
+             k: float = 60.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Reciprocal rank fusion: sum_c w_c / (k + rank_c), rank từ 1 -> (hàng, điểm) giảm dần."""
+    parts = [(r, weights.get(c, 1.0) / (k + np.arange(1, len(r) + 1))) for c, (r, _) in hits.items() if len(r)]
+    return _accumulate(parts)
+
+def fuse_weighted(hits: Dict[str, Tuple[np.ndarray, np.ndarray]], weights: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """sum_c w_c * điểm kênh chuẩn hóa min-max về [0, 1] (hàng không có trong kênh: 0)."""
+    parts = []
+    for c, (r, s) in hits.items():
+        if not len(r):
+            continue
+        lo, hi = float(s.min()), float(s.max())
+        norm = (s - lo) / (hi - lo) if hi > lo else np.ones(len(s), dtype=np.float32)
+        parts.append((r, weights.get(c, 1.0) * norm))
+    return _accumulate(parts)
+
+def _accumulate(parts) -> Tuple[np.ndarray, np.ndarray]:
+    if not parts:
+        return _empty()
+    rows = np.concatenate([r for r, _ in parts])
+    urows, inv = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inv, weights=np.concatenate([w for _, w in parts])).astype(np.float32)
+    order = np.argsort(-fused, kind="stable")
+    return urows[order], fused[order]
+
+
+@dataclass
+class RetrievalResult:
+    rows: np.ndarray                                    # hàng của generation, điểm fusion giảm dần
+    scores: np.ndarray
+    channels: Dict[str, Tuple[np.ndarray, np.ndarray]]  # kênh -> (hàng, điểm kênh) giảm dần
+
+    def explain(self, row: int) -> Dict[str, Any]:
+        """Hạng (từ 1) và điểm của hàng trong từng kênh; kênh không trả hàng này -> None."""
+        out = {}
+        for c, (r, s) in self.channels.items():
+            pos = np.flatnonzero(r == row)
+            out[c] = {"rank": int(pos[0]) + 1, "score": round(float(s[pos[0]]), 4)} if len(pos) else None
+        return out
+
+
+@dataclass
+class IndexSet:
+    """Index của các kênh cho 1 generation (hàng = hàng của generation đó)."""
+    generation: int
+    uids: np.ndarray
+    lexical: Optional[BM25Index]
+    ivf: Optional[IVFIndex]
+    skill: SkillIndex
+    built_at: float = field(default_factory=time.time)
+    build_seconds: float = 0.0
+
+    @property
+    def uid_max(self) -> int:
+        return int(self.uids[-1]) if len(self.uids) else -1
+
+
+class HybridRetriever:
+    """Index + truy vấn hybrid cho 1 collection (snapshot jobs hoặc candidates)."""
+
+    def __init__(self, db, spec, config: Optional[RetrievalConfig] = None):
+        self.db = db
+        self.spec = spec
+        self.config = config or RetrievalConfig()
+        self._index: Optional[IndexSet] = None
+        self._tail_tokens: Dict[int, List[str]] = {}   # uid -> token của hàng đuôi (xóa khi dựng lại index)
+        self._building = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=len(CHANNELS), thread_name_prefix="retrieval")
+        self.queries = 0
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def active(self, gen) -> bool:
+        """Ranking theo cặp dùng shortlist khi bật và generation đủ lớn."""
+        return self.config.enabled and gen is not None and len(gen) >= self.config.min_rows
+
+    # ---------- build ----------
+    def _tokens(self, gen, rows: np.ndarray) -> List[List[str]]:
+        """Token BM25 của các hàng: text đọc từ Mongo theo key, mỗi lô TEXT_BATCH key 1 query $in."""
+        spec = self.spec
+        keys = [gen.keys[r] for r in rows.tolist()]
+        proj = {**spec.text_projection(), spec.key: 1, "_id": 0}
+        found: Dict[Any, List[str]] = {}
+        for s in range(0, len(keys), TEXT_BATCH):
+            for d in self.db[spec.collection].find({spec.key: {"$in": keys[s:s + TEXT_BATCH]}}, proj):
+                found[d.get(spec.key)] = tokens(spec.text(d))
+        return [found.get(k, []) for k in keys]
+
+    def build(self, gen) -> IndexSet:
+        """Dựng index cho generation (không swap; publish() mới thay index đang dùng)."""
+        t0 = time.perf_counter()
+        cfg = self.config
+        lexical = BM25Index(self._tokens(gen, np.arange(len(gen)))) if cfg.weights.get("lexical", 0) > 0 else None
+        ivf = None
+        if len(gen) >= cfg.ann_min_rows and gen.has_emb.any():
+            ivf = IVFIndex(gen.emb, gen.has_emb, cfg.nlist or int(math.sqrt(len(gen))))
+        return IndexSet(gen.generation, np.array(gen.uids, dtype=np.int64), lexical, ivf,
+                        SkillIndex(gen.skill_indptr, gen.skill_ids), build_seconds=time.perf_counter() - t0)
+
+    def publish(self, gen) -> IndexSet:
+        idx = self.build(gen)
+        self._index, self._tail_tokens = idx, {}
+        logger.info("[retrieval] %s: indexed gen %d, %d rows (ivf=%s) in %.2fs", self.spec.collection,
+                    gen.generation, len(gen), idx.ivf.nlist if idx.ivf is not None else None, idx.build_seconds)
+        return idx
+
+    def _build_bg(self, gen) -> None:
+        try:
+            with self._build_lock:
+                self.publish(gen)
+        except Exception as e:
+            logger.warning("[retrieval] %s: index build failed: %s", self.spec.collection, e)
+        finally:
+            self._building = False
+
+    def maybe_build(self, gen) -> None:
+        if gen is None:
+            return
+        idx = self._index
+        if idx is not None:
+            if idx.generation == gen.generation:
+                return
+            tail = len(gen) - int(np.searchsorted(gen.uids, idx.uid_max, side="right"))
+            fresh = time.time() - idx.built_at < self.config.rebuild_seconds
+            if tail == 0 or (fresh and tail <= self.config.max_delta_fraction * len(gen)):
+                return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build_bg, args=(gen,), name=f"retrieval-{self.spec.collection}", daemon=True).start()
+
+    def _current(self, gen, wait: bool) -> Optional[IndexSet]:
+        """Index dùng cho gen; chưa có: generation nhỏ (hoặc wait) thì dựng ngay, lớn thì dựng nền và trả None."""
+        if self._index is None and (wait or len(gen) < self.config.min_rows):
+            with self._build_lock:
+                if self._index is None:
+                    self.publish(gen)
+        self.maybe_build(gen)
+        return self._index
+
+    # ---------- plan: index -> generation hiện tại ----------
+    def _plan(self, idx: IndexSet, gen) -> Dict[str, Any]:
+        hit = gen.cache.get("retrieval_plan")
+        if hit is not None and hit[0] is idx:
+            return hit[1]
+        tail_start = int(np.searchsorted(gen.uids, idx.uid_max, side="right"))
+        cur_of_old = np.full(len(idx.uids), -1, dtype=np.int64)
+        cur_of_old[np.searchsorted(idx.uids, gen.uids[:tail_start])] = np.arange(tail_start)
+        alive = cur_of_old >= 0
+        lexical_tail = None
+        if idx.lexical is not None and tail_start < len(gen):
+            tail = np.arange(tail_start, len(gen))
+            todo = tail[[int(u) not in self._tail_tokens for u in gen.uids[tail]]]
+            for r, toks in zip(todo.tolist(), self._tokens(gen, todo)):
+                self._tail_tokens[int(gen.uids[r])] = toks
+            lexical_tail = BM25Index([self._tail_tokens.get(int(u), []) for u in gen.uids[tail]], stats=idx.lexical)
+        plan = {"cur_of_old": cur_of_old, "alive": None if alive.all() else alive, "tail_start": tail_start,
+                "lexical_tail": lexical_tail}
+        gen.cache["retrieval_plan"] = (idx, plan)
+        return plan
+
+    # ---------- kênh ----------
+    def _lexical(self, idx, plan, gen, q: RetrievalQuery, n, allowed_old, allowed_cur):
+        tail = plan["lexical_tail"]
+        terms = idx.lexical.select(q.tokens, self.config.max_query_terms, tail)
+        rows, sc = idx.lexical.search(terms, n, allowed_old)
+        parts = [(plan["cur_of_old"][rows], sc)]
+        if tail is not None:
+            t0 = plan["tail_start"]
+            r, s = tail.search(terms, n, allowed_cur[t0:] if allowed_cur is not None else None)
+            parts.append((r + t0, s))
+        return _top(parts, n)
+
+    def _semantic(self, idx, plan, gen, q: RetrievalQuery, n, allowed_old, allowed_cur):
+        vec = as_vec(q.vec)
+        if vec is None or gen.dim == 0 or vec.shape != (gen.dim,):
+            return _empty()
+        if idx.ivf is None:
+            ok = gen.has_emb if allowed_cur is None else (gen.has_emb & allowed_cur)
+            cand = np.flatnonzero(ok)
+        else:
+            base = idx.ivf.probe(vec, self.config.nprobe)
+            if allowed_old is not None:
+                base = base[allowed_old[base]]
+            t0 = plan["tail_start"]
+            tail = np.arange(t0, len(gen))
+            tail = tail[gen.has_emb[tail] & (allowed_cur[tail] if allowed_cur is not None else True)]
+            cand = np.concatenate((plan["cur_of_old"][base], tail))
+        if not len(cand):
+            return _empty()
+        sc = semantic_scores(gen.emb[cand], vec)
+        top = top_k_indices(sc, n)
+        return cand[top], sc[top]
+
+    def _skill(self, idx, plan, gen, q: RetrievalQuery, n, allowed_old, allowed_cur):
+        qs = np.unique(np.asarray(q.skills, dtype=np.int64))
+        if not len(qs):
+            return _empty()
+        urows, overlap = np.unique(idx.skill.rows_for(qs), return_counts=True)
+        if allowed_old is not None:
+            keep = allowed_old[urows]
+            urows, overlap = urows[keep], overlap[keep]
+        cand, ov = plan["cur_of_old"][urows], overlap.astype(np.float32)
+        t0 = plan["tail_start"]
+        if t0 < len(gen):
+            tail = np.arange(t0, len(gen))
+            if allowed_cur is not None:
+                tail = tail[allowed_cur[tail]]
+            t_ov = csr_overlap(*csr_take(gen.skill_indptr, gen.skill_ids, tail), qs)
+            hit = t_ov > 0
+            cand, ov = np.concatenate((cand, tail[hit])), np.concatenate((ov, t_ov[hit]))
+        if not len(cand):
+            return _empty()
+        union = np.diff(gen.skill_indptr)[cand].astype(np.float32) + float(len(qs)) - ov
+        jacc = ov / np.maximum(1.0, union)
+        top = top_k_indices(jacc, n)
+        return cand[top], jacc[top]
+
+    # ---------- query ----------
+    def retrieve(self, gen, q: RetrievalQuery, allowed_rows: Optional[np.ndarray] = None, depth: Optional[int] = None,
+                 wait: bool = False) -> Optional[RetrievalResult]:
+        """Top-N mỗi kênh (chạy song song) rồi fusion; None = index của generation lớn đang dựng nền."""
+        idx = self._current(gen, wait)
+        if idx is None:
+            return None
+        cfg = self.config
+        plan = self._plan(idx, gen)
+        allowed_cur = allowed_old = None
+        if allowed_rows is not None:
+            allowed_cur = np.zeros(len(gen), dtype=bool)
+            allowed_cur[allowed_rows] = True
+        if allowed_cur is not None or plan["alive"] is not None:
+            alive = plan["alive"] if plan["alive"] is not None else np.ones(len(idx.uids), dtype=bool)
+            allowed_old = alive.copy()
+            if allowed_cur is not None:
+                allowed_old[alive] = allowed_cur[plan["cur_of_old"][alive]]
+        n = int(depth or cfg.depth)
+        run = {"lexical": self._lexical, "semantic": self._semantic, "skill": self._skill}
+        futures = {c: self._pool.submit(fn, idx, plan, gen, q, n, allowed_old, allowed_cur) for c, fn in run.items()
+                   if cfg.weights.get(c, 0) > 0 and (c != "lexical" or idx.lexical is not None)}
+        hits = {c: f.result() for c, f in futures.items()}
+        if cfg.fusion == "weighted":
+            rows, fused = fuse_weighted(hits, cfg.weights)
+        else:
+            rows, fused = fuse_rrf(hits, cfg.weights, cfg.rrf_k)
+        self.queries += 1
+        return RetrievalResult(rows, fused, hits)
+
+    def shortlist(self, gen, q: RetrievalQuery, allowed_rows: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Hàng (tăng dần) đưa vào chấm đầy đủ; None = chấm toàn bộ (tắt, generation nhỏ, index chưa sẵn sàng)."""
+        if not self.active(gen):
+            return None
+        res = self.retrieve(gen, q, allowed_rows)
+        if res is None or not len(res.rows):
+            return None
+        return np.sort(res.rows[:self.config.shortlist])
+
+    def stats(self) -> Dict[str, Any]:
+        idx = self._index
+        return {
+            "collection": self.spec.collection,
+            "config": self.config.to_dict(),
+            "indexed_generation": idx.generation if idx else None,
+            "indexed_rows": len(idx.uids) if idx else 0,
+            "lexical_terms": len(idx.lexical.vocab) if idx and idx.lexical is not None else 0,
+            "ivf_lists": idx.ivf.nlist if idx and idx.ivf is not None else 0,
+            "built_at": idx.built_at if idx else None,
+            "build_seconds": round(idx.build_seconds, 3) if idx else None,
+            "building": self._building,
+            "queries": self.queries,
+        }
+
+
+def _top(parts, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.concatenate([r for r, _ in parts])
+    sc = np.concatenate([s for _, s in parts]).astype(np.float32)
+    if not len(rows):
+        return _empty()
+    top = top_k_indices(sc, n)
+    return rows[top], sc[top]
@@ -0,0 +1,316 @@
+"""
+Chấm điểm song song theo shard cho snapshot ứng viên rất lớn (rank_candidates_for_job).
+- publish(): generation được chia thành các đoạn hàng liên tiếp, mỗi đoạn ghi ra 1 thư mục .npy
+  (emb, has_emb, CSR skill/location, years) + manifest.json -> worker process mở bằng mmap, page cache dùng chung
+- Mỗi worker chấm shard của mình (filter tính tại worker) và trả top-k cục bộ; coordinator trộn k-way (heapq.merge)
+- Generation hiện tại mới hơn shard đã publish: hàng còn nguyên (uid <= uid lớn nhất lúc publish) vẫn chấm ở worker,
+  hàng đã đổi / bị xóa bị loại khỏi shard, đuôi hàng mới chấm tại process chính; publish lại ở thread nền khi
+  đuôi vượt max_delta_fraction hoặc shard cũ hơn republish_seconds
+- Bộ shard cũ chỉ bị xóa khi query cuối cùng đang dùng nó kết thúc (đếm tham chiếu); worker lỗi -> top_k trả None,
+  request chấm 1 process như cũ
+- Layout trên đĩa không phụ thuộc process: cùng manifest có thể chia shard cho máy khác
+"""
+from __future__ import annotations
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.filters import candidate_mask, intersect_rows
+from app.scoring import score_generation, top_k_indices
+
+logger = logging.getLogger("shards")
+
+SHARD_ARRAYS = ("emb", "has_emb", "skill_indptr", "skill_ids", "loc_indptr", "loc_ids", "years")
+_MAX_OPEN_SHARDS = 64
+
+
+@dataclass
+class ShardView:
+    """1 shard mở bằng mmap; đủ cột cho score_generation / candidate_mask như SnapshotGeneration."""
+    emb: np.ndarray
+    has_emb: np.ndarray
+    skill_indptr: np.ndarray
+    skill_ids: np.ndarray
+    loc_indptr: np.ndarray
+    loc_ids: np.ndarray
+    years: np.ndarray
+    attrs: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+
+@dataclass
+class ShardSet:
+    """Bộ shard đã publish của 1 generation."""
+    root: str
+    generation: int
+    bounds: List[Tuple[int, int]]       # [start, stop) hàng của generation gốc
+    uids: np.ndarray                    # uid của generation gốc (tăng dần)
+    published_at: float = field(default_factory=time.time)
+    refs: int = 0                       # số query đang gửi job tới shard này
+    retired: bool = False               # đã bị bộ shard mới thay -> xóa khi refs về 0
+
+    @property
+    def uid_max(self) -> int:
+        return int(self.uids[-1]) if len(self.uids) else -1
+
+    def path(self, i: int) -> str:
+        return os.path.join(self.root, f"shard-{i}")
+
+
+# ---------- ghi / mở shard ----------
+def _dense(emb, start: int, stop: int) -> np.ndarray:
+    if isinstance(emb, np.ndarray):
+        return np.ascontiguousarray(emb[start:stop], dtype=np.float32)
+    return emb[np.arange(start, stop)].dense()   # StoreBackedMatrix
+
+def write_shard(path: str, gen, start: int, stop: int) -> None:
+    os.makedirs(path, exist_ok=True)
+    s0, s1 = gen.skill_indptr[start], gen.skill_indptr[stop]
+    l0, l1 = gen.loc_indptr[start], gen.loc_indptr[stop]
+    cols = {
+        "emb": _dense(gen.emb, start, stop),
+        "has_emb": gen.has_emb[start:stop],
+        "skill_indptr": gen.skill_indptr[start:stop + 1] - s0,
+        "skill_ids": gen.skill_ids[s0:s1],
+        "loc_indptr": gen.loc_indptr[start:stop + 1] - l0,
+        "loc_ids": gen.loc_ids[l0:l1],
+        "years": gen.years[start:stop],
+    }
+    for name, arr in cols.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arr))
+
+def open_shard(path: str) -> ShardView:
+    return ShardView(**{name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in SHARD_ARRAYS})
+
+
+# ---------- phía worker process ----------
+_OPEN: "OrderedDict[str, ShardView]" = OrderedDict()
+
+def _open_cached(path: str) -> ShardView:
+    view = _OPEN.get(path)
+    if view is None:
+        view = _OPEN[path] = open_shard(path)
+        while len(_OPEN) > _MAX_OPEN_SHARDS:
+            _OPEN.popitem(last=False)
+    return view
+
+def score_shard(path: str, offset: int, query: Tuple[Any, Any, Any, float], k: int, filters=None,
+                exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k cục bộ của 1 shard ứng viên -> (hàng của generation gốc, điểm) giảm dần."""
+    view = _open_cached(path)
+    mask = candidate_mask(view, filters)
+    if exclude is not None and len(exclude):
+        mask = np.ones(len(view), dtype=bool) if mask is None else mask.copy()
+        mask[exclude] = False
+    rows = intersect_rows(mask, None)
+    if rows is not None and rows.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    vec, skills, locs, years = query
+    score = score_generation(view, vec, skills, locs, years, query_is_job=True, rows=rows)[0]
+    idx = top_k_indices(score, k) if len(score) else np.zeros(0, dtype=np.int64)
+    local = rows[idx] if rows is not None else idx
+    return local.astype(np.int64) + offset, score[idx]
+
+
+# ---------- coordinator ----------
+class ShardedScorer:
+    """Process pool + bộ shard đã publish cho snapshot ứng viên; top_k() trả None khi chưa dùng được."""
+
+    def __init__(self, workers: int, root: Optional[str] = None, shards: int = 0, min_rows: int = 200_000,
+                 republish_seconds: float = 60.0, max_delta_fraction: float = 0.05):
+        self.workers = max(1, int(workers))
+        self.shards = int(shards) or self.workers
+        self.root = root or os.path.join(tempfile.gettempdir(), "cv-matching-shards")
+        self.min_rows = int(min_rows)
+        self.republish_seconds = float(republish_seconds)
+        self.max_delta_fraction = float(max_delta_fraction)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._published: Optional[ShardSet] = None
+        self._publishing = False
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: không fork process đang có thread nền (snapshot) / model torch
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        with self._lock:
+            ss, self._published = self._published, None
+        self._retire(ss)
+
+    # ---------- publish ----------
+    def publish(self, gen) -> ShardSet:
+        """Ghi generation thành các shard (thư mục tạm rồi rename) và swap bộ shard đang dùng."""
+        t0 = time.perf_counter()
+        os.makedirs(self.root, exist_ok=True)
+        final = os.path.join(self.root, f"{os.getpid()}-g{gen.generation}-{time.time_ns()}")
+        tmp = final + ".tmp"
+        bounds = [(int(r[0]), int(r[-1]) + 1) for r in np.array_split(np.arange(len(gen)), self.shards) if len(r)]
+        for i, (start, stop) in enumerate(bounds):
+            write_shard(os.path.join(tmp, f"shard-{i}"), gen, start, stop)
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"generation": gen.generation, "rows": len(gen), "dim": gen.dim, "shards": bounds}, f)
+        os.replace(tmp, final)
+        ss = ShardSet(final, gen.generation, bounds, np.array(gen.uids, dtype=np.int64))
+        with self._lock:
+            old, self._published = self._published, ss
+        # query đang chạy trên bộ cũ giữ thư mục tới khi xong; cache của worker tự bỏ entry cũ
+        self._retire(old)
+        logger.info("[shards] published gen %d: %d rows in %d shards (%.2fs)",
+                    gen.generation, len(gen), len(bounds), time.perf_counter() - t0)
+        return ss
+
+    def _publish_bg(self, gen) -> None:
+        try:
+            self.publish(gen)
+        except Exception as e:
+            logger.warning("[shards] publish failed: %s", e)
+        finally:
+            self._publishing = False
+
+    def maybe_publish(self, gen) -> None:
+        if gen is None or len(gen) < self.min_rows:
+            return
+        ss = self._published
+        if ss is not None and ss.generation == gen.generation:
+            return
+        if ss is not None:
+            tail = len(gen) - int(np.searchsorted(gen.uids, ss.uid_max, side="right"))
+            fresh = time.time() - ss.published_at < self.republish_seconds
+            if fresh and tail <= self.max_delta_fraction * len(gen):
+                return
+        with self._lock:
+            if self._publishing:
+                return
+            self._publishing = True
+        threading.Thread(target=self._publish_bg, args=(gen,), name="shard-publish", daemon=True).start()
+
+    # ---------- vòng đời bộ shard ----------
+    def _acquire(self) -> Optional[ShardSet]:
+        with self._lock:
+            ss = self._published
+            if ss is not None:
+                ss.refs += 1
+            return ss
+
+    def _release(self, ss: ShardSet) -> None:
+        with self._lock:
+            ss.refs -= 1
+            drop = ss.retired and ss.refs == 0
+        if drop:
+            shutil.rmtree(ss.root, ignore_errors=True)
+
+    def _retire(self, ss: Optional[ShardSet]) -> None:
+        if ss is None:
+            return
+        with self._lock:
+            ss.retired = True
+            drop = ss.refs == 0
+        if drop:
+            shutil.rmtree(ss.root, ignore_errors=True)
+
+    def _reset_pool(self) -> None:
+        # BrokenProcessPool (worker chết) không tự hồi phục: lần sau tạo pool mới
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- query ----------
+    def _plan(self, ss: ShardSet, gen) -> Dict[str, Any]:
+        """Ánh xạ generation đã publish -> generation hiện tại (cache trên generation hiện tại)."""
+        hit = gen.cache.get("shard_plan")
+        if hit is not None and hit[0] is ss:
+            return hit[1]
+        tail_start = int(np.searchsorted(gen.uids, ss.uid_max, side="right"))
+        cur_of_old = np.full(len(ss.uids), -1, dtype=np.int64)
+        cur_of_old[np.searchsorted(ss.uids, gen.uids[:tail_start])] = np.arange(tail_start)
+        gone = np.flatnonzero(cur_of_old < 0)
+        plan = {
+            "cur_of_old": cur_of_old,
+            "tail_start": tail_start,
+            "tail": gen.take(np.arange(tail_start, len(gen)), gen.generation) if tail_start < len(gen) else None,
+            "exclude": [gone[(gone >= a) & (gone < b)] - a for a, b in ss.bounds],
+        }
+        gen.cache["shard_plan"] = (ss, plan)
+        return plan
+
+    def top_k(self, gen, q, k: int, filters=None) -> Optional[List[Tuple[int, float]]]:
+        """[(hàng của gen, điểm)] giảm dần cho job q (RowFeatures); None = chấm 1 process như cũ."""
+        if gen is None or len(gen) < self.min_rows:
+            return None
+        self.maybe_publish(gen)
+        ss = self._acquire()
+        if ss is None:
+            return None
+        try:
+            return self._top_k(ss, gen, q, k, filters)
+        except Exception as e:
+            logger.warning("[shards] shard scoring failed, scoring in-process: %r", e)
+            if isinstance(e, BrokenProcessPool):
+                self._reset_pool()
+            return None
+        finally:
+            self._release(ss)
+
+    def _top_k(self, ss: ShardSet, gen, q, k: int, filters=None) -> List[Tuple[int, float]]:
+        plan = self._plan(ss, gen)
+        query = (q.vec, q.skills, q.locs, q.years)
+        futures = [self.pool.submit(score_shard, ss.path(i), a, query, k, filters, plan["exclude"][i])
+                   for i, (a, _) in enumerate(ss.bounds)]
+        try:
+            return self._merge(futures, plan, gen, q, k, filters)
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+    @staticmethod
+    def _merge(futures, plan: Dict[str, Any], gen, q, k: int, filters=None) -> List[Tuple[int, float]]:
+        lists = []
+        tail = plan["tail"]
+        if tail is not None:
+            rows = intersect_rows(candidate_mask(tail, filters), None)
+            if rows is None or rows.size:
+                score = score_generation(tail, q.vec, q.skills, q.locs, q.years, query_is_job=True, rows=rows)[0]
+                idx = top_k_indices(score, k)
+                local = rows[idx] if rows is not None else idx
+                lists.append(list(zip((local + plan["tail_start"]).tolist(), score[idx].tolist())))
+        cur_of_old = plan["cur_of_old"]
+        for fut in futures:
+            old_rows, scores = fut.result()
+            lists.append(list(zip(cur_of_old[old_rows].tolist(), scores.tolist())))
+        merged = heapq.merge(*lists, key=lambda x: -x[1])
+        return [hit for _, hit in zip(range(max(1, int(k))), merged)]
+
+    def stats(self) -> Dict[str, Any]:
+        ss = self._published
+        return {
+            "workers": self.workers,
+            "shards": self.shards,
+            "min_rows": self.min_rows,
+            "published_generation": ss.generation if ss else None,
+            "published_rows": len(ss.uids) if ss else 0,
+            "published_at": ss.published_at if ss else None,
+            "publishing": self._publishing,
+        }
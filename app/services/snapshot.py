@@ -0,0 +1,583 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo.errors import PyMongoError
+
+from app.filters import and_query
+from app.scoring import csr_take
+from app.ontology import ONTOLOGY, TermDictionary
+from app.normalize import (job_skills, job_location, job_req_years, job_type_code, job_industry_code, cand_skills,
+                           cand_locations, job_posted)
+from app.services.cluster import Partition
+from app.services.dedup import ACTIVE_QUERY
+from app.services.embedding_codec import doc_embedding
+from app.services.vector_store import MmapEmbeddingStore, StoreBackedMatrix
+
+logger = logging.getLogger("snapshot")
+
+
+# ---------- skill/location id: dùng id của ontology (ổn định giữa các worker, không cần intern riêng) ----------
+SKILL_VOCAB = ONTOLOGY.skills
+LOC_VOCAB = ONTOLOGY.locations
+
+
+# ---------- spec: cách trích cột scoring từ document ----------
+@dataclass(frozen=True)
+class SnapshotSpec:
+    collection: str
+    key: str
+    fields: Tuple[str, ...]
+    text_fields: Tuple[str, ...]
+    embedding_fields: Tuple[str, ...]
+    skills: Callable[[dict], List[str]]
+    locations: Callable[[dict], List[str]]
+    years: Callable[[dict], float]
+    text: Callable[[dict], str]
+    # cột phụ cho filter: (tên, hàm trích, dtype); float thiếu -> NaN, object thiếu -> ""
+    attrs: Tuple[Tuple[str, Callable[[dict], Any], str], ...] = ()
+    # document được đưa vào snapshot (bản trùng có dup_of bị loại)
+    query: Dict[str, Any] = field(default_factory=dict)
+
+    def projection(self, embeddings: bool = True) -> Dict[str, int]:
+        proj = {f: 1 for f in self.fields if embeddings or f not in self.embedding_fields}
+        proj.update({"_id": 1, self.key: 1, "updated_at": 1})
+        return proj
+
+    def text_projection(self, embeddings: bool = False) -> Dict[str, int]:
+        proj = {f: 1 for f in self.text_fields}
+        if embeddings:
+            proj.update({f: 1 for f in self.embedding_fields})
+        proj["_id"] = 1
+        return proj
+
+
+def _num(x) -> float:
+    try:
+        return float(x) if x is not None and x != "" else float("nan")
+    except (TypeError, ValueError):
+        return float("nan")
+
+def _job_text(doc: dict) -> str:
+    return " ".join([
+        str(doc.get("title", "")),
+        str(doc.get("description", "")),
+        " ".join(doc.get("skills_norm", []) or []),
+    ]).strip()
+
+CANDIDATE_SPEC = SnapshotSpec(
+    collection="candidates",
+    key="cand_id",
+    fields=("cand_id", "skills_norm", "locations", "exp_years", "skills_key", "location_codes", "norm_version",
+            "ontology_version", "resume_embedding", "embedding"),
+    text_fields=("resume_summary", "resume_text"),
+    embedding_fields=("resume_embedding", "embedding"),
+    skills=cand_skills,
+    locations=cand_locations,
+    years=lambda d: float(d.get("exp_years") or 0.0),
+    text=lambda d: (d.get("resume_summary") or d.get("resume_text") or "").strip(),
+    query=ACTIVE_QUERY,
+)
+
+JOB_SPEC = SnapshotSpec(
+    collection="jobs",
+    key="job_id",
+    fields=("job_id", "skills_norm", "location_norm", "experience_level", "skills_key", "location_code", "req_years",
+            "job_type", "industry", "job_type_code", "industry_code", "salary_min_vnd", "salary_max_vnd", "date_posted",
+            "posted_day", "posting_age_days", "imported_at", "norm_version", "ontology_version", "embedding"),
+    text_fields=("title", "description", "skills_norm"),
+    embedding_fields=("embedding",),
+    skills=job_skills,
+    locations=lambda d: [job_location(d)],
+    years=job_req_years,
+    text=_job_text,
+    attrs=(
+        ("salary_min", lambda d: _num(d.get("salary_min_vnd")), "float64"),
+        ("salary_max", lambda d: _num(d.get("salary_max_vnd")), "float64"),
+        ("job_type", job_type_code, "object"),
+        ("industry", job_industry_code, "object"),
+        ("posted_day", lambda d: _num(job_posted(d)), "float64"),
+    ),
+    query=ACTIVE_QUERY,
+)
+
+
+# ---------- CSR helpers ----------
+def _csr(rows: Sequence[Sequence[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    if rows:
+        indptr[1:] = np.cumsum([len(r) for r in rows])
+    ids = np.fromiter((i for r in rows for i in r), dtype=np.int64, count=int(indptr[-1]))
+    return indptr, ids
+
+def _csr_concat(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.concatenate((a[0], b[0][1:] + a[0][-1]))
+    return indptr, np.concatenate((a[1], b[1]))
+
+
+@dataclass
+class RowFeatures:
+    """Field scoring của 1 job / 1 candidate (query phía còn lại của phép so khớp)."""
+    vec: Optional[np.ndarray]
+    skills: np.ndarray
+    locs: np.ndarray
+    years: float
+
+
+def features_from_doc(spec: SnapshotSpec, doc: dict, vec: Optional[np.ndarray],
+                      skill_vocab: TermDictionary = SKILL_VOCAB, loc_vocab: TermDictionary = LOC_VOCAB) -> RowFeatures:
+    return RowFeatures(
+        vec=vec,
+        skills=np.asarray(skill_vocab.ids(spec.skills(doc)), dtype=np.int64),
+        locs=np.asarray(loc_vocab.ids(spec.locations(doc)), dtype=np.int64),
+        years=float(spec.years(doc)),
+    )
+
+
+# ---------- 1 generation bất biến ----------
+@dataclass
+class SnapshotGeneration:
+    """
+    Ảnh chụp dạng cột của các field scoring. Không bao giờ bị sửa sau khi tạo;
+    cập nhật = dựng generation mới rồi swap reference.
+    """
+    generation: int
+    oids: np.ndarray                      # _id Mongo (object)
+    keys: List[Any]                       # cand_id / job_id
+    emb: Any                              # (n, d) float32 (hàng 0 nếu thiếu) hoặc StoreBackedMatrix
+    has_emb: np.ndarray                   # (n,) bool
+    skill_indptr: np.ndarray
+    skill_ids: np.ndarray
+    loc_indptr: np.ndarray
+    loc_ids: np.ndarray
+    years: np.ndarray                     # exp_years (candidates) / req_years (jobs)
+    attrs: Dict[str, np.ndarray] = field(default_factory=dict)   # cột phụ cho filter (SnapshotSpec.attrs)
+    # id hàng tăng dần theo vị trí, giữ nguyên qua take(); hàng dựng lại nhận uid mới lớn hơn mọi uid cũ
+    # -> so 2 generation bằng searchsorted (app.services.shards)
+    uids: Optional[np.ndarray] = None
+    max_updated_at: Any = None
+    # tên các id âm (term ngoài từ điển) mà generation tham chiếu, được pin trong vocab khi generation còn sống
+    skill_names: Dict[int, str] = field(default_factory=dict)
+    loc_names: Dict[int, str] = field(default_factory=dict)
+    built_at: float = field(default_factory=time.time)
+    row_of_key: Dict[Any, int] = field(init=False, repr=False)
+    row_of_oid: Dict[Any, int] = field(init=False, repr=False)
+    cache: Dict[str, Any] = field(init=False, repr=False, default_factory=dict)   # cột dẫn xuất (vd. age_days theo ngày)
+
+    def __post_init__(self):
+        if self.uids is None:
+            self.uids = np.arange(len(self.keys), dtype=np.int64)
+        self.row_of_key = {k: i for i, k in enumerate(self.keys)}
+        self.row_of_oid = {o: i for i, o in enumerate(self.oids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def dim(self) -> int:
+        return int(self.emb.shape[1]) if self.emb.ndim == 2 else 0
+
+    def skills(self, row: int) -> np.ndarray:
+        return self.skill_ids[self.skill_indptr[row]:self.skill_indptr[row + 1]]
+
+    def locs(self, row: int) -> np.ndarray:
+        return self.loc_ids[self.loc_indptr[row]:self.loc_indptr[row + 1]]
+
+    def vec(self, row: int) -> Optional[np.ndarray]:
+        return self.emb[row] if self.has_emb[row] else None
+
+    def features(self, row: int) -> RowFeatures:
+        return RowFeatures(self.vec(row), self.skills(row), self.locs(row), float(self.years[row]))
+
+    def take(self, rows: np.ndarray, generation: int) -> "SnapshotGeneration":
+        rows = np.asarray(rows, dtype=np.int64)
+        skill_indptr, skill_ids = csr_take(self.skill_indptr, self.skill_ids, rows)
+        loc_indptr, loc_ids = csr_take(self.loc_indptr, self.loc_ids, rows)
+        return SnapshotGeneration(
+            generation=generation,
+            oids=self.oids[rows],
+            keys=[self.keys[i] for i in rows.tolist()],
+            emb=self.emb[rows],
+            has_emb=self.has_emb[rows],
+            skill_indptr=skill_indptr, skill_ids=skill_ids,
+            loc_indptr=loc_indptr, loc_ids=loc_ids,
+            years=self.years[rows],
+            attrs={k: v[rows] for k, v in self.attrs.items()},
+            uids=self.uids[rows],
+            max_updated_at=self.max_updated_at,
+            skill_names=self.skill_names,
+            loc_names=self.loc_names,
+        )
+
+    def pin_names(self, skill_vocab: TermDictionary, loc_vocab: TermDictionary) -> "SnapshotGeneration":
+        """Giữ tên term ngoài từ điển trong vocab tới khi generation bị thu hồi (LRU không đẩy chúng ra)."""
+        skill_vocab.pin(self, self.skill_names)
+        loc_vocab.pin(self, self.loc_names)
+        return self
+
+
+def dense_embeddings(vecs: List[Optional[np.ndarray]], dim_hint: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """List vector (None nếu thiếu) -> (emb (n, d) float32, has_emb (n,) bool)."""
+    dim = dim_hint or next((v.shape[0] for v in vecs if v is not None), 0)
+    emb = np.zeros((len(vecs), dim), dtype=np.float32)
+    has_emb = np.zeros(len(vecs), dtype=bool)
+    for i, v in enumerate(vecs):
+        if v is not None and v.shape == (dim,):
+            emb[i] = v; has_emb[i] = True
+    return emb, has_emb
+
+def build_generation(spec: SnapshotSpec, docs: List[dict], emb, has_emb: np.ndarray,
+                     skill_vocab: TermDictionary = SKILL_VOCAB, loc_vocab: TermDictionary = LOC_VOCAB,
+                     generation: int = 0, uid_start: int = 0) -> SnapshotGeneration:
+    """Dựng generation từ document đã có vector (SnapshotManager, hoặc 1 lần cho batch ranking khi tắt snapshot)."""
+    max_upd = None
+    for d in docs:
+        max_upd = _max_updated(max_upd, d.get("updated_at"))
+    skill_names: Dict[int, str] = {}
+    loc_names: Dict[int, str] = {}
+    skill_indptr, skill_ids = _csr([skill_vocab.ids(spec.skills(d), skill_names) for d in docs])
+    loc_indptr, loc_ids = _csr([loc_vocab.ids(spec.locations(d), loc_names) for d in docs])
+    return SnapshotGeneration(
+        generation=generation,
+        oids=_obj_array([d.get("_id") for d in docs]),
+        keys=[d.get(spec.key) for d in docs],
+        emb=emb,
+        has_emb=has_emb,
+        skill_indptr=skill_indptr,
+        skill_ids=skill_ids,
+        loc_indptr=loc_indptr,
+        loc_ids=loc_ids,
+        years=np.array([spec.years(d) for d in docs], dtype=np.float32),
+        attrs={name: _column([fn(d) for d in docs], dtype) for name, fn, dtype in spec.attrs},
+        uids=np.arange(uid_start, uid_start + len(docs), dtype=np.int64),
+        max_updated_at=max_upd,
+        skill_names=skill_names,
+        loc_names=loc_names,
+    ).pin_names(skill_vocab, loc_vocab)
+
+def _column(xs: List[Any], dtype: str) -> np.ndarray:
+    return _obj_array(xs) if dtype == "object" else np.asarray(xs, dtype=dtype).reshape(len(xs))
+
+def _obj_array(xs: List[Any]) -> np.ndarray:
+    arr = np.empty(len(xs), dtype=object)
+    arr[:] = xs
+    return arr
+
+def _max_updated(a, b):
+    if a is None: return b
+    if b is None: return a
+    return max(a, b)
+
+
+# ---------- manager ----------
+class SnapshotManager:
+    """
+    Giữ snapshot trong RAM cho 1 collection (jobs hoặc candidates):
+    - load() đọc toàn bộ field scoring 1 lần lúc startup
+    - start() chạy thread nền: change stream (replica set) hoặc polling theo updated_at (standalone)
+    - mọi cập nhật dựng generation mới rồi gán self._current (atomic với reader)
+    encode_texts: callable(list[str]) -> list[vector|None], dùng cho document chưa có embedding.
+    vector_store: MmapEmbeddingStore tùy chọn; khi có, vector đọc từ store dùng chung thay vì kéo từ Mongo.
+    partition: chế độ cluster (app.services.cluster), chỉ giữ document thuộc phân vùng của node này.
+    listeners: callable(keys | None) gọi sau mỗi generation mới; keys = khóa (job_id/cand_id) đã đổi, None = full reload.
+    """
+    def __init__(
+        self,
+        db,
+        spec: SnapshotSpec,
+        encode_texts: Optional[Callable[[List[str]], List[Any]]] = None,
+        skill_vocab: TermDictionary = SKILL_VOCAB,
+        loc_vocab: TermDictionary = LOC_VOCAB,
+        poll_seconds: float = 5.0,
+        full_reload_seconds: float = 600.0,
+        batch_size: int = 2000,
+        vector_store: Optional[MmapEmbeddingStore] = None,
+        partition: Optional[Partition] = None,
+    ):
+        self.db = db
+        self.vector_store = vector_store
+        self.partition = partition
+        self.spec = spec
+        self.encode_texts = encode_texts
+        self.skill_vocab = skill_vocab
+        self.loc_vocab = loc_vocab
+        self.poll_seconds = poll_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.batch_size = batch_size
+        self.mode = "idle"
+        self._current: Optional[SnapshotGeneration] = None
+        self._gen_counter = 0
+        self._uid_counter = 0
+        self._write_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.listeners: List[Callable[[Optional[List[Any]]], None]] = []
+        self._loaded_at: Optional[datetime] = None     # mốc polling khi không document nào có updated_at
+        self.errors = 0
+        self._failures = 0
+        self._last_failure = 0.0
+
+    @property
+    def coll(self):
+        return self.db[self.spec.collection]
+
+    @property
+    def current(self) -> Optional[SnapshotGeneration]:
+        return self._current
+
+    def _next_gen(self) -> int:
+        self._gen_counter += 1
+        return self._gen_counter
+
+    def _notify(self, keys: Optional[List[Any]]) -> None:
+        for fn in self.listeners:
+            try:
+                fn(keys)
+            except Exception as e:
+                logger.warning("[snapshot] %s: listener failed: %s", self.spec.collection, e)
+
+    # ---------- build ----------
+    def _missing_vectors(self, docs: List[dict], missing: List[int], from_mongo: bool) -> Dict[int, np.ndarray]:
+        """Vector cho các document chưa có: đọc embedding/text bằng 1 query $in, encode phần còn thiếu theo batch."""
+        if not missing:
+            return {}
+        spec = self.spec
+        oids = [docs[i]["_id"] for i in missing]
+        extra = {t["_id"]: t for t in self.coll.find({"_id": {"$in": oids}}, spec.text_projection(embeddings=from_mongo))}
+        out: Dict[int, np.ndarray] = {}
+        todo = []
+        for i in missing:
+            d = extra.get(docs[i]["_id"]) or {}
+            v = doc_embedding(d, spec.embedding_fields) if from_mongo else None
+            if v is not None:
+                out[i] = v
+            else:
+                todo.append((i, spec.text(d)))
+        if todo and self.encode_texts is not None:
+            for (i, _), v in zip(todo, self.encode_texts([t for _, t in todo]) or []):
+                if v is not None:
+                    out[i] = np.asarray(v, dtype=np.float32)
+        return out
+
+    def _embeddings(self, docs: List[dict], dim_hint: int = 0):
+        spec = self.spec
+        store = self.vector_store
+        if store is not None:
+            mat = store.matrix_for([d.get(spec.key) for d in docs])
+            missing = np.flatnonzero((mat.base_rows < 0) & (mat.private_rows < 0)).tolist()
+            found = self._missing_vectors(docs, missing, from_mongo=True)
+            dim = mat.shape[1] or dim_hint or next((v.shape[0] for v in found.values()), 0)
+            found = {i: v for i, v in found.items() if v.shape == (dim,)}
+            if found:
+                offset = len(mat.private)
+                extra = np.stack(list(found.values())).astype(np.float32)
+                mat.private = np.vstack((mat.private.reshape(-1, dim), extra))
+                mat.private_rows[list(found.keys())] = np.arange(offset, offset + len(found))
+            return mat, (mat.base_rows >= 0) | (mat.private_rows >= 0)
+
+        vecs = [doc_embedding(d, spec.embedding_fields) for d in docs]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        for i, v in self._missing_vectors(docs, missing, from_mongo=False).items():
+            vecs[i] = v
+        return dense_embeddings(vecs, dim_hint)
+
+    def _build(self, docs: List[dict], dim_hint: int = 0) -> SnapshotGeneration:
+        emb, has_emb = self._embeddings(docs, dim_hint)
+        uid_start, self._uid_counter = self._uid_counter, self._uid_counter + len(docs)
+        return build_generation(self.spec, docs, emb, has_emb, self.skill_vocab, self.loc_vocab, uid_start=uid_start)
+
+    def _owned(self, docs: List[dict]) -> Tuple[List[dict], Any]:
+        """(document thuộc phân vùng, updated_at lớn nhất của mọi document đã đọc)."""
+        max_upd = None
+        for d in docs:
+            max_upd = _max_updated(max_upd, d.get("updated_at"))
+        if self.partition is not None:
+            docs = self.partition.filter(docs, self.spec.key)
+        # mốc catch-up tính trên cả document của phân vùng khác, để không đọc lại chúng ở mỗi lượt poll
+        return docs, max_upd
+
+    def load(self) -> SnapshotGeneration:
+        t0 = time.perf_counter()
+        if self.vector_store is not None:
+            self.vector_store.refresh(); self.vector_store.take_changed_keys()
+        started = datetime.now(timezone.utc)
+        docs, seen = self._owned(list(self.coll.find(self.spec.query, self._projection(), batch_size=self.batch_size)))
+        gen = self._build(docs)
+        gen.max_updated_at = _max_updated(gen.max_updated_at, seen)
+        with self._write_lock:
+            gen.generation = self._next_gen()
+            self._current = gen
+            self._loaded_at = started
+            self._notify(None)
+        logger.info("[snapshot] %s: loaded %d rows (gen %d) in %.2fs",
+                    self.spec.collection, len(gen), gen.generation, time.perf_counter() - t0)
+        return gen
+
+    def refresh_ids(self, oids: Iterable[Any]) -> Optional[SnapshotGeneration]:
+        """Áp dụng thay đổi cho 1 tập _id: hàng cũ bị bỏ, document còn tồn tại được dựng lại ở cuối."""
+        oids = list(set(oids))
+        if not oids:
+            return self._current
+        with self._write_lock:
+            old = self._current
+            if old is None:
+                return self.load()
+            # document vừa bị đánh dấu trùng không khớp spec.query -> hàng cũ bị bỏ, không dựng lại
+            docs, seen = self._owned(list(self.coll.find(and_query({"_id": {"$in": oids}}, self.spec.query), self._projection())))
+            mask = np.ones(len(old), dtype=bool)
+            mask[[old.row_of_oid[o] for o in oids if o in old.row_of_oid]] = False
+            keep = np.flatnonzero(mask)
+            base = old.take(keep, 0)
+            block = self._build(docs, dim_hint=old.dim)
+            if not len(base):
+                emb = block.emb
+            elif not len(block):
+                emb = base.emb
+            elif isinstance(base.emb, StoreBackedMatrix):
+                emb = base.emb.concat(block.emb)
+            else:
+                emb = np.vstack((base.emb, block.emb))
+            skill = _csr_concat((base.skill_indptr, base.skill_ids), (block.skill_indptr, block.skill_ids))
+            loc = _csr_concat((base.loc_indptr, base.loc_ids), (block.loc_indptr, block.loc_ids))
+            gen = SnapshotGeneration(
+                generation=self._next_gen(),
+                oids=np.concatenate((base.oids, block.oids)),
+                keys=base.keys + block.keys,
+                emb=emb,
+                has_emb=np.concatenate((base.has_emb, block.has_emb)),
+                skill_indptr=skill[0], skill_ids=skill[1],
+                loc_indptr=loc[0], loc_ids=loc[1],
+                years=np.concatenate((base.years, block.years)),
+                attrs={k: np.concatenate((v, block.attrs[k])) for k, v in base.attrs.items()},
+                uids=np.concatenate((base.uids, block.uids)),
+                max_updated_at=_max_updated(_max_updated(old.max_updated_at, block.max_updated_at), seen),
+                skill_names={**base.skill_names, **block.skill_names},
+                loc_names={**base.loc_names, **block.loc_names},
+            ).pin_names(self.skill_vocab, self.loc_vocab)
+            self._current = gen
+            self._notify([old.keys[old.row_of_oid[o]] for o in oids if o in old.row_of_oid] + list(block.keys))
+            return gen
+
+    def _projection(self) -> Dict[str, int]:
+        # có vector store thì không kéo embedding từ Mongo
+        return self.spec.projection(embeddings=self.vector_store is None)
+
+    def _check_store(self) -> None:
+        """Store có generation mới -> reload; chỉ delta mới -> dựng lại các hàng bị ảnh hưởng."""
+        store = self.vector_store
+        if store is None:
+            return
+        gen_before = store.generation
+        if not store.refresh():
+            return
+        keys = store.take_changed_keys()
+        if store.generation != gen_before:
+            self.load()
+            return
+        cur = self._current
+        if cur is not None and keys:
+            self.refresh_ids([cur.oids[cur.row_of_key[k]] for k in keys if k in cur.row_of_key])
+
+    # ---------- background refresh ----------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"snapshot-{self.spec.collection}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._watch()
+            except PyMongoError as e:
+                # Standalone server không hỗ trợ change stream -> polling theo updated_at
+                logger.info("[snapshot] %s: change stream unavailable (%s), polling updated_at", self.spec.collection, e)
+                try:
+                    self._poll()
+                except Exception:
+                    logger.exception("[snapshot] %s: polling failed", self.spec.collection)
+                    self._backoff()
+            except Exception:
+                # lỗi ngoài Mongo (decode, shape...) không được giết thread nền: snapshot sẽ cũ mà không ai biết
+                logger.exception("[snapshot] %s: refresh failed", self.spec.collection)
+                self._backoff()
+
+    def _backoff(self) -> None:
+        """Chờ poll_seconds x 2^(lỗi liên tiếp - 1), tối đa 5 phút; đếm lại khi lỗi trước đã lâu hơn full_reload_seconds."""
+        now = time.time()
+        self._failures = 1 if now - self._last_failure > self.full_reload_seconds else self._failures + 1
+        self._last_failure = now
+        self.errors += 1
+        self._stop.wait(min(self.poll_seconds * 2 ** min(self._failures - 1, 16), 300.0))
+
+    def _watch(self) -> None:
+        pending = set()
+        with self.coll.watch(max_await_time_ms=int(self.poll_seconds * 1000)) as stream:
+            self.mode = "change_stream"
+            # bắt kịp các ghi xảy ra giữa load() và lúc mở stream
+            self._catch_up()
+            while not self._stop.is_set() and stream.alive:
+                ev = stream.try_next()
+                if ev is None:
+                    self._check_store()
+                if ev is not None:
+                    op = ev.get("operationType")
+                    if op in ("drop", "rename", "dropDatabase", "invalidate"):
+                        self.load(); pending.clear()
+                        return
+                    if "documentKey" in ev:
+                        pending.add(ev["documentKey"]["_id"])
+                    if len(pending) < self.batch_size:
+                        continue
+                if pending:
+                    self.refresh_ids(pending); pending.clear()
+
+    def _poll(self) -> None:
+        self.mode = "polling"
+        last_full = time.time()
+        while not self._stop.wait(self.poll_seconds):
+            self._check_store()
+            if time.time() - last_full >= self.full_reload_seconds:
+                # polling không thấy được delete -> reload toàn bộ định kỳ
+                self.load(); last_full = time.time()
+                continue
+            self._catch_up()
+
+    def _catch_up(self) -> None:
+        cur = self._current
+        if cur is None:
+            return
+        # document cũ không có updated_at -> bắt đầu từ lúc load, ghi mới (có updated_at) vẫn được thấy
+        since = cur.max_updated_at if cur.max_updated_at is not None else self._loaded_at
+        if since is None:
+            return
+        changed = [d["_id"] for d in self.coll.find({"updated_at": {"$gt": since}}, {"_id": 1})]
+        if changed:
+            self.refresh_ids(changed)
+
+    def stats(self) -> Dict[str, Any]:
+        gen = self._current
+        return {
+            "collection": self.spec.collection,
+            "mode": self.mode,
+            "generation": gen.generation if gen else 0,
+            "rows": len(gen) if gen else 0,
+            "dim": gen.dim if gen else 0,
+            "with_embedding": int(gen.has_emb.sum()) if gen else 0,
+            "built_at": gen.built_at if gen else None,
+            "errors": self.errors,
+            "partition": f"{self.partition.index}/{self.partition.count}" if self.partition is not None else None,
+            "vector_store": self.vector_store.stats() if self.vector_store is not None else None,
+        }
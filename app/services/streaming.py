@@ -0,0 +1,36 @@
+"""
+Stream kết quả ranking (top_k lớn, vd. export): ghi từng dòng ngay khi generator trả phần tử, không dựng list
+hay validate từng item qua Pydantic.
+- NDJSON (application/x-ndjson): {"item": ...} mỗi dòng, dòng cuối {"summary": ...} (cùng dạng /analyze/keywords/batch)
+- SSE (text/event-stream): event "item" cho mỗi phần tử, event "summary" ở cuối
+Dòng đầu được flush ngay; sau đó gom flush_every dòng / chunk để giảm số lần ghi socket.
+"""
+from __future__ import annotations
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from app.serialization import dumps
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _ndjson(kind: str, obj: Any) -> bytes:
+    return dumps({kind: obj}) + b"\n"
+
+def _sse(kind: str, obj: Any) -> bytes:
+    return b"event: " + kind.encode() + b"\ndata: " + dumps(obj) + b"\n\n"
+
+def stream_items(items: Iterable[Dict[str, Any]], fmt: str = "ndjson", flush_every: int = 64,
+                 summary: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """items -> chunk bytes theo fmt ("ndjson" | "sse"); summary = {"count", "took_ms", **summary}."""
+    line = _sse if fmt == "sse" else _ndjson
+    t0 = time.perf_counter()
+    buf, count = [], 0
+    for item in items:
+        buf.append(line("item", item))
+        count += 1
+        if count == 1 or len(buf) >= flush_every:
+            yield b"".join(buf)
+            buf = []
+    buf.append(line("summary", {"count": count, "took_ms": round((time.perf_counter() - t0) * 1000, 2), **(summary or {})}))
+    yield b"".join(buf)
@@ -0,0 +1,164 @@
+"""
+Xu hướng thị trường từ collection jobs (cho trang industry-trends).
+- 1 aggregation $facet cho mỗi cửa sổ thời gian: skill demand, location, kinh nghiệm, số job theo tháng
+- Percentile lương (salary_min_vnd / salary_max_vnd) tính bằng numpy trên cursor chỉ lấy 2 field lương
+- Kết quả materialize vào collection `job_trends` (1 document / cửa sổ), API đọc qua cache TTL trong process
+- refresh() chạy sau khi import job (setup_database) hoặc qua POST /trends/refresh
+"""
+from __future__ import annotations
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.dedup import ACTIVE_QUERY
+
+logger = logging.getLogger("trends")
+
+TRENDS_COLLECTION = "job_trends"
+WINDOWS: Dict[str, Optional[int]] = {"7d": 7, "30d": 30, "90d": 90, "all": None}
+PERCENTILES = (10, 25, 50, 75, 90)
+EXPERIENCE_BUCKETS = ((1, "0-1"), (3, "1-3"), (5, "3-5"), (10, "5-10"))
+
+
+def window_match(days: Optional[int], now: datetime) -> Dict[str, Any]:
+    # job đăng lại (dup_of) không được đếm 2 lần
+    if days is None:
+        return dict(ACTIVE_QUERY)
+    cutoff = now - timedelta(days=days)
+    # date_posted là chuỗi ISO (YYYY-MM-DD) -> so sánh chuỗi; job không có ngày đăng dùng updated_at
+    return {**ACTIVE_QUERY, "$or": [
+        {"date_posted": {"$gte": cutoff.strftime("%Y-%m-%d")}},
+        {"date_posted": {"$in": [None, ""]}, "updated_at": {"$gte": cutoff}},
+    ]}
+
+def _experience_label() -> Dict[str, Any]:
+    years = {"$ifNull": ["$req_years", 0]}
+    branches = [{"case": {"$lt": [years, hi]}, "then": label} for hi, label in EXPERIENCE_BUCKETS]
+    return {"$switch": {"branches": branches, "default": f"{EXPERIENCE_BUCKETS[-1][0]}+"}}
+
+def facet_pipeline(match: Dict[str, Any], top_n: int) -> List[Dict[str, Any]]:
+    """Pipeline $facet: skills / locations / experience / monthly trên các field đã chuẩn hóa lúc ghi."""
+    return [
+        {"$match": match},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "skills": [
+                {"$project": {"s": {"$ifNull": ["$skills_key", "$skills_norm"]}}},
+                {"$unwind": "$s"},
+                {"$group": {"_id": "$s", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": top_n},
+            ],
+            "locations": [
+                {"$group": {"_id": {"$ifNull": ["$location_code", "$location_norm"]}, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": top_n},
+            ],
+            "experience": [
+                {"$group": {"_id": _experience_label(), "count": {"$sum": 1}}},
+            ],
+            "monthly": [
+                {"$match": {"date_posted": {"$type": "string", "$ne": ""}}},
+                {"$group": {"_id": {"$substrCP": ["$date_posted", 0, 7]}, "count": {"$sum": 1}}},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
+
+def salary_percentiles(values: Sequence[float], percentiles: Sequence[int] = PERCENTILES) -> Dict[str, Any]:
+    arr = np.asarray([v for v in values if v], dtype=np.float64)
+    if arr.size == 0:
+        return {"count": 0}
+    out: Dict[str, Any] = {"count": int(arr.size), "mean": float(arr.mean())}
+    out.update({f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(arr, percentiles))})
+    return out
+
+
+class TrendsService:
+    def __init__(self, db, top_n: int = 50, cache_ttl: float = 300.0, max_age: float = 3600.0):
+        self.db = db
+        self.top_n = top_n
+        self.cache_ttl = cache_ttl      # giây giữ bản trong process
+        self.max_age = max_age          # bản trong job_trends cũ hơn -> tính lại khi được hỏi
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    # ---------- compute ----------
+    def compute(self, window: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+        if window not in WINDOWS:
+            raise ValueError(f"unknown window {window!r}, expected one of {list(WINDOWS)}")
+        now = now or datetime.now(timezone.utc)
+        t0 = time.perf_counter()
+        match = window_match(WINDOWS[window], now)
+        jobs = self.db["jobs"]
+        facets = next(iter(jobs.aggregate(facet_pipeline(match, self.top_n), allowDiskUse=True)), {})
+
+        has_salary = {"$or": [{"salary_min_vnd": {"$gt": 0}}, {"salary_max_vnd": {"$gt": 0}}]}
+        mins, maxs = [], []
+        for d in jobs.find({"$and": [match, has_salary]} if match else has_salary,
+                           {"_id": 0, "salary_min_vnd": 1, "salary_max_vnd": 1}):
+            mins.append(d.get("salary_min_vnd"))
+            maxs.append(d.get("salary_max_vnd"))
+
+        def rows(key):
+            return [{"name": r["_id"], "count": r["count"]} for r in facets.get(key, []) if r.get("_id") not in (None, "")]
+
+        order = {label: i for i, (_, label) in enumerate(EXPERIENCE_BUCKETS)}
+        experience = sorted(rows("experience"), key=lambda r: order.get(r["name"], len(order)))
+        total = facets.get("total") or [{"n": 0}]
+        return {
+            "_id": window,
+            "window": window,
+            "window_days": WINDOWS[window],
+            "generated_at": now,
+            "job_count": int(total[0]["n"]),
+            "skills": rows("skills"),
+            "locations": rows("locations"),
+            "experience": experience,
+            "monthly": rows("monthly"),
+            "salary": {"currency": "VND", "min": salary_percentiles(mins), "max": salary_percentiles(maxs)},
+            "took_ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+
+    # ---------- materialize ----------
+    def refresh(self, windows: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        out = []
+        for w in windows or list(WINDOWS):
+            doc = self.compute(w)
+            self.db[TRENDS_COLLECTION].replace_one({"_id": w}, doc, upsert=True)
+            with self._lock:
+                self._cache[w] = (time.monotonic(), doc)
+            out.append(doc)
+        logger.info("Refreshed trends for windows %s", [d["window"] for d in out])
+        return out
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    # ---------- read ----------
+    def get(self, window: str = "30d") -> Dict[str, Any]:
+        if window not in WINDOWS:
+            raise ValueError(f"unknown window {window!r}, expected one of {list(WINDOWS)}")
+        hit = self._cache.get(window)
+        if hit is not None and time.monotonic() - hit[0] < self.cache_ttl:
+            return hit[1]
+        doc = self.db[TRENDS_COLLECTION].find_one({"_id": window})
+        if doc is None or self._age(doc) > self.max_age:
+            return self.refresh([window])[0]
+        with self._lock:
+            self._cache[window] = (time.monotonic(), doc)
+        return doc
+
+    @staticmethod
+    def _age(doc: Dict[str, Any]) -> float:
+        ts = doc.get("generated_at")
+        if not isinstance(ts, datetime):
+            return float("inf")
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - ts).total_seconds()
@@ -0,0 +1,336 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock, chỉ nên chạy 1 writer
+    fcntl = None
+
+logger = logging.getLogger("vector_store")
+
+# Layout thư mục store (1 store / collection):
+#   manifest.json     {"generation", "dim", "dtype", "base", "delta", "ids"}
+#   ids-<g>.json      danh sách id theo thứ tự hàng của base
+#   base-<g>.npy      ma trận (N, dim) float16 — worker mở bằng np.load(mmap_mode="r")
+#   delta-<g>.log     append-only: [op:u8][key_len:u32][key json][vector nếu op=PUT]
+#   .lock             flock cho append / compact
+OP_PUT = 0
+OP_DELETE = 1
+_REC = struct.Struct("<BI")
+MANIFEST = "manifest.json"
+
+
+def _key_bytes(key: Any) -> bytes:
+    return json.dumps(key, separators=(",", ":")).encode("utf-8")
+
+
+class StoreBackedMatrix:
+    """
+    Ma trận (n, d) "ảo" cho SnapshotGeneration: hàng trỏ vào base memmap dùng chung (base_rows >= 0)
+    hoặc vào 1 block private nhỏ (delta / document chưa export). Không copy base vào RAM của process.
+    """
+    ndim = 2
+
+    def __init__(self, base: np.ndarray, base_rows: np.ndarray, private: np.ndarray, private_rows: np.ndarray, chunk_rows: int = 8192):
+        self.base = base
+        self.base_rows = np.asarray(base_rows, dtype=np.int64)
+        self.private = private
+        self.private_rows = np.asarray(private_rows, dtype=np.int64)
+        self.chunk_rows = chunk_rows
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        dim = int(self.base.shape[1]) if self.base.ndim == 2 and self.base.shape[1] else int(self.private.shape[1])
+        return (len(self.base_rows), dim)
+
+    def __len__(self) -> int:
+        return len(self.base_rows)
+
+    def __getitem__(self, idx):
+        if np.isscalar(idx):
+            b = self.base_rows[idx]
+            if b >= 0:
+                return np.asarray(self.base[b], dtype=np.float32)
+            p = self.private_rows[idx]
+            return self.private[p] if p >= 0 else np.zeros(self.shape[1], dtype=np.float32)
+        idx = np.asarray(idx, dtype=np.int64)
+        return StoreBackedMatrix(self.base, self.base_rows[idx], self.private, self.private_rows[idx], self.chunk_rows)
+
+    def __matmul__(self, q: np.ndarray) -> np.ndarray:
+        # q: vector (d,) hoặc ma trận (d, k) của batch query
+        q = np.asarray(q, dtype=np.float32)
+        out = np.zeros((len(self.base_rows),) + q.shape[1:], dtype=np.float32)
+        in_base = self.base_rows >= 0
+        n_base = int(in_base.sum())
+        if n_base and n_base * 4 < self.base.shape[0]:
+            # tập hàng nhỏ (vd. cụm IVF của retrieval): chỉ đọc đúng các hàng đó từ memmap
+            out[in_base] = np.asarray(self.base[self.base_rows[in_base]], dtype=np.float32) @ q
+        elif n_base:
+            # duyệt base theo chunk: chỉ upcast float16 -> float32 từng khối, page cache dùng chung giữa worker
+            full = np.empty((self.base.shape[0],) + q.shape[1:], dtype=np.float32)
+            for start in range(0, self.base.shape[0], self.chunk_rows):
+                block = np.asarray(self.base[start:start + self.chunk_rows], dtype=np.float32)
+                full[start:start + len(block)] = block @ q
+            out[in_base] = full[self.base_rows[in_base]]
+        in_private = self.private_rows >= 0
+        if in_private.any():
+            out[in_private] = self.private[self.private_rows[in_private]] @ q
+        return out
+
+    def dense(self) -> np.ndarray:
+        """Copy float32 (n, d) của các hàng (vd. ghi shard ra file); hàng không có vector = 0."""
+        out = np.zeros(self.shape, dtype=np.float32)
+        in_base = self.base_rows >= 0
+        if in_base.any():
+            out[in_base] = np.asarray(self.base[self.base_rows[in_base]], dtype=np.float32)
+        in_private = self.private_rows >= 0
+        if in_private.any():
+            out[in_private] = self.private[self.private_rows[in_private]]
+        return out
+
+    def concat(self, other: "StoreBackedMatrix") -> "StoreBackedMatrix":
+        if other.base is not self.base:
+            # base khác generation: dồn hàng của other vào private
+            vecs = np.stack([other[i] for i in range(len(other))]) if len(other) else other.private[:0]
+            other = StoreBackedMatrix(self.base, np.full(len(vecs), -1), vecs, np.arange(len(vecs)))
+        offset = len(self.private)
+        private = np.vstack((self.private, other.private)) if len(other.private) else self.private
+        priv_rows = np.where(other.private_rows >= 0, other.private_rows + offset, -1)
+        return StoreBackedMatrix(self.base, np.concatenate((self.base_rows, other.base_rows)), private,
+                                 np.concatenate((self.private_rows, priv_rows)), self.chunk_rows)
+
+
+class MmapEmbeddingStore:
+    """
+    Embedding store trên đĩa dùng chung giữa nhiều uvicorn worker:
+    - base float16 được np.load(mmap_mode="r") -> N worker chia sẻ 1 bản trong page cache
+    - cập nhật ghi vào delta segment append-only; refresh() đọc phần mới, compact() gộp vào base mới
+    """
+    def __init__(self, path: str, dim: Optional[int] = None, dtype: str = "float16", compact_threshold: int = 5000):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.compact_threshold = compact_threshold
+        self.generation = -1
+        self.base: np.ndarray = np.zeros((0, dim or 0), dtype=self.dtype)
+        self.ids: List[Any] = []
+        self.row_of: Dict[Any, int] = {}
+        self.delta: Dict[Any, Optional[np.ndarray]] = {}   # key -> vector (None = đã xóa)
+        self.delta_records = 0
+        self._changed_keys: set = set()
+        self._manifest: Dict[str, Any] = {}
+        self._manifest_mtime = None
+        self._delta_offset = 0
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+    # ---------- paths / locking ----------
+    def _p(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _flock(self):
+        with open(self._p(".lock"), "a+") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _write_json(self, name: str, obj: Any) -> None:
+        tmp = self._p(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(obj, fh)
+        os.replace(tmp, self._p(name))
+
+    # ---------- read side ----------
+    def exists(self) -> bool:
+        return os.path.exists(self._p(MANIFEST))
+
+    def refresh(self) -> bool:
+        """Mở lại base nếu có generation mới, đọc thêm record delta. True nếu có thay đổi."""
+        with self._lock:
+            if not self.exists():
+                return False
+            mtime = os.stat(self._p(MANIFEST)).st_mtime_ns
+            changed = False
+            if mtime != self._manifest_mtime:
+                with open(self._p(MANIFEST), encoding="utf-8") as fh:
+                    manifest = json.load(fh)
+                self._manifest_mtime = mtime
+                if manifest["generation"] != self.generation:
+                    self._open_generation(manifest)
+                    changed = True
+            return self._read_delta() or changed
+
+    def _open_generation(self, manifest: Dict[str, Any]) -> None:
+        self._manifest = manifest
+        self.generation = manifest["generation"]
+        self.dim = manifest["dim"]
+        self.dtype = np.dtype(manifest["dtype"])
+        self.base = np.load(self._p(manifest["base"]), mmap_mode="r")
+        with open(self._p(manifest["ids"]), encoding="utf-8") as fh:
+            self.ids = json.load(fh)
+        self.row_of = {k: i for i, k in enumerate(self.ids)}
+        self.delta = {}
+        self.delta_records = 0
+        self._delta_offset = 0
+        self._changed_keys = set()
+        logger.info("[vector_store] %s: opened generation %d (%d rows)", self.path, self.generation, len(self.ids))
+
+    def _read_delta(self) -> bool:
+        name = self._manifest.get("delta")
+        if not name or not os.path.exists(self._p(name)):
+            return False
+        size = os.path.getsize(self._p(name))
+        if size <= self._delta_offset:
+            return False
+        vec_bytes = self.dim * self.dtype.itemsize
+        with open(self._p(name), "rb") as fh:
+            fh.seek(self._delta_offset)
+            buf = fh.read(size - self._delta_offset)
+        pos, n = 0, 0
+        while pos + _REC.size <= len(buf):
+            op, klen = _REC.unpack_from(buf, pos)
+            end = pos + _REC.size + klen + (vec_bytes if op == OP_PUT else 0)
+            if end > len(buf):
+                break  # record đang được ghi dở, đọc lại lần sau
+            key = json.loads(buf[pos + _REC.size:pos + _REC.size + klen])
+            self._changed_keys.add(key)
+            if op == OP_PUT:
+                self.delta[key] = np.frombuffer(buf, dtype=self.dtype, count=self.dim, offset=pos + _REC.size + klen)
+            else:
+                self.delta[key] = None
+            pos, n = end, n + 1
+        self._delta_offset += pos
+        self.delta_records += n
+        return n > 0
+
+    def take_changed_keys(self) -> set:
+        """Các key vừa đọc thêm từ delta kể từ lần gọi trước (để snapshot cập nhật đúng hàng)."""
+        with self._lock:
+            keys, self._changed_keys = self._changed_keys, set()
+            return keys
+
+    def get(self, key: Any) -> Optional[np.ndarray]:
+        with self._lock:
+            if key in self.delta:
+                v = self.delta[key]
+                return None if v is None else v.astype(np.float32)
+            row = self.row_of.get(key)
+            return None if row is None else np.asarray(self.base[row], dtype=np.float32)
+
+    def matrix_for(self, keys: List[Any]) -> StoreBackedMatrix:
+        """Ma trận theo thứ tự `keys`: hàng trong base giữ dạng tham chiếu, hàng delta copy vào block private."""
+        with self._lock:
+            base_rows = np.full(len(keys), -1, dtype=np.int64)
+            private_rows = np.full(len(keys), -1, dtype=np.int64)
+            private: List[np.ndarray] = []
+            for i, k in enumerate(keys):
+                if k in self.delta:
+                    v = self.delta[k]
+                    if v is not None:
+                        private_rows[i] = len(private); private.append(v.astype(np.float32))
+                    continue
+                row = self.row_of.get(k)
+                if row is not None:
+                    base_rows[i] = row
+            priv = np.stack(private) if private else np.zeros((0, self.dim or 0), dtype=np.float32)
+            return StoreBackedMatrix(self.base, base_rows, priv, private_rows)
+
+    # ---------- write side ----------
+    def write_base(self, keys: List[Any], vectors: np.ndarray) -> int:
+        """Ghi 1 generation mới (export toàn bộ / compaction). Trả về generation."""
+        with self._flock(), self._lock:
+            return self._write_generation(keys, vectors)
+
+    def _write_generation(self, keys: List[Any], vectors: np.ndarray) -> int:
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        if vectors.ndim != 2 or vectors.shape[0] != len(keys):
+            raise ValueError(f"Expected ({len(keys)}, dim) vectors, got {vectors.shape}")
+        gen = max(self.generation, self._on_disk_generation()) + 1
+        base, ids, delta = f"base-{gen}.npy", f"ids-{gen}.json", f"delta-{gen}.log"
+        np.save(self._p(base + ".tmp.npy"), vectors)
+        os.replace(self._p(base + ".tmp.npy"), self._p(base))
+        self._write_json(ids, list(keys))
+        open(self._p(delta), "ab").close()
+        old = self._manifest if self._manifest else self._read_manifest()
+        self._write_json(MANIFEST, {"generation": gen, "dim": int(vectors.shape[1]), "dtype": self.dtype.name,
+                                    "base": base, "ids": ids, "delta": delta})
+        # worker cũ vẫn giữ mmap tới inode cũ, xóa file an toàn trên POSIX
+        for name in (old or {}).values():
+            if isinstance(name, str) and name != MANIFEST and os.path.exists(self._p(name)) and name not in (base, ids, delta):
+                try:
+                    os.remove(self._p(name))
+                except OSError:
+                    pass
+        self.refresh()
+        return gen
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not self.exists():
+            return {}
+        with open(self._p(MANIFEST), encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def _on_disk_generation(self) -> int:
+        return self._read_manifest().get("generation", -1)
+
+    def append(self, key: Any, vec: Optional[np.ndarray]) -> None:
+        """Ghi 1 record vào delta (vec=None => xóa). Tự compact khi delta vượt ngưỡng."""
+        with self._flock(), self._lock:
+            self.refresh()
+            if not self._manifest:
+                dim = int(np.asarray(vec).size) if vec is not None else int(self.dim or 0)
+                self._write_generation([], np.zeros((0, dim), dtype=self.dtype))
+            kb = _key_bytes(key)
+            if vec is None:
+                rec = _REC.pack(OP_DELETE, len(kb)) + kb
+            else:
+                arr = np.asarray(vec, dtype=self.dtype).reshape(-1)
+                if arr.shape[0] != self.dim:
+                    raise ValueError(f"Vector dim {arr.shape[0]} != store dim {self.dim}")
+                rec = _REC.pack(OP_PUT, len(kb)) + kb + arr.tobytes()
+            with open(self._p(self._manifest["delta"]), "ab") as fh:
+                fh.write(rec)
+            self._read_delta()
+            if self.delta_records >= self.compact_threshold:
+                self._compact_locked()
+
+    def compact(self) -> int:
+        with self._flock(), self._lock:
+            self.refresh()
+            return self._compact_locked()
+
+    def _compact_locked(self) -> int:
+        keys = [k for k in self.ids if k not in self.delta]
+        rows = [self.row_of[k] for k in keys]
+        vecs = [np.asarray(self.base[rows], dtype=self.dtype)] if rows else []
+        added = [(k, v) for k, v in self.delta.items() if v is not None]
+        keys += [k for k, _ in added]
+        if added:
+            vecs.append(np.stack([v for _, v in added]).astype(self.dtype))
+        matrix = np.vstack(vecs) if vecs else np.zeros((0, self.dim or 0), dtype=self.dtype)
+        gen = self._write_generation(keys, matrix)
+        logger.info("[vector_store] %s: compacted into generation %d (%d rows)", self.path, gen, len(keys))
+        return gen
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "generation": self.generation,
+            "rows": len(self.ids),
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "delta_records": self.delta_records,
+        }
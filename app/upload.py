@@ -2,10 +2,11 @@
 import os
 import logging, traceback
 from io import BytesIO
+from datetime import datetime, timezone
 from typing import List, Dict, Optional
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, status
-from pymongo.database import Database
+from fastapi.concurrency import run_in_threadpool
 from sentence_transformers import SentenceTransformer
 import PyPDF2
 import docx
@@ -13,17 +14,24 @@ import docx
 
 from app.schemas import UploadResponse, CandidateInfo, JobSearchResponseItem
 from app.services.summarizer import BartSummarizer
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_codec import pack_embedding, unpack_embedding
+from app.services.vector_store import MmapEmbeddingStore
+from app.services.explanations import ExplanationService
+from app.normalize import prepare_candidate
+from app.services.dedup import CANDIDATE_DEDUP, fingerprint
+from app.database import CandidateRepository
 from scripts.parse_cv import parse_cv_file  # đảm bảo path đúng
 
 router = APIRouter(prefix="/candidates", tags=["candidates"])
 logger = logging.getLogger("upload")
 
 # ---------- Dependencies ----------
-def get_database(request: Request) -> Database:
-    db: Optional[Database] = getattr(request.app.state, "db", None)
-    if db is None:
+def get_candidate_repo(request: Request) -> CandidateRepository:
+    mongo = getattr(request.app.state, "mongo", None)
+    if mongo is None:
         raise HTTPException(status_code=500, detail="Database not initialized")
-    return db
+    return mongo.candidates
 
 def get_sbert(request: Request) -> Optional[SentenceTransformer]:
     return getattr(request.app.state, "sbert_model", None)
@@ -31,11 +39,22 @@ def get_sbert(request: Request) -> Optional[SentenceTransformer]:
 def get_summarizer(request: Request) -> Optional[BartSummarizer]:
     return getattr(request.app.state, "bart_summarizer", None)
 
+def get_embedding_cache(request: Request) -> Optional[EmbeddingCache]:
+    return getattr(request.app.state, "embedding_cache", None)
+
+def get_candidate_store(request: Request) -> Optional[MmapEmbeddingStore]:
+    return (getattr(request.app.state, "vector_stores", None) or {}).get("candidates")
+
+def get_explanations(request: Request) -> Optional[ExplanationService]:
+    svc = getattr(request.app.state, "svc", None)
+    return getattr(svc, "explanations", None)
+
 def get_ranker(request: Request):
     svc = getattr(request.app.state, "svc", None)
     if svc is None or not getattr(svc, "ready", False):
         raise HTTPException(status_code=503, detail="Ranker service not ready")
-    return svc
+    # chế độ cluster: ClusterRanker rải sang mọi phân vùng
+    return getattr(request.app.state, "ranker", None) or svc
 
 # ---------- File extract helpers ----------
 def extract_text_from_pdf(file_bytes: bytes) -> str:
@@ -82,17 +101,20 @@ def safe_summarize(bart_summarizer: Optional[BartSummarizer], text: str) -> str:
         logger.warning("BART summarize failed: %s", e)
         return (text or "")[:1200]
 
-def safe_encode(sbert_model: Optional[SentenceTransformer], text: str):
+def safe_encode(sbert_model: Optional[SentenceTransformer], text: str, embedding_cache: Optional[EmbeddingCache] = None):
     try:
         if sbert_model is None:
             return None
+        if embedding_cache is not None:
+            vec = embedding_cache.encode(sbert_model, text)
+            return vec.tolist() if vec is not None else None
         return sbert_model.encode([text], normalize_embeddings=True)[0].tolist()
     except Exception as e:
         logger.warning("SBERT encode failed: %s", e)
         return None
 
 # ---------- Upsert ----------
-def upsert_candidate(db: Database, parsed_data: Dict) -> str:
+async def upsert_candidate(repo: CandidateRepository, parsed_data: Dict) -> str:
     import uuid
     emails = parsed_data.get("emails") or []
     if isinstance(emails, str):
@@ -100,24 +122,39 @@ def upsert_candidate(db: Database, parsed_data: Dict) -> str:
     parsed_data["emails"] = emails
     if not parsed_data.get("cand_id"):
         parsed_data["cand_id"] = str(uuid.uuid4())
+    # updated_at: snapshot polling dựa vào field này khi không có change stream
+    parsed_data["updated_at"] = datetime.now(timezone.utc)
+    # field scoring đã chuẩn hóa (skills_key, location_codes, ...) lưu luôn lúc ghi
+    parsed_data.update(prepare_candidate(parsed_data))
+    # fingerprint khử trùng: CV upload lại (email khác / không có email) gộp vào cùng 1 ứng viên
+    parsed_data.update(fingerprint(CANDIDATE_DEDUP.text(parsed_data)))
+    parsed_data["dup_of"] = None
 
-    coll = db["candidates"]
-    existing = coll.find_one({"emails": {"$in": emails}}) if emails else None
+    existing = await repo.find_existing(emails, parsed_data["content_hash"])
     if existing:
-        print(f"[MongoDB] Candidate với email {emails} đã tồn tại, cập nhật thông tin.")
-        coll.update_one({"_id": existing["_id"]}, {"$set": parsed_data})
-        return existing.get("cand_id", parsed_data["cand_id"])
-    print(f"[MongoDB] Thêm ứng viên mới với email {emails} vào collection candidates.")
-    coll.insert_one(parsed_data)
-    return parsed_data["cand_id"]
+        print(f"[MongoDB] Candidate {existing.get('cand_id')} (email {emails} / cùng nội dung CV) đã tồn tại, cập nhật thông tin.")
+        cand_id = existing.get("cand_id", parsed_data["cand_id"])
+        parsed_data["cand_id"] = cand_id
+        await repo.update(existing["_id"], parsed_data)
+    else:
+        print(f"[MongoDB] Thêm ứng viên mới với email {emails} vào collection candidates.")
+        await repo.insert(parsed_data)
+        cand_id = parsed_data["cand_id"]
+    n = await repo.mark_near_duplicates(parsed_data, cand_id, now=parsed_data["updated_at"])
+    if n:
+        print(f"[MongoDB] Đánh dấu {n} ứng viên trùng với {cand_id}.")
+    return cand_id
 
 # ---------- POST /candidates/upload ----------
 @router.post("/upload", response_model=UploadResponse)
 async def upload_cv(
     file: UploadFile = File(...),
-    db: Database = Depends(get_database),
+    repo: CandidateRepository = Depends(get_candidate_repo),
     sbert_model: Optional[SentenceTransformer] = Depends(get_sbert),
     bart_summarizer: Optional[BartSummarizer] = Depends(get_summarizer),
+    embedding_cache: Optional[EmbeddingCache] = Depends(get_embedding_cache),
+    vector_store: Optional[MmapEmbeddingStore] = Depends(get_candidate_store),
+    explanations: Optional[ExplanationService] = Depends(get_explanations),
 ):
     try:
         # 0) Content-type whitelist (nới lỏng 1 số loại thường gặp)
@@ -150,7 +187,8 @@ async def upload_cv(
         # 2) Extract text (bọc lỗi để trả 400 thay vì 500)
         try:
             logger.info(f"[UPLOAD] Step 2: Extracting text from file {file.filename}")
-            cv_text = extract_text_from_file(file.filename, content)
+            # bước CPU (parse file, BART, SBERT) chạy trong threadpool, không chặn event loop
+            cv_text = await run_in_threadpool(extract_text_from_file, file.filename, content)
             logger.info(f"[UPLOAD] Step 2: Extracted text length={len(cv_text) if cv_text else 0}")
         except HTTPException:
             logger.error(f"[UPLOAD] Step 2: HTTPException during extract_text_from_file")
@@ -165,14 +203,14 @@ async def upload_cv(
 
         # 3) Summarize (best-effort)
         logger.info(f"[UPLOAD] Step 3: Summarizing CV text")
-        resume_summary = safe_summarize(bart_summarizer, cv_text)
+        resume_summary = await run_in_threadpool(safe_summarize, bart_summarizer, cv_text)
         logger.info(f"[UPLOAD] Step 3: Summary length={len(resume_summary) if resume_summary else 0}")
 
         # 4) Parse CV (bọc riêng để khỏi rơi 500)
         filename_wo = os.path.splitext(file.filename)[0] if file.filename else "unknown"
         try:
             logger.info(f"[UPLOAD] Step 4: Parsing CV file")
-            parsed_data = parse_cv_file(cv_text, filename_wo) or {}
+            parsed_data = await run_in_threadpool(parse_cv_file, cv_text, filename_wo) or {}
             logger.info(f"[UPLOAD] Step 4: Parsed data keys={list(parsed_data.keys())}")
         except Exception as e:
             logger.error("[UPLOAD] Step 4: CV_PARSE_ERROR: %s\n%s", e, traceback.format_exc())
@@ -193,13 +231,22 @@ async def upload_cv(
         # 5) Embedding
         emb_src = resume_summary if resume_summary else parsed_data["resume_text"]
         logger.info(f"[UPLOAD] Step 5: Encoding embedding")
-        parsed_data["resume_embedding"] = safe_encode(sbert_model, emb_src)
+        parsed_data["resume_embedding"] = pack_embedding(
+            await run_in_threadpool(safe_encode, sbert_model, emb_src, embedding_cache))
         logger.info(f"[UPLOAD] Step 5: Embedding type={type(parsed_data['resume_embedding'])}")
 
         # 6) Upsert
         logger.info(f"[UPLOAD] Step 6: Upserting candidate")
-        cand_id = upsert_candidate(db, parsed_data)
+        cand_id = await upsert_candidate(repo, parsed_data)
         logger.info(f"[UPLOAD] Step 6: Upserted cand_id={cand_id}")
+        if explanations is not None:
+            # CV cập nhật cho cand_id đã có -> giải thích cache cũ không còn đúng
+            explanations.invalidate(cand_id=cand_id)
+        if vector_store is not None and parsed_data["resume_embedding"] is not None:
+            try:
+                await run_in_threadpool(vector_store.append, cand_id, unpack_embedding(parsed_data["resume_embedding"]))
+            except Exception as e:
+                logger.warning("[UPLOAD] Step 6: vector store append failed: %s", e)
 
         # 7) Response
         candidate_info = CandidateInfo(
@@ -235,20 +282,25 @@ async def upload_cv(
 async def upload_and_match(
     top_k: int = 10,
     file: UploadFile = File(...),
-    db: Database = Depends(get_database),
+    repo: CandidateRepository = Depends(get_candidate_repo),
     sbert_model: Optional[SentenceTransformer] = Depends(get_sbert),
     bart_summarizer: Optional[BartSummarizer] = Depends(get_summarizer),
+    embedding_cache: Optional[EmbeddingCache] = Depends(get_embedding_cache),
+    vector_store: Optional[MmapEmbeddingStore] = Depends(get_candidate_store),
+    explanations: Optional[ExplanationService] = Depends(get_explanations),
     ranker = Depends(get_ranker),
 ):
     from fastapi.responses import JSONResponse
     try:
-        upload_resp = await upload_cv(file=file, db=db, sbert_model=sbert_model, bart_summarizer=bart_summarizer)
+        upload_resp = await upload_cv(file=file, repo=repo, sbert_model=sbert_model, bart_summarizer=bart_summarizer,
+                                      embedding_cache=embedding_cache, vector_store=vector_store,
+                                      explanations=explanations)
         cand_id = upload_resp.candidate.cand_id
     except HTTPException as he:
         raise he
 
     try:
-        matches = ranker.search_jobs_for_candidate(cand_id=cand_id, keyword=None, top_k=top_k)
+        matches = await run_in_threadpool(ranker.search_jobs_for_candidate, cand_id=cand_id, keyword=None, top_k=top_k)
         matches = [m if isinstance(m, dict) else m.dict() for m in matches]
         return {"upload": upload_resp.dict(), "matches": matches}
     except Exception as e:
@@ -260,8 +312,8 @@ async def upload_and_match(
 
 # ---------- GET /candidates/{cand_id}/summary ----------
 @router.get("/{cand_id}/summary")
-def get_candidate_summary(cand_id: str, db: Database = Depends(get_database)):
-    doc = db["candidates"].find_one({"cand_id": cand_id}, {"_id": 0, "cand_id": 1, "resume_summary": 1})
+async def get_candidate_summary(cand_id: str, repo: CandidateRepository = Depends(get_candidate_repo)):
+    doc = await repo.get(cand_id, {"_id": 0, "cand_id": 1, "resume_summary": 1})
     if not doc:
         raise HTTPException(status_code=404, detail="Candidate not found")
     return doc
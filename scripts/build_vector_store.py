@@ -0,0 +1,66 @@
+"""
+Export embeddings from MongoDB into the memory-mapped vector store shared by uvicorn workers.
+- Writes <VECTOR_STORE_DIR>/<collection>/ (manifest.json, ids-<g>.json, base-<g>.npy float16, delta-<g>.log)
+- Run: python scripts/build_vector_store.py --out ./vector_store [--collections candidates jobs] [--compact-only]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embedding_codec import doc_embedding
+from app.services.snapshot import CANDIDATE_SPEC, JOB_SPEC
+from app.services.vector_store import MmapEmbeddingStore
+
+SPECS = {"candidates": CANDIDATE_SPEC, "jobs": JOB_SPEC}
+
+def export_collection(db, spec, out_dir, dtype="float16", batch_size=2000):
+    t0 = time.perf_counter()
+    proj = {"_id": 0, spec.key: 1, **{f: 1 for f in spec.embedding_fields}}
+    keys, vecs, skipped, dim = [], [], 0, None
+    for doc in db[spec.collection].find({}, proj, batch_size=batch_size):
+        vec = doc_embedding(doc, spec.embedding_fields)
+        if vec is None or doc.get(spec.key) is None:
+            skipped += 1
+            continue
+        dim = dim or vec.shape[0]
+        if vec.shape[0] != dim:
+            skipped += 1
+            continue
+        keys.append(doc[spec.key]); vecs.append(vec.astype(dtype))
+    matrix = np.stack(vecs) if vecs else np.zeros((0, dim or 0), dtype=dtype)
+    store = MmapEmbeddingStore(os.path.join(out_dir, spec.collection), dtype=dtype)
+    gen = store.write_base(keys, matrix)
+    print(f"{spec.collection}: {len(keys)} vectors (skipped {skipped}) -> generation {gen}, "
+          f"{matrix.nbytes/1024/1024:.1f}MB in {time.perf_counter() - t0:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared memory-mapped embedding store")
+    parser.add_argument("--out", default=os.getenv("VECTOR_STORE_DIR", "./vector_store"))
+    parser.add_argument("--collections", nargs="+", default=list(SPECS), choices=list(SPECS))
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--compact-only", action="store_true", help="Merge delta segments into a new base without reading Mongo")
+    args = parser.parse_args()
+
+    if args.compact_only:
+        for name in args.collections:
+            store = MmapEmbeddingStore(os.path.join(args.out, name))
+            if not store.refresh() and not store.exists():
+                print(f"{name}: no store at {store.path}")
+                continue
+            print(f"{name}: compacted into generation {store.compact()}")
+        return
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("MONGO_DB", "matching_db")]
+    for name in args.collections:
+        export_collection(db, SPECS[name], args.out, args.dtype)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Gom job / ứng viên trùng lặp đã có trong DB thành cụm, chỉ giữ 1 bản đại diện (dup_of = None).
+- Trùng tuyệt đối (content_hash, job_hash), gần trùng (MinHash/LSH trên shingle), embedding gần nhau (cosine)
+- Document thiếu fingerprint được backfill trong cùng lượt
+- Run: python scripts/dedup.py --collection all [--jaccard 0.8] [--cosine 0.97] [--dry-run]
+"""
+import os
+import sys
+import argparse
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.dedup import CANDIDATE_DEDUP, COSINE_THRESHOLD, JACCARD_THRESHOLD, JOB_DEDUP, dedup_collection
+
+SPECS = {"jobs": JOB_DEDUP, "candidates": CANDIDATE_DEDUP}
+
+def main():
+    parser = argparse.ArgumentParser(description="Collapse duplicate jobs / candidates into clusters")
+    parser.add_argument("--collection", default="all", choices=["jobs", "candidates", "all"])
+    parser.add_argument("--jaccard", type=float, default=JACCARD_THRESHOLD, help="MinHash Jaccard threshold")
+    parser.add_argument("--cosine", type=float, default=COSINE_THRESHOLD, help="Embedding cosine threshold (<= 0 disables)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only report clusters, do not write")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("MONGO_DB", "matching_db")]
+    names = list(SPECS) if args.collection == "all" else [args.collection]
+    for name in names:
+        stats = dedup_collection(db, SPECS[name], jaccard=args.jaccard, cosine=args.cosine if args.cosine > 0 else None,
+                                 batch_size=args.batch_size, dry_run=args.dry_run)
+        print(f"{name}: {stats['docs']} docs, {stats['clusters']} clusters, {stats['duplicates']} duplicates "
+              f"({stats['changed']} changed{', dry-run' if args.dry_run else ''}), pairs={stats['pairs']} in {stats['took_s']}s")
+
+if __name__ == "__main__":
+    main()
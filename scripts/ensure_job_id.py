@@ -1,20 +1,34 @@
+import os
+import sys
+import argparse
+from itertools import count
 from pymongo import MongoClient
 
-client = MongoClient('mongodb://localhost:27017')
-db = client['matching_db']
-jobs = db['jobs']
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.normalize_engine import BulkNormalizer, Rule, add_cli_args
 
-def ensure_job_id():
-    count = 0
-    for idx, doc in enumerate(jobs.find()):
+def job_id_rule():
+    position = count(1)
+    def assign(doc):
+        idx = next(position)  # vị trí trong thứ tự quét (bắt đầu từ 1)
         # Nếu đã có job_id và là số > 0 thì giữ nguyên
         job_id = doc.get('job_id')
         if isinstance(job_id, int) and job_id > 0:
-            continue
-        # Gán job_id mới (tăng dần, bắt đầu từ 1)
-        jobs.update_one({'_id': doc['_id']}, {'$set': {'job_id': idx + 1}})
-        count += 1
-    print(f"Updated job_id for {count} jobs.")
+            return job_id
+        # Gán job_id mới theo vị trí
+        return idx
+    return Rule('job_id', assign)
+
+def ensure_job_id(jobs, batch_size=1000, dry_run=False, show_diffs=10):
+    stats = BulkNormalizer(jobs, [job_id_rule()], batch_size=batch_size, dry_run=dry_run, show_diffs=show_diffs).run()
+    print(stats.summary("Updated job_id"))
+    return stats
 
 if __name__ == "__main__":
-    ensure_job_id()
+    parser = argparse.ArgumentParser(description="Assign sequential job_id to jobs missing one")
+    add_cli_args(parser)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    jobs = client[os.getenv("MONGO_DB", "matching_db")]['jobs']
+    ensure_job_id(jobs, batch_size=args.batch_size, dry_run=args.dry_run, show_diffs=args.show_diffs)
@@ -0,0 +1,101 @@
+"""
+Đánh giá offline RankerService trên tập pair có nhãn: P@k, R@k, nDCG@k, MAP, MRR + latency / throughput.
+- Lượt "exact" (chấm toàn bộ snapshot) luôn chạy trước làm tham chiếu; mỗi --retrieval thêm 1 lượt với cấu hình
+  đó (file JSON hoặc JSON inline, khóa như app.services.retrieval.RetrievalConfig) và báo overlap@k so với exact
+- Nhãn: CSV / JSONL cột job_id, cand_id, label (gain > 0 = liên quan)
+- Run: python scripts/evaluate.py --pairs labels.csv [--task candidates|jobs] [--k 5 10] [--top-k 100]
+       [--retrieval cfg.json ...] [--concurrency 4] [--folds 5] [--out report.json]
+"""
+import os
+import sys
+import json
+import argparse
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.evaluation.runner import RANKERS, TASKS, build_service, configure_retrieval, evaluate, load_qrels
+from app.services.retrieval import RetrievalConfig
+
+def load_config(arg: str) -> RetrievalConfig:
+    if arg.lstrip().startswith("{"):
+        data = json.loads(arg)
+    else:
+        with open(arg, encoding="utf-8") as f:
+            data = json.load(f)
+    # file do tune_retrieval.py sinh có thể bọc cấu hình trong khóa "retrieval"
+    return RetrievalConfig.from_dict({"enabled": True, **data.get("retrieval", data)})
+
+def config_name(arg: str, i: int) -> str:
+    return f"config{i}" if arg.lstrip().startswith("{") else os.path.splitext(os.path.basename(arg))[0]
+
+def print_table(reports, ks):
+    cols = [*(f"{m}@{k}" for k in ks for m in ("P", "R", "nDCG")), "MAP", "MRR"]
+    head = f"{'run':<20}" + "".join(f"{c:>9}" for c in cols) + f"{'ovl@' + str(ks[-1]):>9}{'p50ms':>9}{'p95ms':>9}{'qps':>9}"
+    print(head)
+    print("-" * len(head))
+    for r in reports:
+        ovl = r.overlap.get(f"overlap@{ks[-1]}")
+        print(f"{r.name:<20}" + "".join(f"{r.metrics[c]:>9.4f}" for c in cols)
+              + (f"{ovl:>9.4f}" if ovl is not None else f"{'-':>9}")
+              + f"{r.latency['p50_ms']:>9.1f}{r.latency['p95_ms']:>9.1f}{r.throughput['qps']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ranking evaluation (quality + latency)")
+    parser.add_argument("--pairs", required=True, help="Labelled pairs: CSV or JSONL with job_id, cand_id, label")
+    parser.add_argument("--task", default="candidates", choices=list(TASKS),
+                        help="candidates: rank candidates per job_id; jobs: rank jobs per cand_id")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--top-k", type=int, default=100, help="Results requested per query (depth for R@k / MAP)")
+    parser.add_argument("--retrieval", action="append", default=[], help="Retrieval config (JSON file or inline JSON); repeatable")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--folds", type=int, default=0, help="Report per-fold metrics over query groups (GroupKFold)")
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate only the first N queries")
+    parser.add_argument("--no-snapshot", action="store_true", help="Score from Mongo instead of in-memory snapshots")
+    parser.add_argument("--no-model", action="store_true", help="Skip SBERT (documents without stored embeddings get semantic = 0)")
+    parser.add_argument("--out", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    load_dotenv()
+    qrels = load_qrels(args.pairs, args.task)
+    if args.limit:
+        qrels = dict(list(qrels.items())[:args.limit])
+    if not qrels:
+        parser.error(f"no labelled pairs in {args.pairs}")
+    ks = sorted(set(args.k))
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("MONGO_DB", "matching_db")]
+    model, model_id = None, os.getenv("SBERT_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    if not args.no_model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_id)
+    svc = build_service(db, model, model_id, snapshots=not args.no_snapshot)
+    ranker = RANKERS[args.task](svc, args.top_k)
+    print(f"{len(qrels)} queries, {sum(len(v) for v in qrels.values())} labelled pairs, task={args.task}")
+
+    runs = [("exact", None)] + [(config_name(a, i), load_config(a)) for i, a in enumerate(args.retrieval, 1)]
+    reports, reference = [], None
+    for name, config in runs:
+        configure_retrieval(svc, config)
+        report, run = evaluate(ranker, qrels, ks, name=name, warmup=args.warmup, concurrency=args.concurrency,
+                               folds=args.folds, reference=reference)
+        reference = reference or run
+        reports.append(report)
+    configure_retrieval(svc, None)
+
+    print_table(reports, ks)
+    if args.folds > 1:
+        for r in reports:
+            print(f"{r.name}: fold std " + ", ".join(f"{m}={v:.4f}" for m, v in r.fold_std.items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"task": args.task, "pairs": args.pairs, "ks": ks, "top_k": args.top_k,
+                       "runs": [r.to_dict() for r in reports]}, f, indent=2)
+        print(f"report -> {args.out}")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Convert embeddings stored as BSON arrays of doubles (`.tolist()`) into packed BSON Binary (float16 / int8).
+- jobs.embedding, candidates.embedding, candidates.resume_embedding
+- Run: python scripts/migrate_embeddings.py --dtype float16 [--dry-run]
+"""
+import os
+import sys
+import time
+import argparse
+
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embedding_codec import pack_embedding
+
+TARGETS = [
+    ("jobs", "embedding"),
+    ("candidates", "embedding"),
+    ("candidates", "resume_embedding"),
+]
+
+def migrate_field(coll, field, dtype, batch_size=500, dry_run=False):
+    query = {field: {"$type": "array"}}
+    cursor = coll.find(query, {"_id": 1, field: 1}, batch_size=batch_size)
+    ops, converted, bytes_before, bytes_after = [], 0, 0, 0
+    t0 = time.perf_counter()
+    for doc in cursor:
+        vec = doc.get(field) or []
+        packed = pack_embedding(vec, dtype) if vec else None
+        # BSON double = 8 byte + key "0".."383" + type byte mỗi phần tử
+        bytes_before += sum(8 + 2 + len(str(i)) for i in range(len(vec)))
+        bytes_after += len(packed) if packed is not None else 0
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: packed}}))
+        if len(ops) >= batch_size:
+            if not dry_run:
+                coll.bulk_write(ops, ordered=False)
+            converted += len(ops); ops = []
+    if ops:
+        if not dry_run:
+            coll.bulk_write(ops, ordered=False)
+        converted += len(ops)
+    dt = time.perf_counter() - t0
+    print(f"{coll.name}.{field}: {converted} docs {'(dry-run) ' if dry_run else ''}"
+          f"~{bytes_before/1024:.1f}KB -> {bytes_after/1024:.1f}KB in {dt:.1f}s")
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack stored embeddings into compact BSON Binary")
+    parser.add_argument("--dtype", default=os.getenv("EMBEDDING_STORAGE_DTYPE", "float16"), choices=["float16", "int8", "float32"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only report sizes, do not write")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("MONGO_DB", "matching_db")]
+    total = 0
+    for coll_name, field in TARGETS:
+        total += migrate_field(db[coll_name], field, args.dtype, args.batch_size, args.dry_run)
+    print(f"Migrated {total} embeddings to {args.dtype}.")
+
+if __name__ == "__main__":
+    main()
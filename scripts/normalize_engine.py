@@ -0,0 +1,190 @@
+"""
+Bulk normalization engine shared by the normalize_* / ensure_job_id scripts.
+- Streams documents with a projection limited to the fields the rules read/write
+- Applies rules per document, diffs against the original and only sends changed fields
+- Writes with unordered bulk_write in batches; optional server-side pipeline updates
+  ($toLower/$trim/$split...) for rules that have an aggregation expression
+- --dry-run prints a sample of diffs and counts without writing
+- Rewritten documents get updated_at = now so polling snapshots pick them up without a full reload
+"""
+import time
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+
+_MISSING = object()
+
+
+@dataclass
+class Rule:
+    """1 field đích: `fn(doc) -> giá trị mới`, `needs` = field nguồn cần đọc, `server` = biểu thức aggregation tương đương."""
+    field: str
+    fn: Callable[[dict], Any]
+    needs: Tuple[str, ...] = ()
+    server: Optional[dict] = None
+
+
+@dataclass
+class NormalizeStats:
+    scanned: int = 0
+    changed: int = 0
+    written: int = 0
+    server_matched: int = 0
+    server_modified: int = 0
+    elapsed: float = 0.0
+    field_changes: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self, name: str) -> str:
+        rate = self.scanned / self.elapsed if self.elapsed else 0.0
+        fields = ", ".join(f"{k}={v}" for k, v in sorted(self.field_changes.items())) or "-"
+        out = (f"{name}: scanned {self.scanned} ({rate:.0f} docs/s), changed {self.changed}, "
+               f"written {self.written} in {self.elapsed:.1f}s [{fields}]")
+        if self.server_matched or self.server_modified:
+            out += f"; server-side matched {self.server_matched}, modified {self.server_modified}"
+        return out
+
+
+# ---------- aggregation expression helpers ----------
+def expr_str(src: Any) -> dict:
+    return {"$toString": {"$ifNull": [src, ""]}}
+
+def expr_lower_trim(src: Any) -> dict:
+    return {"$toLower": {"$trim": {"input": expr_str(src)}}}
+
+def expr_list_lower_trim(src: Any, delimiters: Sequence[str] = (",", ";")) -> dict:
+    """string "a, B;c" hoặc list -> list lowercase đã trim, bỏ phần tử rỗng (giống normalize_skills)."""
+    s = expr_str("$$src")
+    for d in delimiters[1:]:
+        s = {"$replaceAll": {"input": s, "find": d, "replacement": delimiters[0]}}
+    as_list = {"$cond": [
+        {"$eq": [{"$type": "$$src"}, "string"]},
+        {"$split": [s, delimiters[0]]},
+        {"$cond": [{"$isArray": "$$src"}, "$$src", []]},
+    ]}
+    cleaned = {"$map": {"input": as_list, "as": "x", "in": expr_lower_trim("$$x")}}
+    return {"$let": {"vars": {"src": src}, "in": {"$filter": {"input": cleaned, "as": "x", "cond": {"$ne": ["$$x", ""]}}}}}
+
+
+class BulkNormalizer:
+    def __init__(
+        self,
+        coll,
+        rules: List[Rule],
+        query: Optional[dict] = None,
+        batch_size: int = 1000,
+        dry_run: bool = False,
+        server_side: bool = False,
+        show_diffs: int = 10,
+        log_every: int = 10000,
+        touch: Optional[str] = "updated_at",
+    ):
+        self.coll = coll
+        self.rules = rules
+        self.query = query or {}
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.server_side = server_side
+        self.show_diffs = show_diffs
+        self.log_every = log_every
+        self.touch = touch      # field thời điểm ghi (snapshot polling theo updated_at); None = không đặt
+
+    # ---------- server-side ----------
+    def _run_server(self, rules: List[Rule], stats: NormalizeStats) -> None:
+        """1 update_many dạng pipeline; chỉ match document có ít nhất 1 field khác giá trị chuẩn hóa."""
+        differs = {"$or": [{"$ne": [{"$ifNull": ["$" + r.field, None]}, r.server]} for r in rules]}
+        query = {"$and": [self.query, {"$expr": differs}]} if self.query else {"$expr": differs}
+        if self.dry_run:
+            stats.server_matched = self.coll.count_documents(query)
+            sample = self.coll.aggregate([
+                {"$match": query},
+                {"$limit": self.show_diffs},
+                {"$project": {**{r.field: 1 for r in rules}, **{"new_" + r.field: r.server for r in rules}}},
+            ])
+            for doc in sample:
+                diff = {r.field: (doc.get(r.field), doc.get("new_" + r.field)) for r in rules
+                        if doc.get(r.field) != doc.get("new_" + r.field)}
+                print(f"  [dry-run/server] {doc['_id']}: {diff}")
+            return
+        stage = {r.field: r.server for r in rules}
+        if self.touch:
+            stage[self.touch] = "$$NOW"
+        res = self.coll.update_many(query, [{"$set": stage}])
+        stats.server_matched += res.matched_count
+        stats.server_modified += res.modified_count
+
+    # ---------- client-side ----------
+    def _diff(self, doc: dict, rules: List[Rule], stats: NormalizeStats) -> Dict[str, Any]:
+        # rule sau thấy giá trị mới của rule trước (vd. field dẫn xuất từ skills_norm đã chuẩn hóa)
+        changes, work = {}, dict(doc)
+        for r in rules:
+            new = work[r.field] = r.fn(work)
+            if doc.get(r.field, _MISSING) != new:
+                changes[r.field] = new
+                stats.field_changes[r.field] = stats.field_changes.get(r.field, 0) + 1
+        return changes
+
+    def _flush(self, ops: List[UpdateOne], stats: NormalizeStats) -> None:
+        if ops and not self.dry_run:
+            self.coll.bulk_write(ops, ordered=False)
+            stats.written += len(ops)
+        ops.clear()
+
+    def run(self) -> NormalizeStats:
+        stats = NormalizeStats()
+        t0 = time.perf_counter()
+        server_rules = [r for r in self.rules if self.server_side and r.server is not None]
+        client_rules = [r for r in self.rules if r not in server_rules]
+        if server_rules:
+            self._run_server(server_rules, stats)
+
+        if client_rules:
+            projection = {"_id": 1}
+            for r in client_rules:
+                projection[r.field] = 1
+                projection.update({f: 1 for f in r.needs})
+            ops: List[UpdateOne] = []
+            shown = 0
+            for doc in self.coll.find(self.query, projection, batch_size=self.batch_size):
+                stats.scanned += 1
+                changes = self._diff(doc, client_rules, stats)
+                if changes:
+                    stats.changed += 1
+                    if self.dry_run and shown < self.show_diffs:
+                        print(f"  [dry-run] {doc['_id']}: " + ", ".join(f"{k}: {doc.get(k)!r} -> {v!r}" for k, v in changes.items()))
+                        shown += 1
+                    if self.touch:
+                        # thời điểm theo từng document: lô ghi sau luôn mới hơn mốc polling đã thấy từ lô trước
+                        changes[self.touch] = datetime.now(timezone.utc)
+                    ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+                    if len(ops) >= self.batch_size:
+                        self._flush(ops, stats)
+                if self.log_every and stats.scanned % self.log_every == 0:
+                    dt = time.perf_counter() - t0
+                    print(f"  ... {stats.scanned} scanned, {stats.changed} changed ({stats.scanned / dt:.0f} docs/s)")
+            self._flush(ops, stats)
+        stats.elapsed = time.perf_counter() - t0
+        return stats
+
+
+def derived_rules(prepare: Callable[[dict], Dict[str, Any]], fields: Sequence[str], needs: Sequence[str] = ()) -> List[Rule]:
+    """
+    Rule cho các field do `prepare(doc) -> dict` sinh ra (vd. app.normalize.prepare_job).
+    prepare chạy 1 lần mỗi document: các rule cùng nhận dict làm việc của _diff nên kết quả nhớ theo identity.
+    """
+    last: List[Any] = [None, None]      # [dict làm việc, kết quả prepare]
+
+    def value(d: dict, f: str) -> Any:
+        if last[0] is not d:
+            last[0], last[1] = d, prepare(d)
+        return last[1][f]
+
+    return [Rule(f, lambda d, f=f: value(d, f), tuple(needs)) for f in fields]
+
+
+def add_cli_args(parser) -> None:
+    parser.add_argument("--dry-run", action="store_true", help="Show diffs and counts, do not write")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--server-side", action="store_true", help="Push rules with an aggregation expression to an update pipeline")
+    parser.add_argument("--show-diffs", type=int, default=10)
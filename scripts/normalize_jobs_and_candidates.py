@@ -1,6 +1,14 @@
+import os
 import re
+import sys
+import argparse
 from pymongo import MongoClient
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.normalize_engine import BulkNormalizer, Rule, add_cli_args, derived_rules, expr_lower_trim, expr_list_lower_trim
+from app.normalize import (prepare_job, prepare_candidate, JOB_NORM_FIELDS, JOB_SOURCE_FIELDS,
+                           CANDIDATE_NORM_FIELDS, CANDIDATE_SOURCE_FIELDS)
+
 def normalize_skills(skills):
     if isinstance(skills, str):
         return [s.strip().lower() for s in re.split(r',|;', skills) if s.strip()]
@@ -30,39 +38,63 @@ def normalize_experience_level(exp):
         return f"{m[0]} years"
     return s
 
+def _first(doc, *keys, default=None):
+    # giống doc.get(k1, doc.get(k2, default))
+    for k in keys:
+        if k in doc:
+            return doc[k]
+    return default
+
+def _lower_trim_or_list(src):
+    # normalize_location: string -> lower/trim, list -> list lower/trim, giữ nguyên kiểu khác
+    return {"$let": {"vars": {"src": src}, "in": {"$switch": {"branches": [
+        {"case": {"$eq": [{"$type": "$$src"}, "string"]}, "then": expr_lower_trim("$$src")},
+        {"case": {"$isArray": "$$src"}, "then": expr_list_lower_trim("$$src")},
+    ], "default": "$$src"}}}}
+
+JOB_RULES = [
+    Rule("skills_norm", lambda d: normalize_skills(_first(d, "skills_norm", "skills", default=[])), ("skills",),
+         server=expr_list_lower_trim({"$ifNull": ["$skills_norm", {"$ifNull": ["$skills", []]}]})),
+    Rule("location_norm", lambda d: normalize_location(_first(d, "location_norm", "location", default="")), ("location",),
+         server=_lower_trim_or_list({"$ifNull": ["$location_norm", {"$ifNull": ["$location", ""]}]})),
+    Rule("experience_level", lambda d: normalize_experience_level(_first(d, "experience_level", "experience", default="")), ("experience",)),
+    Rule("job_type", lambda d: str(d.get("job_type", "")).strip().lower(), server=expr_lower_trim("$job_type")),
+    Rule("industry", lambda d: str(d.get("industry", "")).strip().lower(), server=expr_lower_trim("$industry")),
+    Rule("company_norm", lambda d: str(_first(d, "company_norm", "company", default="")).strip().lower(), ("company",),
+         server=expr_lower_trim({"$ifNull": ["$company_norm", "$company"]})),
+]
+
+CANDIDATE_RULES = [
+    Rule("skills_norm", lambda d: normalize_skills(_first(d, "skills_norm", "skills", default=[])), ("skills",),
+         server=expr_list_lower_trim({"$ifNull": ["$skills_norm", {"$ifNull": ["$skills", []]}]})),
+    Rule("locations", lambda d: normalize_location(d.get("locations", [])),
+         server=_lower_trim_or_list({"$ifNull": ["$locations", []]})),
+    Rule("exp_years", lambda d: float(d.get("exp_years", 0)), server={"$toDouble": {"$ifNull": ["$exp_years", 0]}}),
+    Rule("name", lambda d: str(d.get("name", "")).strip().upper(), server={"$toUpper": {"$trim": {"input": {"$toString": {"$ifNull": ["$name", ""]}}}}}),
+]
+
+# field scoring/hiển thị dẫn xuất (skills_key, location_code, req_years, display, norm_version), chạy sau rule chuẩn hóa
+JOB_RULES += derived_rules(prepare_job, JOB_NORM_FIELDS, JOB_SOURCE_FIELDS)
+CANDIDATE_RULES += derived_rules(prepare_candidate, CANDIDATE_NORM_FIELDS, CANDIDATE_SOURCE_FIELDS)
+
 def normalize_job(doc):
-    doc["skills_norm"] = normalize_skills(doc.get("skills_norm", doc.get("skills", [])))
-    doc["location_norm"] = normalize_location(doc.get("location_norm", doc.get("location", "")))
-    doc["experience_level"] = normalize_experience_level(doc.get("experience_level", doc.get("experience", "")))
-    doc["job_type"] = str(doc.get("job_type", "")).strip().lower()
-    doc["industry"] = str(doc.get("industry", "")).strip().lower()
-    doc["company_norm"] = str(doc.get("company_norm", doc.get("company", ""))).strip().lower()
+    for r in JOB_RULES:
+        doc[r.field] = r.fn(doc)
     return doc
 
 def normalize_candidate(doc):
-    doc["skills_norm"] = normalize_skills(doc.get("skills_norm", doc.get("skills", [])))
-    doc["locations"] = normalize_location(doc.get("locations", []))
-    doc["exp_years"] = float(doc.get("exp_years", 0))
-    name = str(doc.get("name", "")).strip()
-    doc["name"] = name.upper() if name else ""
+    for r in CANDIDATE_RULES:
+        doc[r.field] = r.fn(doc)
     return doc
 
 if __name__ == "__main__":
-    client = MongoClient('mongodb://localhost:27017')
-    db = client['matching_db']
-    jobs = db['jobs']
-    candidates = db['candidates']
-    # Chuẩn hóa jobs
-    count_job = 0
-    for doc in jobs.find():
-        norm = normalize_job(doc)
-        jobs.update_one({'_id': doc['_id']}, {'$set': norm})
-        count_job += 1
-    print(f"Normalized {count_job} jobs.")
-    # Chuẩn hóa candidates
-    count_cand = 0
-    for doc in candidates.find():
-        norm = normalize_candidate(doc)
-        candidates.update_one({'_id': doc['_id']}, {'$set': norm})
-        count_cand += 1
-    print(f"Normalized {count_cand} candidates.")
+    parser = argparse.ArgumentParser(description="Normalize jobs and candidates in bulk")
+    add_cli_args(parser)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("MONGO_DB", "matching_db")]
+    for name, rules in (("jobs", JOB_RULES), ("candidates", CANDIDATE_RULES)):
+        stats = BulkNormalizer(db[name], rules, batch_size=args.batch_size, dry_run=args.dry_run,
+                               server_side=args.server_side, show_diffs=args.show_diffs).run()
+        print(stats.summary(f"Normalized {name}"))
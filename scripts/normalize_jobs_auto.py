@@ -1,11 +1,13 @@
+import os
 import re
+import sys
+import argparse
 from pymongo import MongoClient
 from datetime import datetime
 
-# MongoDB connection
-client = MongoClient('mongodb://localhost:27017')
-db = client['matching_db']
-jobs = db['jobs']
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.normalize_engine import BulkNormalizer, Rule, add_cli_args, derived_rules, expr_str
+from app.normalize import prepare_job, JOB_NORM_FIELDS, JOB_SOURCE_FIELDS
 
 # Helper functions
 
@@ -38,29 +40,46 @@ def normalize_date(date_str):
             continue
     return date_str
 
+def _lower(field):
+    return {"$toLower": expr_str("$" + field)}
+
+def _strip_chars(expr, *chars):
+    for c in chars:
+        expr = {"$replaceAll": {"input": expr, "find": c, "replacement": ""}}
+    return expr
+
+JOB_RULES = [
+    Rule('title', lambda d: d.get('title', '')),
+    Rule('description', lambda d: d.get('description', '')),
+    Rule('skills_norm', lambda d: normalize_skills(d.get('skills', '')), ('skills',)),
+    Rule('salary_min_vnd', lambda d: normalize_salary(d.get('salary', ''))[0], ('salary',)),
+    Rule('salary_max_vnd', lambda d: normalize_salary(d.get('salary', ''))[1], ('salary',)),
+    Rule('salary_currency', lambda d: normalize_salary(d.get('salary', ''))[2], ('salary',)),
+    Rule('experience_level', lambda d: str(d.get('experience', '')).lower().replace('-level', '').replace(' ', ''), ('experience',),
+         server=_strip_chars(_lower('experience'), '-level', ' ')),
+    Rule('industry', lambda d: d.get('industry', '')),
+    Rule('date_posted', lambda d: normalize_date(d.get('date_posted', ''))),
+    Rule('location_norm', lambda d: str(d.get('location', '')).lower(), ('location',), server=_lower('location')),
+    Rule('company_norm', lambda d: str(d.get('company', '')).lower(), ('company',), server=_lower('company')),
+    Rule('job_type', lambda d: str(d.get('job_type', '')).lower().replace('-', '').replace(' ', ''),
+         server=_strip_chars(_lower('job_type'), '-', ' ')),
+    Rule('external_link', lambda d: d.get('externalApplyLink', d.get('external_link', '')), ('externalApplyLink',)),
+    Rule('job_url', lambda d: d.get('url', d.get('job_url', '')), ('url',)),
+] + derived_rules(prepare_job, JOB_NORM_FIELDS, JOB_SOURCE_FIELDS)
+
 def normalize_job(doc):
-    min_vnd, max_vnd, currency = normalize_salary(doc.get('salary', ''))
-    return {
-        'title': doc.get('title', ''),
-        'description': doc.get('description', ''),
-        'skills_norm': normalize_skills(doc.get('skills', '')), 
-        'salary_min_vnd': min_vnd,
-        'salary_max_vnd': max_vnd,
-        'salary_currency': currency,
-        'experience_level': str(doc.get('experience', '')).lower().replace('-level', '').replace(' ', ''),
-        'industry': doc.get('industry', ''),
-        'date_posted': normalize_date(doc.get('date_posted', '')),
-        'location_norm': str(doc.get('location', '')).lower(),
-        'company_norm': str(doc.get('company', '')).lower(),
-        'job_type': str(doc.get('job_type', '')).lower().replace('-', '').replace(' ', ''),
-        'external_link': doc.get('externalApplyLink', doc.get('external_link', '')),
-        'job_url': doc.get('url', doc.get('job_url', '')),
-    }
+    work, norm = dict(doc), {}
+    for r in JOB_RULES:
+        norm[r.field] = work[r.field] = r.fn(work)
+    return norm
 
 if __name__ == "__main__":
-    count = 0
-    for doc in jobs.find():
-        norm = normalize_job(doc)
-        jobs.update_one({'_id': doc['_id']}, {'$set': norm})
-        count += 1
-    print(f"Normalized {count} jobs.")
+    parser = argparse.ArgumentParser(description="Normalize raw job documents in bulk")
+    add_cli_args(parser)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    jobs = client[os.getenv("MONGO_DB", "matching_db")]['jobs']
+    stats = BulkNormalizer(jobs, JOB_RULES, batch_size=args.batch_size, dry_run=args.dry_run,
+                           server_side=args.server_side, show_diffs=args.show_diffs).run()
+    print(stats.summary("Normalized jobs"))
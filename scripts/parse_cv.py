@@ -1,60 +1,15 @@
 from __future__ import annotations
-import re, uuid
+import os, re, sys, uuid
 from typing import Dict, List
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ontology import ONTOLOGY, Ontology
+
 class CVParser:
-    def __init__(self):
-        self.buzzwords = [
-            'blockchain', 'ai', 'artificial intelligence', 'cloud', 'big data', 'iot', 'robotics', 'devops', 'microservices', 'agile', 'scrum', 'digital transformation', 'data mining', 'data engineering', 'data visualization', 'nlp', 'deep learning', 'machine learning', 'crypto', 'web3', 'metaverse', '5g', 'virtual reality', 'augmented reality', 'quantum computing', 'saas', 'paas', 'iaas', 'no code', 'low code', 'growth hacking', 'design thinking', 'lean', 'kanban', 'product management', 'stakeholder management', 'change management', 'business intelligence', 'erp', 'crm', 'rpa', 'automation', 'cybersecurity', 'penetration testing', 'ethical hacking', 'block chain', 'block-chain'
-        ]
-        self.soft_skill_patterns = [
-            r'communication', r'teamwork', r'leadership', r'problem[- ]?solving', r'critical thinking', r'adaptability', r'creativity', r'time management', r'conflict resolution', r'collaboration', r'initiative', r'work ethic', r'flexibility', r'organization', r'presentation', r'negotiation', r'customer service', r'project management', r'coaching', r'mentoring', r'planning', r'analytical', r'fast learner', r'open-minded', r'positive attitude', r'decision making', r'self-motivation', r'active listening', r'empathy', r'interpersonal', r'public speaking', r'goal setting', r'self discipline', r'persuasion', r'networking', r'accountability', r'initiative', r'patience', r'resilience', r'growth mindset'
-        ]
-        self.skill_synonyms = {
-            'javascript': ['js','javascript','node.js','nodejs','react.js','reactjs'],
-            'python': ['python','python3','py','django','flask','fastapi'],
-            'java': ['java','spring','spring boot','springboot'],
-            'php': ['php','laravel','symfony','codeigniter'],
-            'c#': ['c#','csharp','c sharp','.net','dotnet','asp.net'],
-            'c++': ['c++','cpp','c plus plus'],
-            'typescript': ['typescript','ts'],
-            'go': ['golang','go'],
-            'react': ['react','reactjs','react.js'],
-            'vue': ['vue','vuejs','vue.js'],
-            'angular': ['angular','angularjs'],
-            'html': ['html','html5'],
-            'css': ['css','css3','scss','sass','less'],
-            'nodejs': ['node.js','nodejs','node'],
-            'express': ['express','expressjs'],
-            'django': ['django'],
-            'flask': ['flask'],
-            'fastapi': ['fastapi'],
-            'spring': ['spring','spring boot'],
-            'mysql': ['mysql'],
-            'postgresql': ['postgresql','postgres','psql'],
-            'mongodb': ['mongodb','mongo'],
-            'redis': ['redis'],
-            'elasticsearch': ['elasticsearch','elastic'],
-            'sqlite': ['sqlite'],
-            'aws': ['aws','amazon web services'],
-            'azure': ['azure','microsoft azure'],
-            'gcp': ['gcp','google cloud','google cloud platform'],
-            'docker': ['docker'],
-            'kubernetes': ['kubernetes','k8s'],
-            'jenkins': ['jenkins'],
-            'git': ['git','github','gitlab'],
-            'machine learning': ['ml','machine learning','artificial intelligence','ai'],
-            'data science': ['data science','data analysis','data analytics'],
-            'ui/ux': ['ui','ux','ui/ux','user interface','user experience'],
-            'project management': ['project management','pm','scrum','agile'],
-        }
-        self.location_synonyms = {
-            'hanoi': ['hanoi','ha noi','hn','hà nội'],
-            'ho chi minh city': ['ho chi minh city','hcmc','hcm','tp hcm','saigon','sài gòn'],
-            'da nang': ['da nang','danang','đà nẵng'],
-            'vietnam': ['vietnam','viet nam','việt nam','vn'],
-        }
+    def __init__(self, ontology: Ontology = ONTOLOGY):
+        # skill / soft skill / buzzword / location lấy từ ontology dùng chung (data/ontology.json)
+        self.ontology = ontology
 
     def extract_contact_info(self, text: str) -> Dict[str, List[str]]:
         email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'
@@ -116,27 +71,18 @@ class CVParser:
         return "Unknown"
 
     def extract_skills(self, text: str) -> List[str]:
-        t = text.lower()
-        tech_found = set()
-        buzz_found = set()
-        soft_found = set()
+        skills = self.ontology.skills
+        found = {"technical": set(), "soft": set(), "buzzword": set()}
         all_found = set()
 
-        # Technical skills from synonyms
-        for norm, syns in self.skill_synonyms.items():
-            for s in syns:
-                if re.search(r'\b' + re.escape(s) + r'\b', t):
-                    tech_found.add(norm); break
-
-        # Buzzwords
-        for buzz in self.buzzwords:
-            if re.search(r'\b' + re.escape(buzz) + r'\b', t):
-                buzz_found.add(buzz)
+        def add(ids):
+            for i in skills.expand(ids):
+                g = skills.group(i)
+                if g in found:
+                    found[g].add(skills.name(i))
 
-        # Soft skills
-        for pat in self.soft_skill_patterns:
-            if re.search(r'\b' + pat + r'\b', t):
-                soft_found.add(pat.replace('-', ' ').title())
+        # Quét toàn văn bản bằng trie của ontology (match dài nhất, kèm skill suy ra: django -> python)
+        add(skills.scan(text))
 
         # Extract all skills from SKILLS blocks
         blocks = re.findall(
@@ -148,45 +94,20 @@ class CVParser:
                 itl = it.strip().lower()
                 all_found.add(itl)
                 # Classify
-                for norm, syns in self.skill_synonyms.items():
-                    if itl in [x.lower() for x in syns]:
-                        tech_found.add(norm)
-                for buzz in self.buzzwords:
-                    if buzz == itl:
-                        buzz_found.add(buzz)
-                for pat in self.soft_skill_patterns:
-                    if pat.replace('-', ' ') == itl:
-                        soft_found.add(pat.replace('-', ' ').title())
+                i = skills.lookup(itl)
+                if i is not None:
+                    add([i])
 
-        # Remove duplicates
-        tech_skills = sorted(tech_found)
-        buzz_skills = sorted(buzz_found)
-        soft_skills = sorted(soft_found)
-        all_skills = sorted(all_found)
         return {
-            'technical_skills': tech_skills,
-            'soft_skills': soft_skills,
-            'buzzwords': buzz_skills,
-            'all_skills': all_skills
+            'technical_skills': sorted(found["technical"]),
+            'soft_skills': sorted(s.replace('-', ' ').title() for s in found["soft"]),
+            'buzzwords': sorted(found["buzzword"]),
+            'all_skills': sorted(all_found)
         }
 
     def extract_locations(self, text: str) -> List[str]:
-        t = text.lower()
-        found = set()
-        for norm, syns in self.location_synonyms.items():
-            for s in syns:
-                if s in t:
-                    found.add(norm); break
-        # các pattern chung
-        patterns = [r'(?:address|location|city)[\s:]*([^\n]+)',
-                    r'(?:địa chỉ|thành phố)[\s:]*([^\n]+)']
-        for p in patterns:
-            for m in re.findall(p, text, flags=re.IGNORECASE):
-                ml = m.lower().strip()
-                for norm, syns in self.location_synonyms.items():
-                    if any(s in ml for s in syns):
-                        found.add(norm)
-        return sorted(found)
+        locations = self.ontology.locations
+        return sorted(locations.name(i) for i in locations.scan(text))
 
     def extract_experience(self, text: str):
         years = []
@@ -0,0 +1,57 @@
+"""
+Chạy cluster ranking cục bộ: N process uvicorn trên các port liên tiếp, mỗi process giữ 1 phân vùng snapshot.
+- Mọi node nhận cùng CLUSTER_PEERS, CLUSTER_SHARD = vị trí của node; gọi node nào cũng được (node đó làm coordinator)
+- Ctrl-C dừng toàn bộ; 1 node thoát -> các node còn lại vẫn trả kết quả thiếu phân vùng đó (header X-Cluster-Missing)
+- Run: python scripts/run_cluster.py --nodes 3 [--base-port 8001] [--timeout 2.0]
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Launch a local multi-node ranking cluster")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8001)
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-peer timeout in seconds (CLUSTER_TIMEOUT_SECONDS)")
+    args = parser.parse_args()
+    if args.nodes < 2:
+        parser.error("--nodes must be >= 2")
+
+    ports = [args.base_port + i for i in range(args.nodes)]
+    peers = ",".join(f"http://{args.host}:{p}" for p in ports)
+    procs = []
+    for shard, port in enumerate(ports):
+        env = dict(os.environ, CLUSTER_PEERS=peers, CLUSTER_SHARD=str(shard), CLUSTER_TIMEOUT_SECONDS=str(args.timeout))
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", args.host, "--port", str(port)]
+        procs.append(subprocess.Popen(cmd, cwd=ROOT, env=env))
+        print(f"shard {shard}: http://{args.host}:{port} (pid {procs[-1].pid})")
+    print(f"CLUSTER_PEERS={peers}")
+
+    exited = set()
+    try:
+        while any(p.poll() is None for p in procs):
+            for shard, p in enumerate(procs):
+                if p.returncode is not None and shard not in exited:
+                    exited.add(shard)
+                    print(f"shard {shard} exited with code {p.returncode}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.send_signal(signal.SIGINT)
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+if __name__ == "__main__":
+    main()
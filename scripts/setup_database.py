@@ -5,8 +5,16 @@ import numpy as np
 from pymongo import MongoClient
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+import sys
 import argparse
-from datetime import datetime
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embedding_codec import pack_embedding
+from app.normalize import prepare_job, prepare_candidate
+from app.services.trends import TrendsService
+from app.indexes import ensure_indexes
+from app.services.dedup import CANDIDATE_DEDUP, JOB_DEDUP, dedup_collection, fingerprint
 
 def load_env_config():
     """Load environment configuration"""
@@ -19,29 +27,10 @@ def load_env_config():
     }
 
 def setup_mongodb_collections(db):
-    """Setup MongoDB collections with proper indexes"""
-    
-    # Jobs collection
-    jobs_collection = db['jobs']
-    
-    # Create indexes for jobs
-    jobs_collection.create_index('job_id', unique=True)
-    jobs_collection.create_index('title')
-    jobs_collection.create_index('skills_norm')
-    jobs_collection.create_index('location_norm')
-    jobs_collection.create_index('company_norm')
-    jobs_collection.create_index('date_posted')
-    
-    # Candidates collection
-    candidates_collection = db['candidates']
-    
-    # Create indexes for candidates
-    candidates_collection.create_index('cand_id', unique=True)
-    candidates_collection.create_index('name')
-    candidates_collection.create_index('emails')
-    candidates_collection.create_index('skills_norm')
-    candidates_collection.create_index('locations')
-    candidates_collection.create_index('exp_years')
+    """Setup MongoDB collections with proper indexes (khai báo trong app/indexes.py, API cũng tạo lúc startup)"""
+    for coll_name, rep in ensure_indexes(db).items():
+        print(f"{coll_name}: {len(rep['created'])} indexes created, {len(rep['existing'])} existing, "
+              f"{len(rep['failed'])} failed {rep['failed'] or ''}")
     
     print("MongoDB collections and indexes created successfully")
 
@@ -113,16 +102,20 @@ def import_jobs_data(jobs_csv_path, db, es, sbert_model, config):
                 'source_domain': str(row.get('source_domain', '')).strip(),
                 'external_valid': bool(row.get('external_valid', False)) if pd.notna(row.get('external_valid')) else False,
                 'job_hash': str(row.get('job_hash', '')).strip(),
-                'imported_at': datetime.now().isoformat()
+                'imported_at': datetime.now().isoformat(),
+                'updated_at': datetime.now(timezone.utc)
             }
             
+            job_doc.update(prepare_job(job_doc))
+            job_doc.update(fingerprint(JOB_DEDUP.text(job_doc)))
+
             # Create text for embedding
             job_text = f"{job_doc['title']} {job_doc['description']} {' '.join(skills_norm)}"
             job_doc['job_text_orig'] = job_text
             
             # Generate embedding
-            embedding = sbert_model.encode([job_text], normalize_embeddings=True)[0].tolist()
-            job_doc['embedding'] = embedding
+            embedding = sbert_model.encode([job_text], normalize_embeddings=True)[0]
+            job_doc['embedding'] = pack_embedding(embedding)
             
             # Insert/update in MongoDB
             jobs_collection.update_one(
@@ -163,6 +156,14 @@ def import_jobs_data(jobs_csv_path, db, es, sbert_model, config):
     
     print(f"Successfully imported {imported_count} jobs")
 
+    # Gom job đăng lại thành cụm, chỉ giữ bản mới nhất cho ranking / trends
+    stats = dedup_collection(db, JOB_DEDUP)
+    print(f"Dedup jobs: {stats['duplicates']} duplicates in {stats['clusters']} clusters")
+
+    # Tính lại trends sau khi import
+    for doc in TrendsService(db).refresh():
+        print(f"Trends {doc['window']}: {doc['job_count']} jobs ({doc['took_ms']} ms)")
+
 def import_candidates_data(candidates_csv_path, db, es, sbert_model, config):
     """Import candidates data from CSV to MongoDB and Elasticsearch"""
     
@@ -203,16 +204,20 @@ def import_candidates_data(candidates_csv_path, db, es, sbert_model, config):
                 'education_entries': education_entries,
                 'certs': certs,
                 'resume_text': str(row.get('resume_text', '')).strip(),
-                'imported_at': datetime.now().isoformat()
+                'imported_at': datetime.now().isoformat(),
+                'updated_at': datetime.now(timezone.utc)
             }
             
+            candidate_doc.update(prepare_candidate(candidate_doc))
+            candidate_doc.update(fingerprint(CANDIDATE_DEDUP.text(candidate_doc)))
+
             # Create text for embedding
             candidate_text = f"{candidate_doc['resume_text']} {' '.join(skills_norm)}"
             candidate_doc['cand_text_orig'] = candidate_text
             
             # Generate embedding
-            embedding = sbert_model.encode([candidate_text], normalize_embeddings=True)[0].tolist()
-            candidate_doc['embedding'] = embedding
+            embedding = sbert_model.encode([candidate_text], normalize_embeddings=True)[0]
+            candidate_doc['embedding'] = pack_embedding(embedding)
             
             # Insert/update in MongoDB
             candidates_collection.update_one(
@@ -248,6 +253,9 @@ def import_candidates_data(candidates_csv_path, db, es, sbert_model, config):
     
     print(f"Successfully imported {imported_count} candidates")
 
+    stats = dedup_collection(db, CANDIDATE_DEDUP)
+    print(f"Dedup candidates: {stats['duplicates']} duplicates in {stats['clusters']} clusters")
+
 def main():
     parser = argparse.ArgumentParser(description='Setup MongoDB and import data')
     parser.add_argument('--jobs_csv', required=True, help='Path to jobs_clean.csv')
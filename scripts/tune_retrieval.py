@@ -0,0 +1,122 @@
+"""
+Dò tham số retrieval cho deployment hiện tại: lưới nlist x nprobe x depth x shortlist, mỗi điểm so với chấm exact
+(recall@k = overlap top-k) và đo latency p95 -> ghi Pareto frontier + file cấu hình đề xuất cho API (RETRIEVAL_CONFIG).
+- Query: mẫu ngẫu nhiên (seed cố định) key trong snapshot phía query, không cần nhãn
+- Cấu hình nền: --base (file / JSON inline) hoặc biến RETRIEVAL_* như lúc API chạy
+- Run: python scripts/tune_retrieval.py [--task candidates|jobs] [--queries 200] [--k 10] [--target-recall 0.95]
+       [--nprobe 2 4 8 16] [--nlist 0] [--depth 50 100 200] [--shortlist 250 500 1000]
+       [--out-dir tuning/] [--config-out retrieval.json]
+"""
+import os
+import sys
+import csv
+import json
+import random
+import argparse
+from datetime import datetime, timezone
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.evaluation.runner import RANKERS, build_service, configure_retrieval, latency_summary, run_queries
+from app.evaluation.tuning import grid, pareto_frontier, recommend, recommended_config, sweep
+from app.services.retrieval import RetrievalConfig
+
+def load_base(arg):
+    if not arg:
+        return RetrievalConfig.from_env()
+    if arg.lstrip().startswith("{"):
+        data = json.loads(arg)
+        return RetrievalConfig.from_dict(data.get("retrieval", data))
+    return RetrievalConfig.from_file(arg)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep retrieval parameters against exact scoring (recall@k vs p95)")
+    parser.add_argument("--task", default="candidates", choices=list(RANKERS),
+                        help="candidates: queries are job_ids; jobs: queries are cand_ids")
+    parser.add_argument("--queries", type=int, default=200, help="Random sample of query keys from the snapshot")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=10, help="Recall is measured on the top-k against exact scoring")
+    parser.add_argument("--top-k", type=int, default=0, help="Results requested per query (default: --k)")
+    parser.add_argument("--nlist", type=int, nargs="+", default=[0], help="IVF lists (0 = sqrt(rows)); one index build each")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--depth", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--shortlist", type=int, nargs="+", default=[250, 500, 1000])
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--base", help="Base retrieval config (JSON file or inline JSON); default: RETRIEVAL_* env")
+    parser.add_argument("--no-model", action="store_true", help="Skip SBERT (documents without stored embeddings get semantic = 0)")
+    parser.add_argument("--out-dir", default="tuning", help="Writes sweep.json and frontier.csv here")
+    parser.add_argument("--config-out", default="retrieval.json", help="Recommended config (load with RETRIEVAL_CONFIG)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("MONGO_DB", "matching_db")]
+    model, model_id = None, os.getenv("SBERT_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    if not args.no_model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_id)
+    svc = build_service(db, model, model_id, snapshots=True)
+    query_mgr, item_mgr = ((svc.job_snapshot, svc.cand_snapshot) if args.task == "candidates"
+                           else (svc.cand_snapshot, svc.job_snapshot))
+    keys = list(query_mgr.current.keys)
+    queries = random.Random(args.seed).sample(keys, min(args.queries, len(keys)))
+    if not queries:
+        parser.error("query snapshot is empty")
+    rows = len(item_mgr.current)
+    base = load_base(args.base)
+    ranker = RANKERS[args.task](svc, args.top_k or args.k)
+
+    nlists, nprobes = args.nlist, args.nprobe
+    if rows < base.ann_min_rows:
+        # kênh semantic quét exact dưới ann_min_rows: nlist / nprobe không đổi kết quả
+        print(f"{rows} rows < ann_min_rows={base.ann_min_rows}: semantic channel is exact, nlist/nprobe not swept")
+        nlists, nprobes = nlists[:1], nprobes[:1]
+    params = grid(nprobe=nprobes, depth=args.depth, shortlist=args.shortlist)
+    print(f"task={args.task}, {len(queries)} queries, {rows} rows, {len(nlists) * len(params)} configs")
+
+    configure_retrieval(svc, None)
+    exact = run_queries(ranker, queries, args.warmup)
+    exact_lat = latency_summary(exact.latency_ms)
+    print(f"exact: p50 {exact_lat['p50_ms']:.1f} ms, p95 {exact_lat['p95_ms']:.1f} ms")
+
+    def progress(t):
+        print(f"  {json.dumps({k: v for k, v in t.params.items() if k != 'index_build_s'})}: "
+              f"recall@{args.k} {t.recall:.4f}, p95 {t.p95_ms:.1f} ms")
+
+    trials = sweep(svc, ranker, queries, exact, base, nlists, params, args.k, args.warmup, progress)
+    front = pareto_frontier(trials)
+    best = recommend(front, args.target_recall, exact_lat["p95_ms"])
+    config = recommended_config(base, best)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(os.path.join(args.out_dir, "frontier.csv"), "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(front[0].to_dict(args.k)) if front else ["nlist"])
+        w.writeheader()
+        w.writerows(t.to_dict(args.k) for t in front)
+    with open(os.path.join(args.out_dir, "sweep.json"), "w", encoding="utf-8") as f:
+        json.dump({"task": args.task, "queries": len(queries), "rows": rows, "k": args.k,
+                   "exact": exact_lat, "base": base.to_dict(),
+                   "trials": [t.to_dict(args.k) for t in trials],
+                   "frontier": [t.to_dict(args.k) for t in front]}, f, indent=2)
+    with open(args.config_out, "w", encoding="utf-8") as f:
+        json.dump({"retrieval": config.to_dict(),
+                   "tuned": {"task": args.task, "rows": rows, "queries": len(queries),
+                             f"recall@{args.k}": best.recall if best else 1.0,
+                             "p95_ms": best.p95_ms if best else exact_lat["p95_ms"],
+                             "exact_p95_ms": exact_lat["p95_ms"], "target_recall": args.target_recall,
+                             "tuned_at": datetime.now(timezone.utc).isoformat()}}, f, indent=2)
+
+    print(f"frontier ({len(front)} of {len(trials)} configs) -> {os.path.join(args.out_dir, 'frontier.csv')}")
+    if best is None:
+        print(f"no config reaches recall@{args.k} >= {args.target_recall} faster than exact: retrieval disabled")
+    else:
+        print(f"recommended: {json.dumps({k: v for k, v in best.params.items() if k != 'index_build_s'})} "
+              f"(recall@{args.k} {best.recall:.4f}, p95 {best.p95_ms:.1f} ms vs exact {exact_lat['p95_ms']:.1f} ms)")
+    print(f"config -> {args.config_out} (start the API with RETRIEVAL_CONFIG={args.config_out})")
+    client.close()
+
+if __name__ == "__main__":
+    main()
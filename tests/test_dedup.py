@@ -0,0 +1,46 @@
+"""Batch dedup: cosine chỉ so trong cụm k-means vẫn tìm đủ cặp gần trùng; collection được stream."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.dedup import CANDIDATE_DEDUP, dedup_collection, embedding_pairs
+from app.services.embedding_codec import pack_embedding
+
+
+def _unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def test_embedding_pairs_match_brute_force():
+    rng = np.random.default_rng(3)
+    base = _unit(rng.standard_normal((400, 32)))
+    near = _unit(base[:60] + 0.03 * rng.standard_normal((60, 32)))
+    emb = np.vstack((base, near))
+    has_emb = np.ones(len(emb), dtype=bool)
+    has_emb[5] = False
+    sims = emb @ emb.T
+    expected = {(i, j) for i, j in zip(*np.nonzero(sims >= 0.97)) if i < j and has_emb[i] and has_emb[j]}
+    assert len(expected) >= 55
+    assert set(embedding_pairs(emb, has_emb, 0.97)) == expected
+
+
+def test_dedup_collection_streams_and_marks_duplicates():
+    mongomock = pytest.importorskip("mongomock")
+    rng = np.random.default_rng(5)
+    db = mongomock.MongoClient().db
+    vecs = _unit(rng.standard_normal((50, 16)))
+    docs = [{"cand_id": f"c{i}", "resume_text": f"resume number {i} " + " ".join(f"w{i}x{k}" for k in range(20)),
+             "resume_embedding": pack_embedding(vecs[i]), "dup_of": None} for i in range(50)]
+    # c50: cùng text với c1; c51: câu chữ khác nhưng vector gần c2
+    docs.append({**docs[1], "cand_id": "c50"})
+    docs.append({"cand_id": "c51", "resume_text": "entirely different wording here",
+                 "resume_embedding": pack_embedding(_unit(vecs[2] + 0.01 * rng.standard_normal(16))), "dup_of": None})
+    for i, d in enumerate(docs):
+        d["updated_at"] = datetime(2026, 1, 1) + timedelta(minutes=i)
+    db.candidates.insert_many([dict(d) for d in docs])
+
+    stats = dedup_collection(db, CANDIDATE_DEDUP, batch_size=7)
+    assert stats["fingerprinted"] == 52 and stats["duplicates"] == 2
+    dup_of = {d["cand_id"]: d["dup_of"] for d in db.candidates.find({}, {"cand_id": 1, "dup_of": 1})}
+    assert {k: v for k, v in dup_of.items() if v} == {"c1": "c50", "c2": "c51"}
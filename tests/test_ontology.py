@@ -0,0 +1,44 @@
+"""
+Term ngoài từ điển: id chỉ phụ thuộc chuỗi, tên không mất khi LRU đẩy ra
+(skills_key dựng từ chuỗi chuẩn; generation còn sống pin tên các id nó tham chiếu).
+"""
+import gc
+
+import numpy as np
+
+from app.normalize import skills_key
+from app.ontology import ONTOLOGY, TermDictionary, unknown_id
+from app.services.snapshot import CANDIDATE_SPEC, build_generation
+
+
+def _vocab(cache=3):
+    return TermDictionary({"python": {"aliases": ["py"]}}, unknown_cache=cache)
+
+
+def test_ids_do_not_depend_on_call_order_or_eviction():
+    a, b = _vocab(), _vocab()
+    terms = [f"zzz{i}" for i in range(10)]
+    ids_a = [a.id(t) for t in terms]
+    ids_b = [b.id(t) for t in reversed(terms)][::-1]
+    assert ids_a == ids_b
+    assert len(set(ids_a)) == len(terms) and all(i < 0 for i in ids_a)
+    assert a.id("zzz0") == ids_a[0]          # đã bị đẩy khỏi LRU, id vẫn như cũ
+
+
+def test_skills_key_survives_eviction(monkeypatch):
+    monkeypatch.setattr(ONTOLOGY, "skills", _vocab())
+    assert skills_key(["Python", "zzz1", "zzz2", "zzz3", "zzz4"]) == ["python", "zzz1", "zzz2", "zzz3", "zzz4"]
+
+
+def test_generation_pins_unknown_names():
+    vocab = _vocab(cache=2)
+    docs = [{"_id": i, "cand_id": f"c{i}", "skills_norm": ["python", f"zzz{i}"]} for i in range(5)]
+    gen = build_generation(CANDIDATE_SPEC, docs, np.zeros((5, 0), np.float32), np.zeros(5, bool), skill_vocab=vocab)
+    for i in range(20):
+        vocab.id(f"other{i}")
+    assert [vocab.name(s) for s in gen.skills(4)] == ["zzz4", "python"]
+    assert sorted(vocab.name(s) for s in gen.skill_ids) == ["python"] * 5 + [f"zzz{i}" for i in range(5)]
+    zzz0 = unknown_id("zzz0")
+    del gen
+    gc.collect()
+    assert vocab.name(zzz0) == str(zzz0)
@@ -0,0 +1,133 @@
+"""
+Đối chiếu các đường chấm điểm trên cùng dữ liệu mongomock:
+- batch (score_matrix 1 lượt cho nhiều query) == từng query riêng lẻ
+- snapshot trong RAM == fallback đọc Mongo (không snapshot)
+"""
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.inference import RankerService
+from app.services.embedding_codec import pack_embedding
+from app.services.retrieval import HybridRetriever, RetrievalConfig
+from app.services.snapshot import CANDIDATE_SPEC, JOB_SPEC, SnapshotManager
+
+SKILLS = ["python", "java", "react", "sql", "docker", "aws", "go"]
+LOCATIONS = ["Ho Chi Minh City", "Hanoi", "Da Nang"]
+
+
+def _unit(rng, dim=16):
+    v = rng.standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+@pytest.fixture(scope="module")
+def db():
+    rng = np.random.default_rng(7)
+    db = mongomock.MongoClient().db
+    db.jobs.insert_many([{
+        "job_id": j,
+        "title": f"Job {j}",
+        "description": f"developer {j}",
+        "skills_norm": list(rng.choice(SKILLS, 3, replace=False)),
+        "location_norm": LOCATIONS[j % 3].lower(),
+        "experience_level": f"{j % 4} years",
+        "date_posted": f"2026-10-{j % 28 + 1:02d}",
+        "embedding": pack_embedding(_unit(rng)),
+    } for j in range(1, 31)])
+    db.candidates.insert_many([{
+        "cand_id": f"c{c}",
+        "skills_norm": [s.title() for s in rng.choice(SKILLS, 3, replace=False)],
+        "locations": [LOCATIONS[c % 3]],
+        "exp_years": float(c % 5),
+        "resume_text": f"resume {c}",
+        "resume_embedding": pack_embedding(_unit(rng)),
+    } for c in range(60)])
+    return db
+
+
+def _service(db, snapshots: bool) -> RankerService:
+    svc = RankerService()
+    svc.db = db
+    if snapshots:
+        svc.cand_snapshot = SnapshotManager(db, CANDIDATE_SPEC)
+        svc.job_snapshot = SnapshotManager(db, JOB_SPEC)
+        svc.cand_snapshot.load()
+        svc.job_snapshot.load()
+        svc.retrieval_config = RetrievalConfig()
+        svc.job_retriever = HybridRetriever(db, JOB_SPEC, svc.retrieval_config)
+    svc.ready = True
+    return svc
+
+
+@pytest.fixture(scope="module")
+def snap(db):
+    return _service(db, snapshots=True)
+
+
+@pytest.fixture(scope="module")
+def mongo(db):
+    return _service(db, snapshots=False)
+
+
+def _ranked(rows, key):
+    return [(r[key], pytest.approx(r["score"], abs=1e-5)) for r in rows]
+
+
+JOB_IDS = [1, 5, 12, 30]
+CAND_IDS = ["c0", "c7", "c33", "c59"]
+
+
+@pytest.mark.parametrize("which", ["snap", "mongo"])
+def test_batch_candidates_match_single_job(which, request):
+    svc = request.getfixturevalue(which)
+    batch = svc.rank_candidates_for_jobs(JOB_IDS + [999], top_k=10)
+    assert batch["missing_job_ids"] == [999]
+    for res in batch["results"]:
+        single = svc.rank_candidates_for_job(res["job_id"], top_k=10)
+        assert _ranked(res["candidates"], "cand_id") == _ranked(single, "cand_id")
+
+
+@pytest.mark.parametrize("which", ["snap", "mongo"])
+def test_batch_jobs_match_single_candidate(which, request):
+    svc = request.getfixturevalue(which)
+    batch = svc.search_jobs_for_candidates(CAND_IDS, top_k=8)
+    assert batch["missing_cand_ids"] == []
+    for res in batch["results"]:
+        single = svc.search_jobs_for_candidate(res["cand_id"], None, top_k=8)
+        assert _ranked(res["jobs"], "job_id") == _ranked(single, "job_id")
+
+
+@pytest.mark.parametrize("job_id", JOB_IDS)
+def test_snapshot_matches_mongo_for_candidates(snap, mongo, job_id):
+    a = snap.rank_candidates_for_job(job_id, top_k=15)
+    b = mongo.rank_candidates_for_job(job_id, top_k=15)
+    assert len(a) == 15
+    assert _ranked(a, "cand_id") == _ranked(b, "cand_id")
+    assert [r["reasons"] for r in a] == [r["reasons"] for r in b]
+
+
+@pytest.mark.parametrize("cand_id", CAND_IDS)
+def test_snapshot_matches_mongo_for_jobs(snap, mongo, cand_id):
+    a = snap.search_jobs_for_candidate(cand_id, None, top_k=10)
+    b = mongo.search_jobs_for_candidate(cand_id, None, top_k=10)
+    assert len(a) == 10
+    assert _ranked(a, "job_id") == _ranked(b, "job_id")
+
+
+@pytest.mark.parametrize("which", ["snap", "mongo"])
+def test_keyword_search_without_candidate_is_ranked(which, request):
+    svc = request.getfixturevalue(which)
+    rows = svc.search_jobs_for_candidate(None, "python", top_k=5)
+    assert len(rows) == 5
+    assert [r["score"] for r in rows] == sorted((r["score"] for r in rows), reverse=True)
+    assert rows[0]["reasons"]
+
+
+def test_assignment_shape_is_stable(snap):
+    full = snap.assign_candidates([1, 2], cand_ids=["c0", "c1", "c2"])
+    none = snap.assign_candidates([999], cand_ids=["c0", "c1", "c2"])
+    assert full["assignments"] and not none["assignments"]
+    assert none.keys() == full.keys() and none["stats"].keys() == full["stats"].keys()
+    assert none["missing_job_ids"] == [999] and none["unassigned_candidates"] == 3
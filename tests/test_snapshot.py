@@ -0,0 +1,44 @@
+"""SnapshotManager: polling với document cũ không có updated_at, thread nền sống sót qua lỗi ngoài Mongo."""
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.services.snapshot import CANDIDATE_SPEC, SnapshotManager
+
+
+def _cand(i, **extra):
+    return {"cand_id": f"c{i}", "skills_norm": ["python"], "locations": ["Hanoi"], "exp_years": 1.0,
+            "resume_embedding": [1.0, 0.0], **extra}
+
+
+def test_catch_up_without_updated_at_watermark():
+    db = mongomock.MongoClient().db
+    db.candidates.insert_many([_cand(i) for i in range(3)])     # dữ liệu cũ, không có updated_at
+    mgr = SnapshotManager(db, CANDIDATE_SPEC)
+    mgr.load()
+    assert mgr.current.max_updated_at is None
+    db.candidates.insert_one(_cand(3, updated_at=datetime.now(timezone.utc) + timedelta(seconds=1)))
+    mgr._catch_up()
+    assert "c3" in mgr.current.row_of_key
+
+
+def test_run_survives_non_mongo_errors():
+    db = mongomock.MongoClient().db
+    mgr = SnapshotManager(db, CANDIDATE_SPEC, poll_seconds=0.01)
+    calls = []
+    done = threading.Event()
+
+    def watch():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("bad row")
+        mgr._stop.set(); done.set()
+
+    mgr._watch = watch
+    mgr.start()
+    assert done.wait(5)
+    mgr.stop()
+    assert len(calls) == 3 and mgr.errors == 2